@@ -1,15 +1,338 @@
 # app/bekendmakingen_job.py
-from typing import Dict
+# Wekelijkse digest van officiële bekendmakingen per gemeente.
+# Pipeline (streaming): fetch per gemeente (concurrent, begrensd) → parse → dedupe → render markdown.
+# Een lokale cache (SQLite) bewaart publicaties per id, per gemeente een watermark (de bron wordt
+# alleen gevraagd naar publicaties vanaf de vorige run) en per (gemeente, startRecord) de ETag van
+# de laatst opgehaalde pagina. Die sleutel bevat bewust niet de query: daarin staat de watermark,
+# die elke run verschuift. Een ETag die nog matcht betekent identieke inhoud, dus de ids van de
+# pagina kunnen uit de cache komen.
+
+from __future__ import annotations
+import asyncio
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from . import http_pool
+
+SRU_URL = os.getenv("BEKENDMAKINGEN_SRU_URL", "https://repository.overheid.nl/sru")
+CACHE_PATH = os.getenv("BEKENDMAKINGEN_CACHE_PATH", "data/bekendmakingen.sqlite3")
+PAGE_SIZE = 100
+DEFAULT_CONCURRENCY = 4
+
+
+# ---- cache ----
+class _Cache:
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS publications (
+                id TEXT PRIMARY KEY,
+                municipality TEXT,
+                date TEXT,
+                data TEXT NOT NULL,
+                first_seen REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_pub_muni_date ON publications(municipality, date);
+            DROP TABLE IF EXISTS http_cache;
+            CREATE TABLE IF NOT EXISTS page_cache (
+                municipality TEXT NOT NULL,
+                start INTEGER NOT NULL,
+                etag TEXT,
+                ids TEXT NOT NULL,
+                PRIMARY KEY (municipality, start)
+            );
+            CREATE TABLE IF NOT EXISTS watermarks (
+                municipality TEXT PRIMARY KEY,
+                fetched_until TEXT NOT NULL
+            );
+            """
+        )
+
+    def validator(self, municipality: str, start: int) -> Optional[Tuple[str, List[str]]]:
+        """(etag, ids) van de laatst opgehaalde pagina op deze positie, als die een ETag had."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, ids FROM page_cache WHERE municipality=? AND start=?", (municipality, start)
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row and row[0] else None
+
+    def store_page(self, municipality: str, start: int, etag: Optional[str], pubs: List[Dict[str, Any]]) -> int:
+        """Bewaar een pagina; geeft het aantal nieuwe publicaties terug."""
+        now = time.time()
+        new = 0
+        with self._lock:
+            self._db.execute("BEGIN")
+            for p in pubs:
+                cur = self._db.execute(
+                    "INSERT OR IGNORE INTO publications (id, municipality, date, data, first_seen) VALUES (?,?,?,?,?)",
+                    (p["id"], p["municipality"], p["date"], json.dumps(p, ensure_ascii=False), now),
+                )
+                new += cur.rowcount
+            self._db.execute(
+                "INSERT OR REPLACE INTO page_cache (municipality, start, etag, ids) VALUES (?,?,?,?)",
+                (municipality, start, etag, json.dumps([p["id"] for p in pubs])),
+            )
+            self._db.execute("COMMIT")
+        return new
+
+    def watermark(self, municipality: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fetched_until FROM watermarks WHERE municipality=?", (municipality,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, municipality: str, day: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO watermarks (municipality, fetched_until) VALUES (?,?)", (municipality, day)
+            )
+
+    def in_window(self, municipality: str, since: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM publications WHERE municipality=? AND date>=?", (municipality, since)
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def load(self, ids: List[str]) -> List[Dict[str, Any]]:
+        if not ids:
+            return []
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT data FROM publications WHERE id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+
+_CACHE: Optional[_Cache] = None
+
+
+def _cache() -> _Cache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = _Cache(CACHE_PATH)
+    return _CACHE
+
+
+# ---- parse ----
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _first(el: ET.Element, name: str) -> Optional[str]:
+    for sub in el.iter():
+        if _local(sub.tag) == name and (sub.text or "").strip():
+            return sub.text.strip()
+    return None
+
+
+def parse_sru(xml_text: str, municipality: str) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """SRU searchRetrieveResponse → (publicaties, nextRecordPosition)."""
+    root = ET.fromstring(xml_text)
+    pubs: List[Dict[str, Any]] = []
+    next_pos: Optional[int] = None
+    for el in root:
+        name = _local(el.tag)
+        if name == "nextRecordPosition" and (el.text or "").strip().isdigit():
+            next_pos = int(el.text)
+        if name != "records":
+            continue
+        for rec in el:
+            pid = _first(rec, "identifier")
+            if not pid:
+                continue
+            pubs.append({
+                "id": pid,
+                "municipality": municipality,
+                "title": _first(rec, "title") or "",
+                "type": _first(rec, "type") or "",
+                "date": (_first(rec, "modified") or _first(rec, "date") or "")[:10],
+                "url": _first(rec, "preferredUrl") or f"https://zoek.officielebekendmakingen.nl/{pid}.html",
+            })
+    return pubs, next_pos
+
+
+# ---- fetch ----
+def _query(municipality: str, since: str) -> str:
+    return (
+        f'c.product-area==officielepublicaties AND dt.creator=="{municipality}" '
+        f"AND dt.modified>={since}"
+    )
+
+
+async def fetch_municipality(municipality: str, since: str, stats: Dict[str, int]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Alle publicaties van één gemeente sinds `since` (YYYY-MM-DD), pagina voor pagina.
+    Wat een eerdere run al ophaalde komt uit de cache; bij de bron wordt alleen gevraagd
+    naar publicaties vanaf de watermark van die run.
+    """
+    cache = _cache()
+    client = http_pool.get_client(SRU_URL)
+    today = datetime.date.today().isoformat()
+    fetch_since = since
+    wm = cache.watermark(municipality)
+    if wm and wm > since:
+        for p in cache.in_window(municipality, since):
+            stats["from_cache"] += 1
+            yield p
+        fetch_since = wm  # inclusief: overlap van één dag wordt later ontdubbeld
+
+    start = 1
+    while True:
+        params = {
+            "query": _query(municipality, fetch_since),
+            "maximumRecords": str(PAGE_SIZE),
+            "startRecord": str(start),
+        }
+        cached = cache.validator(municipality, start)
+        # alleen de ETag: Last-Modified zegt niets over een pagina van een andere query
+        headers = {"If-None-Match": cached[0]} if cached else {}
+
+        r = await client.get(SRU_URL, params=params, headers=headers)
+        stats["requests"] += 1
+        if r.status_code == 304 and cached:
+            stats["not_modified"] += 1
+            for p in cache.load(cached[1]):
+                yield p
+            # een ongewijzigde pagina is per definitie niet de laatste als hij vol was
+            if len(cached[1]) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+            continue
+        r.raise_for_status()
+        pubs, next_pos = parse_sru(r.text, municipality)
+        stats["new"] += cache.store_page(municipality, start, r.headers.get("etag"), pubs)
+        for p in pubs:
+            yield p
+        if not next_pos or not pubs:
+            break
+        start = next_pos
+    cache.set_watermark(municipality, today)
+
+
+async def fetch_all(municipalities: List[str], since: str, concurrency: int, stats: Dict[str, int]) -> AsyncIterator[Dict[str, Any]]:
+    """Fetch alle gemeenten tegelijk (max `concurrency`); levert publicaties zodra ze binnen zijn."""
+    queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=PAGE_SIZE)
+    sem = asyncio.Semaphore(max(1, concurrency))
+    done = object()
+
+    async def _one(m: str):
+        try:
+            async with sem:
+                async for p in fetch_municipality(m, since, stats):
+                    await queue.put(p)
+        except Exception as e:
+            stats["errors"] += 1
+            await queue.put({"_error": f"{m}: {e!r}"})
+        finally:
+            await queue.put(done)
+
+    workers = [asyncio.create_task(_one(m)) for m in municipalities]
+    remaining = len(workers)
+    try:
+        while remaining:
+            item = await queue.get()
+            if item is done:
+                remaining -= 1
+                continue
+            yield item
+    finally:
+        for w in workers:
+            w.cancel()
+
+
+# ---- render ----
+def _matches(p: Dict[str, Any], keywords: List[str]) -> bool:
+    if not keywords:
+        return True
+    text = f'{p.get("title", "")} {p.get("type", "")}'.lower()
+    return any(k.lower() in text for k in keywords)
+
+
+def render_markdown(by_muni: Dict[str, List[Dict[str, Any]]], since: str, errors: List[str]) -> str:
+    lines = [f"## Bekendmakingen sinds {since}"]
+    if not any(by_muni.values()):
+        lines.append("- Geen nieuwe bekendmakingen gevonden.")
+    for muni in sorted(by_muni):
+        pubs = sorted(by_muni[muni], key=lambda p: (p["date"], p["id"]), reverse=True)
+        if not pubs:
+            continue
+        lines.append(f"\n### {muni} ({len(pubs)})")
+        for p in pubs:
+            lines.append(f'- {p["date"]} — [{p["title"] or p["id"]}]({p["url"]})')
+    if errors:
+        lines.append("\n> Fouten bij ophalen: " + "; ".join(errors))
+    return "\n".join(lines)
+
+
+def _load_config(config_path: str) -> Dict[str, Any]:
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
 
 async def run_weekly_digest(
     config_path: str = "apps/bekendmakingen/configs/bekendmakingen.json",
     dry_run: bool = True,
     days: int = 7,
 ) -> Dict:
-    return {
-        "ok": True,
+    cfg = _load_config(config_path)
+    municipalities: List[str] = cfg.get("municipalities") or []
+    keywords: List[str] = cfg.get("keywords") or []
+    since = (datetime.date.today() - datetime.timedelta(days=int(days))).isoformat()
+    stats = {"requests": 0, "not_modified": 0, "new": 0, "from_cache": 0, "errors": 0}
+
+    seen: set[str] = set()
+    by_muni: Dict[str, List[Dict[str, Any]]] = {m: [] for m in municipalities}
+    errors: List[str] = []
+    async for p in fetch_all(municipalities, since, int(cfg.get("max_concurrency") or DEFAULT_CONCURRENCY), stats):
+        if "_error" in p:
+            errors.append(p["_error"])
+            continue
+        if p["id"] in seen or p["date"] < since or not _matches(p, keywords):
+            continue
+        seen.add(p["id"])
+        by_muni.setdefault(p["municipality"], []).append(p)
+
+    markdown = render_markdown(by_muni, since, errors)
+    out: Dict[str, Any] = {
+        "ok": not errors,
         "dry_run": bool(dry_run),
         "config_path": config_path,
         "days": int(days),
-        "preview_markdown": "## Rooktest\n- (mock) Geen echte bekendmakingen opgehaald.",
+        "municipalities": len(municipalities),
+        "publications": len(seen),
+        "stats": stats,
+        "preview_markdown": markdown,
     }
+    if not municipalities:
+        out["note"] = "geen gemeenten geconfigureerd in 'municipalities'"
+    if not dry_run:
+        out["mail"] = await _deliver(cfg, since, markdown)
+    return out
+
+
+async def _deliver(cfg: Dict[str, Any], since: str, markdown: str) -> Dict[str, Any]:
+    # routes: [{"emails": [...]}]; verzonden vanuit de mailbox in MS_MAIL_FROM
+    sender = os.getenv("MS_MAIL_FROM")
+    emails = sorted({e for route in cfg.get("routes") or [] for e in route.get("emails") or []})
+    if not sender or not emails:
+        return {"sent": 0, "note": "geen MS_MAIL_FROM of ontvangers geconfigureerd"}
+    from .msgraph import send_mail_bulk
+
+    subject = f"Bekendmakingen sinds {since}"
+    return await send_mail_bulk(sender, [{"to": e, "subject": subject, "body_text": markdown} for e in emails])
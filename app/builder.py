@@ -1,7 +1,8 @@
 from typing import Dict, Any, List
 import os
 
-from .repo_io import commit_files
+from .github_client import commit_files, env_token
+from .llm_json import validate_build_spec
 
 class BuildSpecError(Exception):
     pass
@@ -27,9 +28,10 @@ async def build_from_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
     if not isinstance(spec, dict):
         raise BuildSpecError("Spec moet een object zijn.")
 
-    files = spec.get("files") or []
-    if not files or not all(isinstance(f, dict) and f.get("path") for f in files):
-        raise BuildSpecError("Spec.files moet een lijst zijn met objecten met 'path' en 'content'.")
+    errors = validate_build_spec(spec)
+    if errors:
+        raise BuildSpecError("Ongeldige spec: " + "; ".join(errors))
+    files = spec["files"]
 
     repo = _norm_repo(spec.get("repo"))
     if not repo:
@@ -38,9 +40,9 @@ async def build_from_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
     branch = spec.get("branch") or os.getenv("GITHUB_BRANCH", "main")
     message = spec.get("commit_message") or spec.get("summary") or "build_from_spec commit"
 
-    token = os.getenv("GITHUB_TOKEN")
+    token = env_token()
     if not token:
-        raise BuildSpecError("GITHUB_TOKEN ontbreekt als env var.")
+        raise BuildSpecError("GH_TOKEN (of GITHUB_TOKEN) ontbreekt als env var.")
 
     # committen:
     res = await commit_files(token=token, repo=repo, files=files, message=message, branch=branch)
@@ -0,0 +1,54 @@
+# app/events.py
+# Kleine in-process pub/sub voor job-statusovergangen.
+# Gevoed vanuit main.create_job; gelezen door de SSE- en long-poll endpoints.
+
+from __future__ import annotations
+import asyncio
+import json
+from typing import Any, Dict, Optional, Set, Tuple
+
+TERMINAL = ("done", "error", "failed")  # "failed": rijen van de oude scheduler-workers
+QUEUE_SIZE = 256
+# events blijven klein: geen payload of resultaat (kunnen MB's zijn), die staan op GET /jobs/{id}
+EVENT_FIELDS = ("id", "task", "status", "created_at", "started_at", "finished_at", "error")
+
+
+def event_of(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: job.get(k) for k in EVENT_FIELDS}
+
+
+class EventBus:
+    def __init__(self):
+        # (job_id of None voor de firehose, queue)
+        self._subs: Set[Tuple[Optional[str], asyncio.Queue]] = set()
+
+    def subscribe(self, job_id: Optional[str] = None) -> Tuple[Optional[str], asyncio.Queue]:
+        sub = (job_id, asyncio.Queue(maxsize=QUEUE_SIZE))
+        self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Tuple[Optional[str], asyncio.Queue]) -> None:
+        self._subs.discard(sub)
+
+    def publish(self, job: Dict[str, Any]) -> None:
+        event = event_of(job)
+        for job_id, q in list(self._subs):
+            if job_id is not None and job_id != event.get("id"):
+                continue
+            if q.full():
+                # trage lezer: oudste event weggooien i.p.v. de producer te blokkeren
+                try:
+                    q.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            q.put_nowait(event)
+
+    def subscribers(self) -> int:
+        return len(self._subs)
+
+
+def sse(event: Dict[str, Any], name: str = "job") -> str:
+    return f"event: {name}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+BUS = EventBus()
@@ -0,0 +1,192 @@
+# app/executor.py
+# Begrensde job-executor achter de TASKS registry:
+# - globale cap op gelijktijdig lopende jobs
+# - per-task concurrency limiet
+# - prioriteits-lanes (interactive gaat voor scheduled)
+# - begrensde wachtrij → QueueFull (main vertaalt naar 429 + Retry-After)
+
+from __future__ import annotations
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from . import metrics
+
+LANES = ("interactive", "scheduled")  # volgorde = prioriteit
+
+
+def _parse_limits(raw: str) -> Dict[str, int]:
+    # "commit_files=2,weekly_bekendmakingen=1"
+    out: Dict[str, int] = {}
+    for part in (raw or "").split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            out[k.strip()] = max(1, int(v))
+    return out
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("job queue is full")
+        self.retry_after = retry_after
+
+
+class ExecutorUnavailable(Exception):
+    pass
+
+
+class JobExecutor:
+    def __init__(
+        self,
+        max_inflight: int = 8,
+        max_queue: int = 200,
+        default_task_limit: int = 4,
+        task_limits: Optional[Dict[str, int]] = None,
+    ):
+        self.max_inflight = max(1, max_inflight)
+        self.max_queue = max(0, max_queue)
+        self.default_task_limit = max(1, default_task_limit)
+        self.task_limits = dict(task_limits or {})
+
+        self._lanes: Dict[str, Deque[Tuple[str, Callable[[], Awaitable[Any]], float]]] = {
+            lane: deque() for lane in LANES
+        }
+        self._running_per_task: Dict[str, int] = {}
+        self._inflight = 0
+        self._tasks: set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._closed = False
+
+        # statistiek
+        self._finished: Deque[float] = deque()  # eindtijden binnen het meetvenster
+        self._window = 60.0
+        self._submitted = 0
+        self._started = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+
+    # ---- levenscyclus ----
+    def start(self) -> None:
+        if self._dispatcher is not None and not self._dispatcher.done():
+            return
+        self._closed = False
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch(), name="job-dispatcher")
+
+    async def stop(self) -> None:
+        self._closed = True
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        for t in list(self._tasks):
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    # ---- publiek ----
+    def queued(self) -> int:
+        return sum(len(q) for q in self._lanes.values())
+
+    def submit(self, task_name: str, runner: Callable[[], Awaitable[Any]], lane: str = "interactive") -> None:
+        """Zet een job in de wachtrij; gooit QueueFull/ExecutorUnavailable."""
+        if self._closed:
+            raise ExecutorUnavailable("executor is shutting down")
+        if lane not in self._lanes:
+            raise ValueError(f"onbekende lane '{lane}' (kies uit {', '.join(LANES)})")
+        if self.queued() >= self.max_queue:
+            self._rejected += 1
+            raise QueueFull(self._retry_after())
+        self.start()
+        self._lanes[lane].append((task_name, runner, time.monotonic()))
+        self._submitted += 1
+        self._wakeup.set()
+
+    def stats(self) -> Dict[str, Any]:
+        self._trim_window()
+        return {
+            "inflight": self._inflight,
+            "max_inflight": self.max_inflight,
+            "queued": {lane: len(q) for lane, q in self._lanes.items()},
+            "max_queue": self.max_queue,
+            "running_per_task": {k: v for k, v in self._running_per_task.items() if v},
+            "task_limits": self.task_limits,
+            "default_task_limit": self.default_task_limit,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "throughput_per_min": len(self._finished) * 60.0 / self._window,
+            "avg_queue_wait_s": (self._wait_total / self._started) if self._started else 0.0,
+        }
+
+    # ---- intern ----
+    def _limit_for(self, task_name: str) -> int:
+        return self.task_limits.get(task_name, self.default_task_limit)
+
+    def _trim_window(self) -> None:
+        cutoff = time.monotonic() - self._window
+        while self._finished and self._finished[0] < cutoff:
+            self._finished.popleft()
+
+    def _retry_after(self) -> int:
+        # schat wanneer er weer plek is: bij een volle wachtrij is één afgeronde job genoeg,
+        # dus ~1/doorvoer seconden (niet de hele wachtrij leeg laten lopen)
+        self._trim_window()
+        rate = len(self._finished) / self._window  # jobs/s
+        if rate <= 0:
+            return 5
+        return max(1, math.ceil(1 / rate))
+
+    def _pick(self) -> Optional[Tuple[str, str, Callable[[], Awaitable[Any]], float]]:
+        for lane in LANES:
+            q = self._lanes[lane]
+            for i, item in enumerate(q):
+                if self._running_per_task.get(item[0], 0) < self._limit_for(item[0]):
+                    del q[i]
+                    return (lane, *item)
+        return None
+
+    async def _dispatch(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._inflight < self.max_inflight:
+                item = self._pick()
+                if item is None:
+                    break
+                self._launch(*item)
+
+    def _launch(self, lane: str, task_name: str, runner: Callable[[], Awaitable[Any]], enqueued_at: float) -> None:
+        self._inflight += 1
+        self._running_per_task[task_name] = self._running_per_task.get(task_name, 0) + 1
+        self._started += 1
+        wait = time.monotonic() - enqueued_at
+        self._wait_total += wait
+        metrics.JOB_QUEUE_WAIT.observe(wait, task=task_name, lane=lane)
+
+        async def _wrapped():
+            try:
+                await runner()
+            finally:
+                self._inflight -= 1
+                self._running_per_task[task_name] -= 1
+                self._completed += 1
+                self._finished.append(time.monotonic())
+                self._wakeup.set()
+
+        t = asyncio.create_task(_wrapped())
+        self._tasks.add(t)
+        t.add_done_callback(self._tasks.discard)
+
+
+def from_env() -> JobExecutor:
+    return JobExecutor(
+        max_inflight=int(os.getenv("JOB_MAX_INFLIGHT", "8")),
+        max_queue=int(os.getenv("JOB_MAX_QUEUE", "200")),
+        default_task_limit=int(os.getenv("JOB_TASK_CONCURRENCY", "4")),
+        task_limits=_parse_limits(os.getenv("JOB_TASK_LIMITS", "")),
+    )
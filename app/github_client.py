@@ -0,0 +1,516 @@
+# app/github_client.py
+# Eén async GitHub-client voor de hele app (repo_io, tasks, builder en appgithub_helper zijn adapters):
+# - gedeelde verbindingen (http_pool) en rate-governor per token (github_rate)
+# - Contents API voor kleine bestanden, Git Data API (blobs → tree → commit → ref) voor batches en grote bestanden
+# - caches: file-inhoud (ETag, TTL) per token en (repo, branch, path), blob-sha's per (repo, branch, path)
+# - fouten altijd als GitHubError(status, ...)
+
+from __future__ import annotations
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterable, AsyncIterator, BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import httpx
+
+from . import github_rate
+
+GITHUB_API = os.getenv("GITHUB_API_URL", "https://api.github.com")
+# max. aantal gelijktijdige blob-uploads bij een multi-file commit
+BLOB_CONCURRENCY = int(os.getenv("GITHUB_BLOB_CONCURRENCY", "8"))
+# max. aantal gelijktijdige reads bij read_files
+READ_CONCURRENCY = int(os.getenv("GITHUB_READ_CONCURRENCY", "8"))
+SHA_CACHE_MAX = int(os.getenv("GITHUB_SHA_CACHE_MAX", "4096"))
+# read-through cache voor raw_file: binnen de TTL geen request, daarna revalideren met ETag
+FILE_CACHE_TTL_S = float(os.getenv("GITHUB_FILE_CACHE_TTL_S", "60"))
+FILE_CACHE_MAX_BYTES = int(os.getenv("GITHUB_FILE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# grotere bestanden gaan via een git blob i.p.v. de Contents API
+CONTENTS_MAX_BYTES = int(os.getenv("GITHUB_CONTENTS_MAX_BYTES", str(1024 * 1024)))
+# niet-seekbare bronnen worden tot deze grootte in RAM gebufferd, daarboven op schijf
+SPOOL_MAX_MEMORY = int(os.getenv("GITHUB_SPOOL_MAX_MEMORY", str(8 * 1024 * 1024)))
+# hoe vaak een multi-file commit opnieuw op de nieuwe kop wordt gezet als de branch intussen verschoof
+REF_RETRIES = int(os.getenv("GITHUB_REF_RETRIES", "5"))
+CHUNK_BYTES = 3 * 64 * 1024  # veelvoud van 3: base64 per chunk zonder padding ertussen
+BLOB_MODE = "100644"  # mode voor nieuwe paden in een tree
+
+# inhoud voor een commit: tekst, bytes, een binair file-object of een (async) iterator van bytes
+Source = Union[str, bytes, bytearray, memoryview, BinaryIO, Iterable[bytes], AsyncIterable[bytes]]
+
+class GitHubError(RuntimeError):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _check(r: httpx.Response) -> httpx.Response:
+    if r.status_code >= 400:
+        raise GitHubError(
+            r.status_code, f"GitHub {r.request.method} {r.request.url.path} failed: {r.status_code} {r.text[:500]}"
+        )
+    return r
+
+
+def env_token() -> Optional[str]:
+    """Token uit de environment: GH_TOKEN, anders GITHUB_TOKEN (None als geen van beide gezet is)."""
+    return os.getenv("GH_TOKEN") or os.getenv("GITHUB_TOKEN")
+
+
+def _gh_headers(token: str) -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github+json",
+        "Content-Type": "application/json",
+    }
+
+class FileCache:
+    """
+    LRU+TTL op (token-hash, repo, branch, path) → {sha, data, etag}; begrensd op bytes.
+    Per token, zodat een token zonder leesrecht nooit inhoud krijgt die een ander token ophaalde.
+    """
+
+    def __init__(self, max_bytes: int, ttl_s: float):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.bytes = 0
+        self._data: "OrderedDict[Tuple[str, str, str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # (repo, branch, path) → token-hashes met een entry; voor invalidatie over alle tokens heen
+        self._tokens: Dict[Tuple[str, str, str], Set[str]] = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "revalidated": 0, "misses": 0, "invalidated": 0}
+
+    @staticmethod
+    def key(token: str, repo: str, branch: str, path: str) -> Tuple[str, str, str, str]:
+        return (github_rate.token_id(token), repo, branch, path)
+
+    def lookup(self, key: Tuple[str, str, str, str]) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """(entry, vers); een verlopen entry blijft bruikbaar voor If-None-Match."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None, False
+            self._data.move_to_end(key)
+            return item[1], item[0] >= time.time()
+
+    def put(self, key: Tuple[str, str, str, str], entry: Dict[str, Any]) -> None:
+        size = len(entry["data"])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.time() + self.ttl_s, entry)
+            self._tokens.setdefault(key[1:], set()).add(key[0])
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._data:
+                self._drop(next(iter(self._data)))
+
+    def invalidate(self, repo: str, branch: str, paths: List[str]) -> None:
+        # een commit verandert de inhoud voor elk token
+        with self._lock:
+            for path in paths:
+                for tid in list(self._tokens.get((repo, branch, path), ())):
+                    self._drop((tid, repo, branch, path))
+                    self.counters["invalidated"] += 1
+
+    def _drop(self, key: Tuple[str, str, str, str]) -> None:
+        _, entry = self._data.pop(key)
+        self.bytes -= len(entry["data"])
+        tids = self._tokens.get(key[1:])
+        if tids is not None:
+            tids.discard(key[0])
+            if not tids:
+                del self._tokens[key[1:]]
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "entries": len(self._data), "bytes": self.bytes, "ttl_s": self.ttl_s}
+
+
+FILE_CACHE = FileCache(FILE_CACHE_MAX_BYTES, FILE_CACHE_TTL_S)
+
+
+class ShaCache:
+    """Laatst bekende blob-sha per (repo, branch, path); scheelt de GET vóór een Contents-PUT."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "conflicts": 0}
+
+    def get(self, repo: str, branch: str, path: str) -> Optional[str]:
+        sha = self._data.get((repo, branch, path))
+        if sha is None:
+            self.counters["misses"] += 1
+            return None
+        self._data.move_to_end((repo, branch, path))
+        self.counters["hits"] += 1
+        return sha
+
+    def put(self, repo: str, branch: str, shas: Dict[str, str]) -> None:
+        for path, sha in shas.items():
+            self._data[(repo, branch, path)] = sha
+            self._data.move_to_end((repo, branch, path))
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def drop(self, repo: str, branch: str, path: str) -> None:
+        self._data.pop((repo, branch, path), None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "entries": len(self._data)}
+
+
+SHA_CACHE = ShaCache(SHA_CACHE_MAX)
+
+def git_blob_sha(data: bytes) -> str:
+    """SHA-1 zoals git die voor een blob berekent (gelijk aan de 'sha' uit de GitHub API)."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+class _Blob:
+    """Seekbare bron met bekende grootte; alles wordt in chunks gelezen zodat het geheugen begrensd blijft."""
+
+    def __init__(self, f: BinaryIO, size: int, owned: bool):
+        self.f = f
+        self.start = f.tell()
+        self.size = size
+        self.owned = owned
+        self.sha = ""
+
+    def _hash(self) -> str:
+        h = hashlib.sha1(b"blob %d\0" % self.size)
+        for chunk in self.chunks():
+            h.update(chunk)
+        return h.hexdigest()
+
+    @classmethod
+    async def open(cls, source: Source) -> "_Blob":
+        blob = await cls._wrap(source)
+        # grote bronnen hashen buiten het event loop
+        blob.sha = blob._hash() if blob.size <= CHUNK_BYTES else await asyncio.to_thread(blob._hash)
+        return blob
+
+    @classmethod
+    async def _wrap(cls, source: Source) -> "_Blob":
+        if isinstance(source, str):
+            source = source.encode("utf-8")
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return cls(io.BytesIO(source), len(source), owned=True)
+        if hasattr(source, "read") and hasattr(source, "seekable") and source.seekable():
+            start = source.tell()
+            size = source.seek(0, io.SEEK_END) - start
+            source.seek(start)
+            return cls(source, size, owned=False)
+        # stream: eenmalig spoolen (RAM tot SPOOL_MAX_MEMORY, daarna tempfile)
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        if hasattr(source, "read"):
+            while chunk := source.read(CHUNK_BYTES):
+                spool.write(chunk)
+        elif hasattr(source, "__aiter__"):
+            async for chunk in source:
+                spool.write(chunk)
+        else:
+            for chunk in source:
+                spool.write(chunk)
+        size = spool.tell()
+        spool.seek(0)
+        return cls(spool, size, owned=True)
+
+    def chunks(self) -> Iterator[bytes]:
+        self.f.seek(self.start)
+        left = self.size
+        while left > 0:
+            chunk = self.f.read(min(CHUNK_BYTES, left))
+            if not chunk:
+                raise IOError("bron is korter dan verwacht")
+            left -= len(chunk)
+            yield chunk
+
+    def read(self) -> bytes:
+        return b"".join(self.chunks())
+
+    def b64_length(self) -> int:
+        return (self.size + 2) // 3 * 4
+
+    async def b64_chunks(self) -> AsyncIterator[bytes]:
+        carry = b""
+        for chunk in self.chunks():
+            chunk = carry + chunk
+            cut = len(chunk) - len(chunk) % 3
+            carry = chunk[cut:]
+            yield base64.b64encode(chunk[:cut])
+        if carry:
+            yield base64.b64encode(carry)
+
+    def close(self) -> None:
+        if self.owned:
+            self.f.close()
+
+async def remote_tree(base: str, token: str, tree_sha: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    (path → blob-sha, path → mode) van de hele tree (recursief).
+    Bij een afgekapte tree zijn beide maps onvolledig.
+    """
+    r = await github_rate.request(
+        "GET", f"{base}/git/trees/{tree_sha}", token=token, headers=_gh_headers(token), params={"recursive": "1"}
+    )
+    _check(r)
+    blobs = [e for e in r.json().get("tree", []) if e.get("type") == "blob"]
+    return {e["path"]: e["sha"] for e in blobs}, {e["path"]: e.get("mode", BLOB_MODE) for e in blobs}
+
+async def get_sha(*, token: str, repo: str, path: str, branch: str = "main") -> Optional[str]:
+    """Blob-sha van path op branch (None als het bestand niet bestaat); altijd vers van GitHub."""
+    r = await github_rate.request(
+        "GET", f"{GITHUB_API}/repos/{repo}/contents/{path}", token=token, headers=_gh_headers(token), params={"ref": branch}
+    )
+    if r.status_code == 404:
+        SHA_CACHE.drop(repo, branch, path)
+        return None
+    sha = _check(r).json().get("sha")
+    SHA_CACHE.put(repo, branch, {path: sha})
+    return sha
+
+async def commit_file(
+    *,
+    token: str,
+    repo: str,           # "owner/name"
+    path: str,           # "apps/...."
+    content: Source,
+    message: str,
+    branch: str = "main",
+) -> Dict:
+    """Maak/overschrijf één bestand in GitHub (grote bestanden via een git blob)."""
+    blob = await _Blob.open(content)
+    try:
+        if blob.size > CONTENTS_MAX_BYTES:
+            res = await _commit_blobs(token=token, repo=repo, blobs=[(path, blob)], message=message, branch=branch)
+            if res["commit"] is None:
+                return {"unchanged": True, "content": {"path": path, "sha": blob.sha}, "commit": None}
+            return {"content": {"path": path, "sha": blob.sha}, "commit": {"sha": res["commit"]}}
+        data = blob.read()
+    finally:
+        blob.close()
+
+    local = git_blob_sha(data)
+    # bekende sha uit de cache gebruiken; alleen als die "gelijk" zegt eerst verifiëren
+    sha = SHA_CACHE.get(repo, branch, path)
+    if sha is None or sha == local:
+        sha = await get_sha(token=token, repo=repo, path=path, branch=branch)
+    if sha == local:
+        # inhoud identiek aan de branch: geen lege commit maken
+        return {"unchanged": True, "content": {"path": path, "sha": sha}, "commit": None}
+
+    url = f"{GITHUB_API}/repos/{repo}/contents/{path}"
+    payload = {
+        "message": message,
+        "content": base64.b64encode(data).decode("ascii"),
+        "branch": branch,
+    }
+    if sha:
+        payload["sha"] = sha
+    r_put = await github_rate.request("PUT", url, token=token, headers=_gh_headers(token), json=payload)
+    if r_put.status_code in (409, 422) and sha:
+        # sha uit de cache was verouderd: één keer opnieuw met de actuele
+        SHA_CACHE.counters["conflicts"] += 1
+        payload["sha"] = await get_sha(token=token, repo=repo, path=path, branch=branch)
+        if payload["sha"] is None:
+            payload.pop("sha")
+        if payload.get("sha") == local:
+            return {"unchanged": True, "content": {"path": path, "sha": local}, "commit": None}
+        r_put = await github_rate.request("PUT", url, token=token, headers=_gh_headers(token), json=payload)
+    res = _check(r_put).json()
+    FILE_CACHE.invalidate(repo, branch, [path])
+    SHA_CACHE.put(repo, branch, {path: local})
+    return res
+
+async def _create_blob(base: str, token: str, blob: _Blob, sem: asyncio.Semaphore) -> str:
+    async def body() -> AsyncIterator[bytes]:
+        # JSON-body gestreamd opbouwen: nooit de hele base64-string in RAM
+        yield b'{"encoding":"base64","content":"'
+        async for chunk in blob.b64_chunks():
+            yield chunk
+        yield b'"}'
+
+    prefix, suffix = len(b'{"encoding":"base64","content":"'), len(b'"}')
+    headers = {**_gh_headers(token), "Content-Length": str(prefix + blob.b64_length() + suffix)}
+    async with sem:
+        # body als factory: bij een retry begint de stream opnieuw
+        r = await github_rate.request("POST", f"{base}/git/blobs", token=token, headers=headers, content=body)
+        return _check(r).json()["sha"]
+
+async def commit_files(
+    *,
+    token: str,
+    repo: str,
+    files: List[Dict[str, Any]],  # [{path, content}], content: zie Source
+    message: str,
+    branch: str = "main",
+) -> Dict:
+    """
+    Meerdere files in één atomaire commit via de Git Data API:
+    blobs (parallel) → één tree → één commit → ref verplaatsen.
+    Bestanden waarvan de git blob-sha gelijk is aan die op de branch worden overgeslagen;
+    is er niets veranderd, dan volgt er geen enkele schrijf-call.
+    """
+    blobs: List[Tuple[str, _Blob]] = []
+    try:
+        for f in files:
+            blobs.append((f["path"], await _Blob.open(f.get("content", ""))))
+        return await _commit_blobs(token=token, repo=repo, blobs=blobs, message=message, branch=branch)
+    finally:
+        for _, blob in blobs:
+            blob.close()
+
+async def _commit_blobs(
+    *,
+    token: str,
+    repo: str,
+    blobs: List[Tuple[str, _Blob]],
+    message: str,
+    branch: str,
+) -> Dict:
+    owner, name = repo.split("/")
+    base = f"{GITHUB_API}/repos/{owner}/{name}"
+    sem = asyncio.Semaphore(max(1, BLOB_CONCURRENCY))
+    by_path = dict(blobs)
+    manifest = {path: blob.sha for path, blob in by_path.items()}
+    blob_shas: Dict[str, str] = {}  # lokale sha → geüploade blob (ook over retries heen)
+
+    for attempt in range(REF_RETRIES + 1):
+        # huidige kop van de branch + bijbehorende tree
+        r_ref = await github_rate.request(
+            "GET", f"{base}/git/ref/heads/{branch}", token=token, headers=_gh_headers(token)
+        )
+        _check(r_ref)
+        parent_sha = r_ref.json()["object"]["sha"]
+        r_parent = await github_rate.request(
+            "GET", f"{base}/git/commits/{parent_sha}", token=token, headers=_gh_headers(token)
+        )
+        _check(r_parent)
+        base_tree = r_parent.json()["tree"]["sha"]
+
+        # manifest: lokaal berekende blob-sha's vs. de remote tree
+        remote, modes = await remote_tree(base, token, base_tree)
+        SHA_CACHE.put(repo, branch, remote)
+        changed = [path for path, sha in manifest.items() if remote.get(path) != sha]
+        skipped = [path for path in manifest if path not in changed]
+        if not changed:
+            return {
+                "committed": [], "skipped": skipped, "commit": None, "manifest": manifest,
+                "message": message, "branch": branch, "repo": repo,
+            }
+
+        # elke unieke inhoud maar één keer uploaden
+        missing = {manifest[path]: by_path[path] for path in changed if manifest[path] not in blob_shas}
+        uploaded = await asyncio.gather(*(_create_blob(base, token, blob, sem) for blob in missing.values()))
+        blob_shas.update(zip(missing.keys(), uploaded))
+        # bestaande paden houden hun mode (+x van scripts, symlinks); nieuwe worden een gewoon bestand
+        tree = [
+            {"path": path, "mode": modes.get(path, BLOB_MODE), "type": "blob", "sha": blob_shas[manifest[path]]}
+            for path in changed
+        ]
+        r_tree = await github_rate.request(
+            "POST", f"{base}/git/trees", token=token, headers=_gh_headers(token),
+            json={"base_tree": base_tree, "tree": tree},
+        )
+        _check(r_tree)
+
+        r_commit = await github_rate.request(
+            "POST",
+            f"{base}/git/commits",
+            token=token,
+            headers=_gh_headers(token),
+            json={"message": message, "tree": r_tree.json()["sha"], "parents": [parent_sha]},
+        )
+        _check(r_commit)
+        commit_sha = r_commit.json()["sha"]
+
+        # fast-forward only: is de branch intussen verschoven (422), dan opnieuw op de nieuwe kop
+        r_upd = await github_rate.request(
+            "PATCH",
+            f"{base}/git/refs/heads/{branch}",
+            token=token,
+            headers=_gh_headers(token),
+            json={"sha": commit_sha, "force": False},
+        )
+        if r_upd.status_code == 422 and attempt < REF_RETRIES:
+            SHA_CACHE.counters["conflicts"] += 1
+            # kleine jitter: gelijktijdige schrijvers niet opnieuw in lockstep laten botsen
+            await asyncio.sleep(random.uniform(0, 0.05 * (attempt + 1)))
+            continue
+        _check(r_upd)
+        break
+
+    FILE_CACHE.invalidate(repo, branch, changed)
+    SHA_CACHE.put(repo, branch, {path: manifest[path] for path in changed})
+
+    out = [{"path": path, "commit": commit_sha} for path in changed]
+    return {
+        "committed": out, "skipped": skipped, "commit": commit_sha, "manifest": manifest,
+        "message": message, "branch": branch, "repo": repo,
+    }
+
+async def read_file(*, token: str, repo: str, path: str, branch: str = "main") -> Dict[str, Any]:
+    """
+    Contents API-read via FILE_CACHE: {"sha", "data" (bytes), "etag"}.
+    Een 304 op If-None-Match telt niet mee voor de rate limit.
+    """
+    key = FileCache.key(token, repo, branch, path)
+    entry, fresh = FILE_CACHE.lookup(key)
+    if fresh:
+        FILE_CACHE.counters["hits"] += 1
+        return entry
+    headers = _gh_headers(token)
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    r = await github_rate.request(
+        "GET", f"{GITHUB_API}/repos/{repo}/contents/{path}", token=token, headers=headers, params={"ref": branch}
+    )
+    if r.status_code == 304 and entry:
+        FILE_CACHE.counters["revalidated"] += 1
+        FILE_CACHE.put(key, entry)  # TTL opnieuw laten lopen
+        return entry
+    _check(r)
+    FILE_CACHE.counters["misses"] += 1
+    j = r.json()
+    if j.get("encoding") == "base64":
+        data = base64.b64decode(j.get("content", ""))
+    else:
+        data = (j.get("content") or "").encode("utf-8")
+    entry = {"sha": j.get("sha"), "data": data, "etag": r.headers.get("etag")}
+    FILE_CACHE.put(key, entry)
+    SHA_CACHE.put(repo, branch, {path: entry["sha"]})
+    return entry
+
+async def read_files(*, token: str, repo: str, paths: List[str], branch: str = "main") -> Dict[str, Dict[str, Any]]:
+    """Meerdere reads parallel (begrensd); path → read_file-resultaat."""
+    sem = asyncio.Semaphore(max(1, READ_CONCURRENCY))
+
+    async def one(path: str) -> Dict[str, Any]:
+        async with sem:
+            return await read_file(token=token, repo=repo, path=path, branch=branch)
+
+    entries = await asyncio.gather(*(one(p) for p in paths))
+    return dict(zip(paths, entries))
+
+async def raw_file(
+    *,
+    token: str,
+    repo: str,
+    path: str,
+    branch: str = "main",
+) -> Dict:
+    """Lees bestand (text) uit GitHub."""
+    entry = await read_file(token=token, repo=repo, path=path, branch=branch)
+    content = entry["data"].decode("utf-8", errors="replace")
+    return {"path": path, "branch": branch, "sha": entry["sha"], "content": content}
+
+
+def stats() -> Dict[str, Any]:
+    return {"files": FILE_CACHE.stats(), "shas": SHA_CACHE.stats(), "rate": github_rate.stats()}
@@ -0,0 +1,165 @@
+# app/github_rate.py
+# Rate-governor voor alle GitHub API-calls, per token:
+# - leest X-RateLimit-Limit/Remaining/Reset uit elk antwoord
+# - onder GITHUB_RATE_LOW_FRACTION van het budget worden requests uitgesmeerd tot de reset
+# - budget op: requests wachten in de rij tot de reset i.p.v. te falen
+# - 429 / secundaire 403 (abuse) en 5xx op GET: opnieuw met jitter (Retry-After wordt gevolgd)
+# - stats() staat op /health
+
+from __future__ import annotations
+import asyncio
+import hashlib
+import random
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from . import http_pool
+
+LOW_FRACTION = float(os.getenv("GITHUB_RATE_LOW_FRACTION", "0.1"))
+MAX_RETRIES = int(os.getenv("GITHUB_MAX_RETRIES", "5"))
+BACKOFF_BASE_S = float(os.getenv("GITHUB_BACKOFF_BASE_S", "1.0"))
+BACKOFF_MAX_S = float(os.getenv("GITHUB_BACKOFF_MAX_S", "60"))
+# GitHub adviseert minstens een minuut pauze na een secundaire limiet zonder Retry-After
+SECONDARY_WAIT_S = float(os.getenv("GITHUB_SECONDARY_WAIT_S", "60"))
+
+_IDEMPOTENT = ("GET", "HEAD")
+_RETRY_STATUS = (500, 502, 503, 504)
+
+
+class RateGovernor:
+    def __init__(self, name: str):
+        self.name = name
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset: float = 0.0         # epoch waarop het budget terugkomt
+        self.blocked_until: float = 0.0  # na 429/secundaire limiet
+        self._next_slot = 0.0            # pacing bij laag budget
+        self._lock = asyncio.Lock()
+        self.stats = {
+            "requests": 0, "retries": 0, "throttled": 0, "exhausted_waits": 0,
+            "secondary_limited": 0, "wait_total_s": 0.0,
+        }
+
+    async def acquire(self) -> None:
+        # lock = FIFO: wachtenden gaan in volgorde, niet allemaal tegelijk na de reset
+        async with self._lock:
+            now = time.time()
+            wait = max(0.0, self.blocked_until - now)
+            if self.remaining is not None and self.reset > now:
+                if self.remaining <= 0:
+                    self.stats["exhausted_waits"] += 1
+                    wait = max(wait, self.reset - now + 1)
+                elif self.limit and self.remaining < self.limit * LOW_FRACTION:
+                    # resterend budget gelijkmatig verdelen over de tijd tot de reset
+                    interval = (self.reset - now) / self.remaining
+                    wait = max(wait, self._next_slot - now)
+                    self._next_slot = max(now, self._next_slot) + interval
+                    self.stats["throttled"] += 1
+            if wait > 0:
+                self.stats["wait_total_s"] += wait
+                await asyncio.sleep(wait)
+            if self.remaining is not None and self.reset <= time.time():
+                self.remaining = None  # nieuw venster: opnieuw leren uit de headers
+            if self.remaining is not None:
+                self.remaining -= 1  # optimistisch, zodat parallelle calls niet overschieten
+            self.stats["requests"] += 1
+
+    def observe(self, r: httpx.Response) -> None:
+        h = r.headers
+        try:
+            if "x-ratelimit-remaining" in h:
+                self.remaining = int(h["x-ratelimit-remaining"])
+            if "x-ratelimit-limit" in h:
+                self.limit = int(h["x-ratelimit-limit"])
+            if "x-ratelimit-reset" in h:
+                self.reset = float(h["x-ratelimit-reset"])
+        except ValueError:
+            pass
+
+    def backoff(self, r: Optional[httpx.Response], attempt: int) -> float:
+        """Wachttijd vóór de volgende poging; blokkeert bij rate limits ook andere requests."""
+        delay = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt)
+        if r is not None and _is_rate_limited(r):
+            self.stats["secondary_limited"] += 1
+            retry_after = r.headers.get("retry-after")
+            if retry_after and retry_after.isdigit():
+                delay = float(retry_after)
+            elif r.headers.get("x-ratelimit-remaining") == "0":
+                delay = max(1.0, self.reset - time.time())
+            else:
+                delay = max(delay, SECONDARY_WAIT_S)
+            self.blocked_until = max(self.blocked_until, time.time() + delay)
+        return delay * random.uniform(1.0, 1.25)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            **self.stats,
+            "wait_total_s": round(self.stats["wait_total_s"], 3),
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset_in_s": round(max(0.0, self.reset - now), 1) if self.reset else None,
+            "blocked_for_s": round(max(0.0, self.blocked_until - now), 1),
+        }
+
+
+def _is_rate_limited(r: httpx.Response) -> bool:
+    if r.status_code == 429:
+        return True
+    if r.status_code != 403:
+        return False
+    if r.headers.get("retry-after") or r.headers.get("x-ratelimit-remaining") == "0":
+        return True
+    return "rate limit" in r.text.lower()
+
+
+_GOVERNORS: Dict[str, RateGovernor] = {}
+
+
+def token_id(token: str) -> str:
+    """Korte hash van een token: als naam en cache-sleutel, nooit het token zelf."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:10]
+
+
+def governor_for(token: str) -> RateGovernor:
+    name = token_id(token)
+    if name not in _GOVERNORS:
+        _GOVERNORS[name] = RateGovernor(name)
+    return _GOVERNORS[name]
+
+
+async def request(method: str, url: str, *, token: str, content: Any = None, **kw: Any) -> httpx.Response:
+    """
+    GitHub-request via de gedeelde client en de governor van `token`.
+    `content` mag een callable zijn die per poging een nieuwe (stream-)body levert.
+    Geeft het laatste antwoord terug; statuscontrole blijft bij de aanroeper.
+    """
+    gov = governor_for(token)
+    client = http_pool.get_client(url)
+    attempt = 0
+    while True:
+        await gov.acquire()
+        body = content() if callable(content) else content
+        try:
+            r = await client.request(method, url, content=body, **kw)
+        except httpx.TransportError:
+            if method not in _IDEMPOTENT or attempt >= MAX_RETRIES:
+                raise
+            gov.stats["retries"] += 1
+            await asyncio.sleep(gov.backoff(None, attempt))
+            attempt += 1
+            continue
+        gov.observe(r)
+        retry = _is_rate_limited(r) or (method in _IDEMPOTENT and r.status_code in _RETRY_STATUS)
+        if not retry or attempt >= MAX_RETRIES:
+            return r
+        gov.stats["retries"] += 1
+        await asyncio.sleep(gov.backoff(r, attempt))
+        attempt += 1
+
+
+def stats() -> Dict[str, Any]:
+    return {name: g.snapshot() for name, g in _GOVERNORS.items()}
@@ -0,0 +1,131 @@
+# app/http_pool.py
+# Gedeelde, langlevende httpx-clients voor al het uitgaande verkeer (GitHub, Graph, ...).
+# Eén client per host → keep-alive en HTTP/2 worden over requests heen hergebruikt.
+# Gestart/gesloten vanuit de FastAPI lifespan in app.main.
+
+from __future__ import annotations
+import inspect
+import os
+import time
+from typing import Dict, Any
+from urllib.parse import urlsplit
+
+import httpx
+
+from . import metrics
+
+try:  # HTTP/2 alleen als 'h2' geïnstalleerd is (httpx[http2])
+    import h2  # noqa: F401
+    _HAS_H2 = True
+except ImportError:
+    _HAS_H2 = False
+
+HTTP2 = os.getenv("HTTP2", "1") == "1" and _HAS_H2
+TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "20"))
+MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE_PER_HOST", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+# ---- interne staat ----
+_CLIENTS: Dict[str, httpx.AsyncClient] = {}
+# per request: over een nieuwe of een hergebruikte (keep-alive/HTTP/2) verbinding verstuurd
+_STATS = {"connections_new": 0, "connections_reused": 0}
+
+
+def _host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class _TimedTransport(httpx.AsyncBaseTransport):
+    """
+    Meet elke request (tot de response-headers) voor /metrics en telt via de httpcore-trace
+    of hij een nieuwe verbinding opende of een bestaande hergebruikte.
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport):
+        self._inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        seen = {"connect": False, "sent": False}
+        outer = request.extensions.get("trace")
+
+        async def trace(name: str, info: Dict[str, Any]) -> None:
+            # bv. "connection.connect_tcp.started", "http11.send_request_headers.started"
+            if name.startswith("connection.connect_"):
+                seen["connect"] = True
+            elif name.endswith(".send_request_headers.started"):
+                seen["sent"] = True
+            if outer is not None:
+                ret = outer(name, info)
+                if inspect.isawaitable(ret):
+                    await ret
+
+        request.extensions["trace"] = trace
+        metrics.UPSTREAM_INFLIGHT.inc(host=host)
+        t0 = time.perf_counter()
+        status = "error"
+        try:
+            resp = await self._inner.handle_async_request(request)
+            status = str(resp.status_code)
+            return resp
+        finally:
+            metrics.UPSTREAM.observe(time.perf_counter() - t0, host=host, method=request.method, status=status)
+            metrics.UPSTREAM_INFLIGHT.dec(host=host)
+            if seen["sent"]:
+                _STATS["connections_new" if seen["connect"] else "connections_reused"] += 1
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+def _new_client() -> httpx.AsyncClient:
+    transport = httpx.AsyncHTTPTransport(
+        http2=HTTP2,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+    return httpx.AsyncClient(
+        transport=_TimedTransport(transport),
+        timeout=httpx.Timeout(TIMEOUT, connect=CONNECT_TIMEOUT),
+    )
+
+
+def get_client(url: str) -> httpx.AsyncClient:
+    """
+    Geef de gedeelde client voor de host van `url`.
+    Niet sluiten na gebruik; dat gebeurt centraal in shutdown().
+    """
+    key = _host_key(url)
+    client = _CLIENTS.get(key)
+    if client is not None and not client.is_closed:
+        return client
+    client = _new_client()
+    _CLIENTS[key] = client
+    return client
+
+
+async def startup() -> None:
+    # clients worden lui per host aangemaakt; hier alleen de tellers resetten
+    for k in _STATS:
+        _STATS[k] = 0
+
+
+async def shutdown() -> None:
+    clients = list(_CLIENTS.values())
+    _CLIENTS.clear()
+    for c in clients:
+        await c.aclose()
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "http2": HTTP2,
+        "hosts": sorted(_CLIENTS.keys()),
+        **_STATS,
+    }
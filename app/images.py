@@ -0,0 +1,146 @@
+# app/images.py
+# Voorbewerking van afbeeldingen (schetsen, telefoonfoto's) vóór ze naar de LLM gaan:
+# - één keer decoderen, verkleinen tot IMAGE_MAX_EDGE en compact her-encoderen (JPEG)
+# - resultaat gecachet op sha256 van de invoer: dezelfde schets → dezelfde kleine payload
+#   (en daarmee ook een hit in de completion-cache)
+# - Pillow is optioneel; zonder Pillow gaat de afbeelding ongewijzigd door
+# - afbeeldingen boven IMAGE_MAX_PIXELS (decompressiebommen) worden geweigerd vóór het decoderen
+
+from __future__ import annotations
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+try:
+    from PIL import Image, ImageOps
+    _HAS_PIL = True
+except ImportError:
+    _HAS_PIL = False
+
+MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "80"))
+CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# ruim boven een 50 MP-telefoonfoto; Pillow's eigen limiet volgt deze waarde
+MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(64 * 1024 * 1024)))
+
+if _HAS_PIL:
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+
+# DecompressionBombError is geen OSError
+_BAD_IMAGE: Tuple[type, ...] = (OSError, Image.DecompressionBombError) if _HAS_PIL else (OSError,)
+
+_CACHE: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()  # sha256 → (mime, b64, verwerkingstijd ms)
+_CACHE_BYTES = 0
+_LOCK = threading.Lock()
+_STATS = {
+    "images": 0, "cache_hits": 0, "bytes_in": 0, "bytes_out": 0,
+    "process_ms_total": 0.0, "saved_ms_total": 0.0,
+}
+
+
+def _split_data_url(image_b64: str) -> Tuple[str, str]:
+    # "data:image/png;base64,AAAA" of kale base64
+    if image_b64.startswith("data:") and "," in image_b64:
+        head, data = image_b64.split(",", 1)
+        return head[5:].split(";", 1)[0] or "image/png", data
+    return "image/png", image_b64
+
+
+def _shrink(raw: bytes, mime: str) -> Tuple[str, bytes]:
+    if not _HAS_PIL:
+        return mime, raw
+    img = Image.open(io.BytesIO(raw))  # leest alleen de header
+    if img.width * img.height > MAX_PIXELS:
+        # Pillow weigert zelf pas boven 2× de limiet; daaronder is het alleen een waarschuwing
+        raise Image.DecompressionBombError(f"{img.width}x{img.height} px is meer dan IMAGE_MAX_PIXELS ({MAX_PIXELS})")
+    img = ImageOps.exif_transpose(img)  # telefoonfoto's rechtop
+    img.thumbnail((MAX_EDGE, MAX_EDGE))
+    if img.mode not in ("RGB", "L"):
+        # transparantie op wit (schetsen), JPEG kent geen alpha
+        bg = Image.new("RGB", img.size, "white")
+        rgba = img.convert("RGBA")
+        bg.paste(rgba, mask=rgba.split()[-1])
+        img = bg
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    out = buf.getvalue()
+    if len(out) >= len(raw):
+        return mime, raw  # al klein genoeg: origineel houden
+    return "image/jpeg", out
+
+
+def _cache_put(key: str, value: Tuple[str, str, float]) -> None:
+    global _CACHE_BYTES
+    size = len(value[1])
+    if size > CACHE_MAX_BYTES:
+        return
+    with _LOCK:
+        if key in _CACHE:
+            _CACHE_BYTES -= len(_CACHE.pop(key)[1])
+        _CACHE[key] = value
+        _CACHE_BYTES += size
+        while _CACHE_BYTES > CACHE_MAX_BYTES and _CACHE:
+            _, old = _CACHE.popitem(last=False)
+            _CACHE_BYTES -= len(old[1])
+
+
+async def prepare_image(image_b64: str) -> Dict[str, Any]:
+    """
+    base64 of data-URL in → {"url": data-URL voor image_url, "mime", "bytes_in", "bytes_out", "cached"}.
+    Ongeldige base64 → ValueError.
+    """
+    mime, data = _split_data_url(image_b64.strip())
+    key = hashlib.sha256(data.encode("ascii", errors="ignore")).hexdigest()
+    _STATS["images"] += 1
+    _STATS["bytes_in"] += len(data)
+
+    with _LOCK:
+        hit = _CACHE.get(key)
+        if hit is not None:
+            _CACHE.move_to_end(key)
+    if hit is not None:
+        out_mime, out_b64, ms = hit
+        _STATS["cache_hits"] += 1
+        _STATS["saved_ms_total"] += ms
+        cached = True
+    else:
+        t0 = time.perf_counter()
+        try:
+            raw = base64.b64decode(data, validate=False)
+        except (binascii.Error, ValueError) as e:
+            raise ValueError(f"image_b64 is geen geldige base64: {e}")
+        # decoderen/schalen is CPU-werk: niet in het event loop
+        try:
+            out_mime, out = await asyncio.to_thread(_shrink, raw, mime)
+        except _BAD_IMAGE as e:  # PIL.UnidentifiedImageError, DecompressionBombError e.d.
+            raise ValueError(f"image_b64 is geen leesbare afbeelding: {e}")
+        out_b64 = base64.b64encode(out).decode("ascii")
+        ms = (time.perf_counter() - t0) * 1000
+        _STATS["process_ms_total"] += ms
+        _cache_put(key, (out_mime, out_b64, ms))
+        cached = False
+
+    _STATS["bytes_out"] += len(out_b64)
+    return {
+        "url": f"data:{out_mime};base64,{out_b64}",
+        "mime": out_mime,
+        "bytes_in": len(data),
+        "bytes_out": len(out_b64),
+        "cached": cached,
+    }
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        **{k: round(v, 1) if isinstance(v, float) else v for k, v in _STATS.items()},
+        "pillow": _HAS_PIL,
+        "max_edge": MAX_EDGE,
+        "cache": {"entries": len(_CACHE), "bytes": _CACHE_BYTES},
+    }
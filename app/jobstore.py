@@ -0,0 +1,372 @@
+# app/jobstore.py
+# Pluggable job store voor de control-plane.
+# - "memory": dict (verdwijnt bij herstart)
+# - "sqlite": WAL-modus, overleeft herstarts
+# Job-metadata en resultaat-blobs staan los van elkaar, zodat lijsten goedkoop blijven.
+# Retentie: afgeronde jobs ouder dan JOB_TTL_S en alles boven JOB_MAX_COUNT wordt opgeruimd.
+#
+# Bewust synchroon: de store wordt direct vanuit het event loop aangeroepen, ook door sqlite.
+# Dat is begrensd, geen I/O-wachten:
+# - één proces bezit het bestand; WAL + synchronous=NORMAL → geen fsync per commit,
+#   lezers wachten nooit op de schrijver
+# - elke call raakt een primary key of een index en leest hoogstens één pagina (/jobs: MAX_PAGE)
+# - opruimen loopt eens per evict_every writes en ziet nooit meer dan JOB_MAX_COUNT rijen
+# - houdt iets anders het bestand op slot, dan faalt een write na JOB_DB_BUSY_TIMEOUT_S
+#   i.p.v. het loop lang te blokkeren (sqlite3's standaard is 5 s)
+# Wordt een van deze grenzen losgelaten (netwerkschijf, meerdere processen, grote resultaten),
+# dan horen de calls achter asyncio.to_thread.
+
+from __future__ import annotations
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+FINISHED = ("done", "error", "failed")  # "failed": rijen van de oude scheduler-workers
+_META_FIELDS = (
+    "id", "task", "payload", "priority", "status", "created_at", "created_ts", "started_at", "finished_at", "error",
+)
+
+
+
+def _columns(fields: Optional[Sequence[str]]) -> Tuple[str, ...]:
+    # id en created_ts altijd: nodig voor de keyset-cursor
+    if fields is None:
+        return _META_FIELDS
+    return tuple(f for f in _META_FIELDS if f in fields or f in ("id", "created_ts"))
+
+
+class JobStore(abc.ABC):
+    """Basis-interface; alle methoden zijn synchroon en snel (lokaal)."""
+
+    def __init__(self, ttl_s: float = 7 * 24 * 3600, max_count: int = 10_000, evict_every: int = 100):
+        self.ttl_s = ttl_s
+        self.max_count = max_count
+        self.evict_every = max(1, evict_every)
+        self._writes = 0
+
+    @abc.abstractmethod
+    def create(self, job: Dict[str, Any]) -> None:
+        ...
+
+    @abc.abstractmethod
+    def update(self, job_id: str, **fields: Any) -> None:
+        ...
+
+    @abc.abstractmethod
+    def get(self, job_id: str, include_result: bool = True) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abc.abstractmethod
+    def list(
+        self,
+        limit: Optional[int] = None,
+        include_result: bool = False,
+        status: Optional[str] = None,
+        task: Optional[str] = None,
+        since: Optional[float] = None,
+        before: Optional[Tuple[float, str]] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Nieuwste eerst (created_ts, id aflopend).
+        - status/task: exacte filters
+        - since: alleen jobs met created_ts >= since
+        - before: keyset-cursor (created_ts, id) van het laatste item van de vorige pagina
+        - fields: alleen deze meta-velden (plus id en created_ts voor de cursor); zo wordt bv.
+          een grote payload niet geladen/gedecodeerd als alleen id,status gevraagd is
+        """
+
+    @abc.abstractmethod
+    def delete(self, job_id: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def evict(self, now: Optional[float] = None) -> int:
+        """Ruim afgeronde jobs op volgens TTL en max aantal; geeft aantal verwijderd terug."""
+
+    @abc.abstractmethod
+    def count(self) -> int:
+        ...
+
+    def close(self) -> None:
+        pass
+
+    def _maybe_evict(self) -> None:
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self.evict()
+
+
+class MemoryJobStore(JobStore):
+    def __init__(self, **kw: Any):
+        super().__init__(**kw)
+        self._meta: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._results: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: Dict[str, Any]) -> None:
+        meta = {k: job.get(k) for k in _META_FIELDS}
+        meta["created_ts"] = meta["created_ts"] or time.time()
+        with self._lock:
+            self._meta[job["id"]] = meta
+            if job.get("result") is not None:
+                self._results[job["id"]] = job["result"]
+        self._maybe_evict()
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            meta = self._meta.get(job_id)
+            if meta is None:
+                return
+            if "result" in fields:
+                self._results[job_id] = fields.pop("result")
+            meta.update(fields)
+
+    def _out(
+        self, job_id: str, meta: Dict[str, Any], include_result: bool, cols: Tuple[str, ...] = _META_FIELDS
+    ) -> Dict[str, Any]:
+        out = {k: meta.get(k) for k in cols}
+        if include_result:
+            out["result"] = self._results.get(job_id)
+        return out
+
+    def get(self, job_id: str, include_result: bool = True) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            meta = self._meta.get(job_id)
+            return self._out(job_id, meta, include_result) if meta else None
+
+    def list(
+        self,
+        limit: Optional[int] = None,
+        include_result: bool = False,
+        status: Optional[str] = None,
+        task: Optional[str] = None,
+        since: Optional[float] = None,
+        before: Optional[Tuple[float, str]] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        cols = _columns(fields)
+        with self._lock:
+            out = []
+            for jid in reversed(self._meta):  # invoegvolgorde == created_ts-volgorde
+                if limit is not None and len(out) >= limit:
+                    break
+                m = self._meta[jid]
+                if before is not None and (m["created_ts"], jid) >= before:
+                    continue
+                if since is not None and m["created_ts"] < since:
+                    break
+                if (status and m.get("status") != status) or (task and m.get("task") != task):
+                    continue
+                out.append(self._out(jid, m, include_result, cols))
+            return out
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._meta.pop(job_id, None)
+            self._results.pop(job_id, None)
+
+    def evict(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        with self._lock:
+            finished = [jid for jid, m in self._meta.items() if m.get("status") in FINISHED]
+            doomed = {jid for jid in finished if now - self._meta[jid]["created_ts"] > self.ttl_s}
+            overflow = len(self._meta) - self.max_count
+            for jid in finished:  # oudste eerst
+                if overflow - len(doomed) <= 0:
+                    break
+                doomed.add(jid)
+            for jid in doomed:
+                self._meta.pop(jid, None)
+                self._results.pop(jid, None)
+            return len(doomed)
+
+    def count(self) -> int:
+        return len(self._meta)
+
+
+class SqliteJobStore(JobStore):
+    def __init__(self, path: str, busy_timeout_s: float = 1.0, **kw: Any):
+        super().__init__(**kw)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=busy_timeout_s, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                task TEXT NOT NULL,
+                payload TEXT,
+                priority TEXT,
+                status TEXT NOT NULL,
+                created_ts REAL NOT NULL,
+                created_at TEXT,
+                started_at TEXT,
+                finished_at TEXT,
+                error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS job_results (
+                id TEXT PRIMARY KEY REFERENCES jobs(id) ON DELETE CASCADE,
+                result TEXT
+            );
+            CREATE INDEX IF NOT EXISTS ix_jobs_created ON jobs(created_ts DESC);
+            CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs(status, created_ts DESC);
+            CREATE INDEX IF NOT EXISTS ix_jobs_task_created ON jobs(task, created_ts DESC);
+            """
+        )
+        # jobs die bij een herstart nog liepen komen nooit meer af
+        self._db.execute(
+            "UPDATE jobs SET status='error', error='interrupted by restart' WHERE status IN ('queued','running','scheduled')"
+        )
+
+    def _row(self, row: sqlite3.Row, include_result: bool, cols: Tuple[str, ...] = _META_FIELDS) -> Dict[str, Any]:
+        out = {k: row[k] for k in cols}
+        if "payload" in out:
+            out["payload"] = json.loads(out["payload"]) if out["payload"] else {}
+        if include_result:
+            out["result"] = json.loads(row["result"]) if row["result"] is not None else None
+        return out
+
+    def create(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, task, payload, priority, status, created_ts, created_at, started_at, finished_at, error)"
+                " VALUES (?,?,?,?,?,?,?,?,?,?)",
+                (
+                    job["id"], job["task"], json.dumps(job.get("payload") or {}, default=str), job.get("priority"),
+                    job["status"], job.get("created_ts") or time.time(), job.get("created_at"),
+                    job.get("started_at"), job.get("finished_at"), job.get("error"),
+                ),
+            )
+        self._maybe_evict()
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        result = fields.pop("result", None) if "result" in fields else ...
+        cols = [k for k in fields if k in _META_FIELDS and k != "id"]
+        with self._lock:
+            if cols:
+                vals = [json.dumps(fields[k], default=str) if k == "payload" else fields[k] for k in cols]
+                self._db.execute(
+                    f"UPDATE jobs SET {', '.join(f'{c}=?' for c in cols)} WHERE id=?", (*vals, job_id)
+                )
+            if result is not ...:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO job_results (id, result) VALUES (?, ?)",
+                    (job_id, json.dumps(result, default=str)),
+                )
+
+    def get(self, job_id: str, include_result: bool = True) -> Optional[Dict[str, Any]]:
+        sql = (
+            "SELECT j.*, r.result FROM jobs j LEFT JOIN job_results r ON r.id = j.id WHERE j.id=?"
+            if include_result else "SELECT * FROM jobs WHERE id=?"
+        )
+        with self._lock:
+            row = self._db.execute(sql, (job_id,)).fetchone()
+        return self._row(row, include_result) if row else None
+
+    def list(
+        self,
+        limit: Optional[int] = None,
+        include_result: bool = False,
+        status: Optional[str] = None,
+        task: Optional[str] = None,
+        since: Optional[float] = None,
+        before: Optional[Tuple[float, str]] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        cols = _columns(fields)
+        select = ", ".join(f"j.{c}" for c in cols)
+        sql = (
+            f"SELECT {select}, r.result FROM jobs j LEFT JOIN job_results r ON r.id = j.id"
+            if include_result else f"SELECT {select} FROM jobs j"
+        )
+        where: List[str] = []
+        args: List[Any] = []
+        if status:
+            where.append("j.status = ?")
+            args.append(status)
+        if task:
+            where.append("j.task = ?")
+            args.append(task)
+        if since is not None:
+            where.append("j.created_ts >= ?")
+            args.append(since)
+        if before is not None:
+            where.append("(j.created_ts < ? OR (j.created_ts = ? AND j.id < ?))")
+            args.extend([before[0], before[0], before[1]])
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY j.created_ts DESC, j.id DESC LIMIT ?"
+        args.append(-1 if limit is None else limit)
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [self._row(r, include_result, cols) for r in rows]
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM job_results WHERE id=?", (job_id,))
+            self._db.execute("DELETE FROM jobs WHERE id=?", (job_id,))
+
+    def evict(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        done = ",".join(f"'{s}'" for s in FINISHED)
+        with self._lock:
+            self._db.execute("BEGIN")
+            cur = self._db.execute(
+                f"DELETE FROM jobs WHERE status IN ({done}) AND created_ts < ?", (now - self.ttl_s,)
+            )
+            removed = cur.rowcount
+            total = self._db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            if total > self.max_count:
+                cur = self._db.execute(
+                    f"DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status IN ({done})"
+                    " ORDER BY created_ts ASC LIMIT ?)",
+                    (total - self.max_count,),
+                )
+                removed += cur.rowcount
+            self._db.execute("DELETE FROM job_results WHERE id NOT IN (SELECT id FROM jobs)")
+            self._db.execute("COMMIT")
+        return removed
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def from_env() -> JobStore:
+    kw = {
+        "ttl_s": float(os.getenv("JOB_TTL_S", str(7 * 24 * 3600))),
+        "max_count": int(os.getenv("JOB_MAX_COUNT", "10000")),
+    }
+    if os.getenv("JOB_STORE", "sqlite") == "memory":
+        return MemoryJobStore(**kw)
+    return SqliteJobStore(
+        os.getenv("JOB_DB_PATH", "data/jobs.sqlite3"),
+        busy_timeout_s=float(os.getenv("JOB_DB_BUSY_TIMEOUT_S", "1.0")),
+        **kw,
+    )
+
+
+_STORE: Optional[JobStore] = None
+
+
+def get_store() -> JobStore:
+    """Proces-brede store (gedeeld door main en scheduler)."""
+    global _STORE
+    if _STORE is None:
+        _STORE = from_env()
+    return _STORE
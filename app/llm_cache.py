@@ -0,0 +1,164 @@
+# app/llm_cache.py
+# Content-addressed cache voor LLM-completions.
+# Sleutel = sha256 over (model, messages, temperature, overige params).
+# - tier 1: in-memory LRU met TTL en byte-limiet
+# - tier 2 (optioneel, LLM_CACHE_PATH): SQLite op schijf met TTL en byte-limiet
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+ENABLED = os.getenv("LLM_CACHE", "1") == "1"
+TTL_S = float(os.getenv("LLM_CACHE_TTL_S", "3600"))
+MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+DISK_PATH = os.getenv("LLM_CACHE_PATH", "")
+DISK_MAX_BYTES = int(os.getenv("LLM_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def make_key(params: Dict[str, Any]) -> str:
+    blob = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class MemoryLRU:
+    def __init__(self, max_bytes: int, ttl_s: float):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.bytes = 0
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # key → (expires, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                self._drop(key)
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def put(self, key: str, value: str, ttl_s: Optional[float] = None) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.time() + (ttl_s or self.ttl_s), value)
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._data:
+                self._drop(next(iter(self._data)))
+
+    def _drop(self, key: str) -> None:
+        _, value = self._data.pop(key)
+        self.bytes -= len(value.encode("utf-8"))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    def __init__(self, path: str, max_bytes: int, ttl_s: float):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires REAL NOT NULL,
+                used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_completions_used ON completions(used);
+            """
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM completions WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._db.execute("DELETE FROM completions WHERE key=?", (key,))
+                return None
+            self._db.execute("UPDATE completions SET used=? WHERE key=?", (now, key))
+            return row[0]
+
+    def put(self, key: str, value: str, ttl_s: Optional[float] = None) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO completions (key, value, size, expires, used) VALUES (?,?,?,?,?)",
+                (key, value, size, now + (ttl_s or self.ttl_s), now),
+            )
+            self._db.execute("DELETE FROM completions WHERE expires < ?", (now,))
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+            # minst recent gebruikte eerst weg tot we onder de limiet zitten
+            while total > self.max_bytes:
+                row = self._db.execute("SELECT key, size FROM completions ORDER BY used ASC LIMIT 1").fetchone()
+                if row is None:
+                    break
+                self._db.execute("DELETE FROM completions WHERE key=?", (row[0],))
+                total -= row[1]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+        return {"entries": n, "bytes": size}
+
+
+class CompletionCache:
+    def __init__(self, max_bytes: int = MAX_BYTES, ttl_s: float = TTL_S, disk_path: str = DISK_PATH):
+        self.memory = MemoryLRU(max_bytes, ttl_s)
+        self.disk = DiskCache(disk_path, DISK_MAX_BYTES, ttl_s) if disk_path else None
+        self.counters = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "stores": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.counters["hits_memory"] += 1
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.counters["hits_disk"] += 1
+                self.memory.put(key, value)  # promoveren naar tier 1
+                return value
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, key: str, value: str, ttl_s: Optional[float] = None) -> None:
+        self.counters["stores"] += 1
+        self.memory.put(key, value, ttl_s)
+        if self.disk is not None:
+            self.disk.put(key, value, ttl_s)
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "enabled": ENABLED,
+            **self.counters,
+            "memory": {"entries": len(self.memory), "bytes": self.memory.bytes, "max_bytes": self.memory.max_bytes},
+        }
+        if self.disk is not None:
+            out["disk"] = self.disk.stats()
+        return out
+
+
+CACHE = CompletionCache()
@@ -1,26 +1,206 @@
 import os
-import asyncio
-from typing import List, Dict, Optional, Any
-from litellm import completion
+import time
+from typing import AsyncIterator, Callable, List, Dict, Optional, Any, Tuple
+from litellm import acompletion
+
+from . import llm_cache, llm_scheduler, metrics
 
 MODEL = os.getenv("LLM_MODEL", "openai/gpt-4o-mini")
 DEFAULT_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.3"))
+# optioneel: eigen endpoint (OpenAI-compatible proxy, lokale fake provider)
+API_BASE = os.getenv("LLM_API_BASE") or None
+# providers die een expliciete cache_control-markering nodig hebben voor prompt caching;
+# OpenAI e.d. cachen een identieke prefix (≥1024 tokens) automatisch
+PROMPT_CACHE_PROVIDERS = {
+    p.strip() for p in os.getenv("LLM_PROMPT_CACHE_PROVIDERS", "anthropic,bedrock,vertex_ai").split(",") if p.strip()
+}
+
+# tokens en latency per model (zie usage_stats, /health)
+_USAGE: Dict[str, Dict[str, float]] = {}
 
-async def chat(messages: List[Dict[str, str]], system: Optional[str] = None, temperature: Optional[float] = None) -> str:
+def _params(
+    messages: List[Dict[str, Any]],
+    system: Optional[str],
+    temperature: Optional[float],
+    model: Optional[str] = None,
+    json_mode: bool = False,
+    cache_system: bool = False,
+) -> Dict[str, Any]:
     # LiteLLM expects "messages" like OpenAI chat format
+    model = model or MODEL
     msgs = []
     if system:
-        msgs.append({"role": "system", "content": system})
+        if cache_system and llm_scheduler.provider_of(model) in PROMPT_CACHE_PROVIDERS:
+            # vaste prefix markeren zodat de provider hem hergebruikt
+            msgs.append({
+                "role": "system",
+                "content": [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}],
+            })
+        else:
+            msgs.append({"role": "system", "content": system})
     msgs.extend(messages)
 
-    params: Dict[str, Any] = {
-        "model": MODEL,
+    params = {
+        "model": model,
         "messages": msgs,
         "temperature": temperature if temperature is not None else DEFAULT_TEMPERATURE,
     }
-    # Run in thread to avoid blocking event loop
-    resp = await asyncio.to_thread(completion, **params)
+    if json_mode:
+        params["response_format"] = {"type": "json_object"}
+    return params
+
+def _call_kwargs(params: Dict[str, Any]) -> Dict[str, Any]:
+    # api_base hoort niet in de cache-sleutel
+    return {**params, "api_base": API_BASE} if API_BASE else params
+
+def _cache_key(params: Dict[str, Any], cache: bool) -> Optional[str]:
+    return llm_cache.make_key(params) if cache and llm_cache.ENABLED else None
+
+def _usage(resp: Any) -> Dict[str, int]:
+    u = (resp.get("usage") if isinstance(resp, dict) else getattr(resp, "usage", None)) or {}
+    get = u.get if isinstance(u, dict) else (lambda k, d=None: getattr(u, k, d))
+    details = get("prompt_tokens_details") or {}
+    cached = (details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", 0)) or 0
+    return {
+        "prompt_tokens": int(get("prompt_tokens", 0) or 0),
+        "completion_tokens": int(get("completion_tokens", 0) or 0),
+        # OpenAI: prompt_tokens_details.cached_tokens; Anthropic: cache_read_input_tokens
+        "cached_tokens": int(cached or get("cache_read_input_tokens", 0) or 0),
+    }
+
+def _record(model: str, meta: Dict[str, Any]) -> None:
+    s = _USAGE.setdefault(model, {
+        "calls": 0, "local_cache_hits": 0, "coalesced": 0, "prompt_tokens": 0, "completion_tokens": 0,
+        "cached_tokens": 0, "latency_total_ms": 0.0, "latency_max_ms": 0.0,
+    })
+    if meta["cached"]:
+        s["local_cache_hits"] += 1
+        return
+    if meta.get("coalesced"):
+        # meegelift op de call van een andere aanroeper: tokens zijn daar al geteld
+        s["coalesced"] += 1
+        return
+    s["calls"] += 1
+    for k in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+        s[k] += meta[k]
+        metrics.LLM_TOKENS.inc(meta[k], model=model, kind=k.rsplit("_", 1)[0])
+    s["latency_total_ms"] += meta["latency_ms"]
+    s["latency_max_ms"] = max(s["latency_max_ms"], meta["latency_ms"])
+
+def usage_stats() -> Dict[str, Any]:
+    return {
+        m: {**s, "latency_avg_ms": round(s["latency_total_ms"] / s["calls"], 1) if s["calls"] else 0.0}
+        for m, s in _USAGE.items()
+    }
+
+async def chat_with_usage(
+    messages: List[Dict[str, Any]],
+    system: Optional[str] = None,
+    temperature: Optional[float] = None,
+    cache: bool = True,
+    model: Optional[str] = None,
+    json_mode: bool = False,
+    cache_system: bool = False,
+    cache_if: Optional[Callable[[str], bool]] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Als chat(), plus per call: {model, cached, coalesced?, prompt_tokens, completion_tokens, cached_tokens, latency_ms}.
+    Samengevoegde (single-flight) aanroepers krijgen 0 tokens: die zijn geteld bij de aanroeper die de call deed.
+    json_mode vraagt de provider om een JSON-object (response_format);
+    cache_system markeert de system-prompt als vaste, cachebare prefix;
+    cache_if bepaalt welke antwoorden de cache in mogen (bv. alleen geldige JSON).
+    """
+    params = _params(messages, system, temperature, model, json_mode, cache_system)
+    t0 = time.perf_counter()
+    meta: Dict[str, Any] = {"model": params["model"], "cached": False,
+                            "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    key = _cache_key(params, cache)
+    if key is not None:
+        hit = llm_cache.CACHE.get(key)
+        if hit is not None:
+            meta.update(cached=True, latency_ms=round((time.perf_counter() - t0) * 1000, 1))
+            _record(params["model"], meta)
+            return hit, meta
+
+    # native async: geen executor-thread per request; via de scheduler voor
+    # rate limits en single-flight (ook als de cache uit staat)
+    resp, coalesced = await llm_scheduler.run(
+        params, lambda: acompletion(**_call_kwargs(params)), key=key or llm_cache.make_key(params)
+    )
+    if coalesced:
+        meta["coalesced"] = True
+    else:
+        meta.update(_usage(resp))
+    meta["latency_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    _record(params["model"], meta)
     try:
-        return resp["choices"][0]["message"]["content"]
+        content = resp["choices"][0]["message"]["content"]
     except Exception:
-        return str(resp)
+        return str(resp), meta  # onverwacht antwoord: niet cachen
+    if key is not None and content is not None and (cache_if is None or cache_if(content)):
+        llm_cache.CACHE.put(key, content)
+    return content, meta
+
+async def chat(
+    messages: List[Dict[str, Any]],
+    system: Optional[str] = None,
+    temperature: Optional[float] = None,
+    cache: bool = True,
+    model: Optional[str] = None,
+    json_mode: bool = False,
+    cache_system: bool = False,
+) -> str:
+    content, _ = await chat_with_usage(messages, system, temperature, cache, model, json_mode, cache_system)
+    return content
+
+async def chat_stream(
+    messages: List[Dict[str, Any]],
+    system: Optional[str] = None,
+    temperature: Optional[float] = None,
+    cache: bool = True,
+    model: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    Zelfde als chat(), maar levert tekst-delta's zodra de provider ze stuurt.
+    Usage komt uit de laatste chunk (stream_options.include_usage) en wordt net als bij
+    chat_with_usage geboekt (usage_stats, /metrics), met de latency tot het einde van de stream.
+    """
+    params = _params(messages, system, temperature, model)
+    t0 = time.perf_counter()
+    meta: Dict[str, Any] = {"model": params["model"], "cached": False,
+                            "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    key = _cache_key(params, cache)
+    if key is not None:
+        hit = llm_cache.CACHE.get(key)
+        if hit is not None:
+            meta.update(cached=True, latency_ms=round((time.perf_counter() - t0) * 1000, 1))
+            _record(params["model"], meta)
+            yield hit
+            return
+
+    parts: List[str] = []
+    # bewust zonder single-flight-key: een stream is één iterator voor één lezer en
+    # laat zich niet delen met gelijktijdige aanroepers (die krijgen elk een eigen call)
+    resp, _ = await llm_scheduler.run(
+        params, lambda: acompletion(**_call_kwargs(params), stream=True, stream_options={"include_usage": True})
+    )
+    complete = False
+    try:
+        async for chunk in resp:
+            if getattr(chunk, "usage", None):
+                meta.update(_usage(chunk))
+            try:
+                delta = chunk.choices[0].delta.content
+            except (AttributeError, IndexError):
+                delta = None
+            if delta:
+                parts.append(delta)
+                yield delta
+        complete = True
+    finally:
+        # ook afgebroken streams kosten tokens: altijd boeken (usage is dan wat er binnen was)
+        meta["latency_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        _record(params["model"], meta)
+    # alleen volledige antwoorden cachen (niet bij afgebroken streams)
+    if complete and key is not None and parts:
+        llm_cache.CACHE.put(key, "".join(parts))
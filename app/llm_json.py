@@ -0,0 +1,158 @@
+# app/llm_json.py
+# JSON uit LLM-antwoorden halen en valideren, zonder meteen een nieuwe completion te betalen:
+# - parse(): eerst json.loads; anders lokaal repareren (code fences, tekst eromheen,
+#   trailing comma's, slimme quotes, Python-literals en -dicts)
+# - validators (pydantic, één keer gecompileerd) voor suggesties (type/payload/notes) en build-specs
+# - tellers: hoe vaak reparatie een nieuwe call voorkwam (stats(), /health)
+
+from __future__ import annotations
+import ast
+import json
+import re
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+_STATS = {"direct": 0, "repaired": 0, "reasked": 0, "reask_ok": 0, "failed": 0}
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.S)
+_STRING = re.compile(r'("(?:[^"\\]|\\.)*")')
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"', "‘": "'", "’": "'"})
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+# ---- schema's ----
+class FileSpec(BaseModel):
+    path: str = Field(min_length=1)
+    content: str
+
+
+class BuildSpec(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    files: List[FileSpec] = Field(min_length=1)
+    commit_message: Optional[str] = None
+    summary: Optional[str] = None
+    repo: Optional[str] = None
+    branch: Optional[str] = None
+
+
+class Suggestion(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    type: Literal["build", "commit", "job"]
+    payload: Dict[str, Any]
+    notes: Optional[str] = ""
+
+
+def _errors(e: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(p) for p in err['loc']) or '(root)'}: {err['msg']}" for err in e.errors()]
+
+
+def validate_build_spec(spec: Any) -> List[str]:
+    """Lege lijst = geldig."""
+    try:
+        BuildSpec.model_validate(spec)
+    except ValidationError as e:
+        return _errors(e)
+    return []
+
+
+def validate_suggestion(data: Any) -> List[str]:
+    try:
+        s = Suggestion.model_validate(data)
+    except ValidationError as e:
+        return _errors(e)
+    if s.type == "build":
+        # build: óf een volledige spec met files, óf alleen een 'goal'
+        if "files" in s.payload:
+            return [f"payload.{m}" for m in validate_build_spec(s.payload)]
+        if not isinstance(s.payload.get("goal"), str):
+            return ["payload: build verwacht 'files' of een 'goal'"]
+    if s.type == "job" and not isinstance(s.payload.get("task"), str):
+        return ["payload.task: verplicht voor type 'job'"]
+    return []
+
+
+# ---- parsen en repareren ----
+def _outer_object(text: str) -> Optional[str]:
+    # eerste gebalanceerde {...} of [...], strings en escapes respecterend
+    start = next((i for i, c in enumerate(text) if c in "{["), None)
+    if start is None:
+        return None
+    stack: List[str] = []
+    in_str = esc = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]":
+            if not stack or stack.pop() != c:
+                return None
+            if not stack:
+                return text[start:i + 1]
+    return None
+
+
+def _outside_strings(s: str, fn) -> str:
+    # fn alleen toepassen op de delen buiten JSON-strings
+    return "".join(part if i % 2 else fn(part) for i, part in enumerate(_STRING.split(s)))
+
+
+def _fix_tokens(s: str) -> str:
+    # trailing comma's en Python-literals, alleen buiten strings
+    return _outside_strings(
+        s, lambda part: re.sub(r"\b(True|False|None)\b", lambda m: _PY_LITERALS[m.group(1)], _TRAILING_COMMA.sub(r"\1", part))
+    )
+
+
+def _load(obj: str) -> Optional[Any]:
+    for attempt in (obj, _fix_tokens(obj)):
+        try:
+            return json.loads(attempt)
+        except json.JSONDecodeError:
+            continue
+    try:
+        # Python-dict met enkele quotes; literal_eval voert niets uit
+        lit = ast.literal_eval(obj)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+    return lit if isinstance(lit, (dict, list)) else None
+
+
+def repair(text: str) -> Optional[Any]:
+    """Probeer bijna-geldige JSON te redden; None als dat niet lukt."""
+    candidates = [m.group(1) for m in _FENCE.finditer(text)] + [text]
+    for cand in candidates:
+        # eerst zoals hij is; daarna met slimme quotes als scheidingsteken (nooit binnen waarden)
+        for variant in dict.fromkeys((cand.strip(), _outside_strings(cand, lambda p: p.translate(_QUOTES)).strip())):
+            data = _load(_outer_object(variant) or variant)
+            if data is not None:
+                return data
+    return None
+
+
+def parse(text: str) -> Tuple[Optional[Any], bool]:
+    """(data, gerepareerd). data is None als ook reparatie faalt."""
+    try:
+        return json.loads(text), False
+    except (json.JSONDecodeError, TypeError):
+        pass
+    return repair(text or ""), True
+
+
+def count(outcome: str) -> None:
+    _STATS[outcome] += 1
+
+
+def stats() -> Dict[str, Any]:
+    # elke geslaagde reparatie is een vermeden extra completion
+    return {**_STATS, "recalls_avoided": _STATS["repaired"]}
@@ -0,0 +1,202 @@
+# app/llm_scheduler.py
+# Request-scheduler vóór de LLM-provider:
+# - single-flight: gelijktijdige identieke requests delen één provider-call
+# - token buckets per provider-prefix van LLM_MODEL ("openai/...", "groq/...")
+#     LLM_RPM_<PROVIDER> / LLM_TPM_<PROVIDER>  (bv. LLM_RPM_OPENAI=500, LLM_TPM_OPENAI=200000)
+# - adaptieve backoff: bij 429 zakt de effectieve rate (AIMD) en wordt met jitter opnieuw geprobeerd
+# - metrics: wachttijd in de rij, coalesced calls, retries
+
+from __future__ import annotations
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from . import metrics
+
+T = TypeVar("T")
+
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "1.0"))
+BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "30"))
+
+
+def provider_of(model: str) -> str:
+    return model.split("/", 1)[0] if "/" in model else "default"
+
+
+def estimate_tokens(params: Dict[str, Any]) -> int:
+    # grove schatting (~4 tekens per token) + marge voor het antwoord
+    chars = len(json.dumps(params.get("messages", []), ensure_ascii=False, default=str))
+    return chars // 4 + int(params.get("max_tokens") or 256)
+
+
+def _is_rate_limited(e: Exception) -> bool:
+    return getattr(e, "status_code", None) == 429 or type(e).__name__ == "RateLimitError"
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    resp = getattr(e, "response", None)
+    headers = getattr(resp, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after")) if headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = max(1.0, per_minute / 6)  # burst van ~10 s
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()  # FIFO voor wachtenden
+
+    def _refill(self, factor: float) -> None:
+        now = time.monotonic()
+        rate = self.per_minute * factor / 60.0
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * rate)
+        self._updated = now
+
+    async def take(self, n: float, factor: float = 1.0) -> float:
+        """Neem n tokens; geeft de wachttijd in seconden terug."""
+        n = min(n, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill(factor)
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return waited
+                need = (n - self.tokens) / (self.per_minute * factor / 60.0)
+                await asyncio.sleep(need)
+                waited += need
+
+
+class ProviderLimiter:
+    def __init__(self, name: str):
+        key = name.upper().replace("-", "_")
+        rpm = float(os.getenv(f"LLM_RPM_{key}", os.getenv("LLM_RPM", "0")))
+        tpm = float(os.getenv(f"LLM_TPM_{key}", os.getenv("LLM_TPM", "0")))
+        self.name = name
+        self.rpm = TokenBucket(rpm) if rpm > 0 else None
+        self.tpm = TokenBucket(tpm) if tpm > 0 else None
+        self.factor = 1.0  # adaptieve fractie van de geconfigureerde rate
+        self.stats = {
+            "calls": 0, "coalesced": 0, "retries": 0, "rate_limited": 0, "errors": 0,
+            "queue_wait_total_s": 0.0, "queue_wait_max_s": 0.0,
+        }
+
+    async def acquire(self, tokens: int) -> float:
+        waited = 0.0
+        if self.rpm:
+            waited += await self.rpm.take(1, self.factor)
+        if self.tpm:
+            waited += await self.tpm.take(tokens, self.factor)
+        self.stats["queue_wait_total_s"] += waited
+        self.stats["queue_wait_max_s"] = max(self.stats["queue_wait_max_s"], waited)
+        return waited
+
+    def penalize(self) -> None:
+        self.stats["rate_limited"] += 1
+        self.factor = max(0.1, self.factor * 0.5)
+
+    def reward(self) -> None:
+        self.factor = min(1.0, self.factor + 0.05)
+
+    def snapshot(self) -> Dict[str, Any]:
+        calls = self.stats["calls"]
+        return {
+            **self.stats,
+            "rpm": self.rpm.per_minute if self.rpm else None,
+            "tpm": self.tpm.per_minute if self.tpm else None,
+            "rate_factor": round(self.factor, 3),
+            "queue_wait_avg_s": self.stats["queue_wait_total_s"] / calls if calls else 0.0,
+        }
+
+
+_LIMITERS: Dict[str, ProviderLimiter] = {}
+class _Flight:
+    """Eén gedeelde provider-call: de task is van niemand, de wachtenden worden geteld."""
+
+    def __init__(self, task: "asyncio.Task[Any]"):
+        self.task = task
+        self.waiters = 0
+        self.claimed = False  # heeft al een aanroeper het resultaat als "eigen call" gekregen
+
+
+_INFLIGHT: Dict[str, _Flight] = {}
+
+
+def limiter_for(model: str) -> ProviderLimiter:
+    name = provider_of(model)
+    if name not in _LIMITERS:
+        _LIMITERS[name] = ProviderLimiter(name)
+    return _LIMITERS[name]
+
+
+async def _call_limited(limiter: ProviderLimiter, tokens: int, call: Callable[[], Awaitable[T]]) -> T:
+    attempt = 0
+    while True:
+        await limiter.acquire(tokens)
+        limiter.stats["calls"] += 1
+        t0 = time.perf_counter()
+        try:
+            res = await call()
+        except Exception as e:
+            outcome = "rate_limited" if _is_rate_limited(e) else "error"
+            metrics.LLM_CALL.observe(time.perf_counter() - t0, provider=limiter.name, outcome=outcome)
+            if not _is_rate_limited(e) or attempt >= MAX_RETRIES:
+                limiter.stats["errors"] += 1
+                raise
+            limiter.penalize()
+            limiter.stats["retries"] += 1
+            delay = _retry_after(e) or min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt)
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+            attempt += 1
+            continue
+        metrics.LLM_CALL.observe(time.perf_counter() - t0, provider=limiter.name, outcome="ok")
+        limiter.reward()
+        return res
+
+
+async def run(params: Dict[str, Any], call: Callable[[], Awaitable[T]], key: Optional[str] = None) -> Tuple[T, bool]:
+    """
+    Voer `call` uit binnen de limieten van de provider uit params["model"].
+    Met `key` worden gelijktijdige identieke requests samengevoegd (single-flight).
+    Geeft (resultaat, samengevoegd): per provider-call krijgt precies één aanroeper False, normaal
+    degene die hem startte; is die intussen afgebroken, dan de eerste die het resultaat wel ontvangt.
+    Een afgebroken aanroeper breekt de call niet af voor de anderen; pas als niemand meer wacht.
+    """
+    limiter = limiter_for(params["model"])
+    if key is None:
+        return await _call_limited(limiter, estimate_tokens(params), call), False
+
+    flight = _INFLIGHT.get(key)
+    if flight is None:
+        flight = _Flight(asyncio.ensure_future(_call_limited(limiter, estimate_tokens(params), call)))
+        _INFLIGHT[key] = flight
+        flight.task.add_done_callback(lambda t: _INFLIGHT.pop(key, None) if _INFLIGHT.get(key) is flight else None)
+    else:
+        limiter.stats["coalesced"] += 1
+
+    flight.waiters += 1
+    try:
+        res = await asyncio.shield(flight.task)
+    except asyncio.CancelledError:
+        if flight.waiters == 1 and not flight.task.done():
+            # laatste wachtende weg: de call heeft geen afnemer meer; nieuwe aanroepers starten vers
+            flight.task.cancel()
+            if _INFLIGHT.get(key) is flight:
+                del _INFLIGHT[key]
+        raise
+    finally:
+        flight.waiters -= 1
+    coalesced, flight.claimed = flight.claimed, True
+    return res, coalesced
+
+
+def stats() -> Dict[str, Any]:
+    return {"inflight": len(_INFLIGHT), "providers": {n: l.snapshot() for n, l in _LIMITERS.items()}}
@@ -1,23 +1,53 @@
 import asyncio
+import base64
 import os
 import time
 import uuid
-from typing import Dict, Any
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
 
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
+from . import executor as job_executor
+from . import github_client, http_pool, images, jobstore, llm_cache, llm_json, llm_scheduler, metrics
+from .events import BUS, TERMINAL, event_of, sse
+from .llm_client import chat, chat_stream, usage_stats
+from .scheduler import scheduler
 from .tasks import TASKS
 
-app = FastAPI()
+EXECUTOR = job_executor.from_env()
+# Job store (sqlite/WAL standaard; JOB_STORE=memory voor vluchtig)
+STORE = jobstore.get_store()
+MAX_PAGE = 500
+SSE_KEEPALIVE_S = 15.0
+MAX_LONGPOLL_S = 60.0
 
-# In-memory job store (simpel, genoeg voor deze control-plane)
-JOBS: Dict[str, Dict[str, Any]] = {}
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http_pool.startup()
+    EXECUTOR.start()
+    await scheduler.start(EXECUTOR, run_job)
+    try:
+        yield
+    finally:
+        await scheduler.stop()
+        await EXECUTOR.stop()
+        await http_pool.shutdown()
 
-def _require_api_key(req: Request):
+app = FastAPI(lifespan=lifespan)
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+def _require_api_key(req: Request, allow_query: bool = False):
     expect = os.getenv("X_API_KEY")
     given = req.headers.get("X-API-Key")
+    if allow_query and not given:
+        # alleen voor SSE: EventSource kan geen headers zetten (de key komt dan wel in access logs)
+        given = req.query_params.get("api_key")
     if expect and given != expect:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
@@ -27,21 +57,219 @@ async def health():
         "ok": True,
         "has_build_from_spec": "build_from_spec" in TASKS,
         "tasks": sorted(TASKS.keys())[:20],
+        "jobs": STORE.count(),
+        "http_pool": http_pool.stats(),
+        "github": github_client.stats(),
+        "llm_cache": llm_cache.CACHE.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "llm_usage": usage_stats(),
+        "images": images.stats(),
+        "llm_json": llm_json.stats(),
         "time": time.time(),
     }
 
+@app.post("/chat")
+async def chat_endpoint(req: Request):
+    """
+    body: {"messages":[{role,content},...], "system"?, "temperature"?, "stream"?: true}
+    Standaard streamt dit de tekst zoals die binnenkomt (chunked text/plain);
+    met "stream": false komt er één JSON-antwoord {"reply": "..."}.
+    """
+    _require_api_key(req)
+    body = await req.json()
+    messages = body.get("messages")
+    if not isinstance(messages, list) or not messages:
+        raise HTTPException(status_code=400, detail="messages moet een niet-lege lijst zijn")
+    kw = {"system": body.get("system"), "temperature": body.get("temperature")}
+
+    if body.get("stream", True) is False:
+        return {"reply": await chat(messages, **kw)}
+    return StreamingResponse(
+        chat_stream(messages, **kw),
+        media_type="text/plain; charset=utf-8",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/executor")
+async def executor_stats(req: Request):
+    _require_api_key(req)
+    return EXECUTOR.stats()
+
+@app.get("/scheduler")
+async def scheduler_stats(req: Request):
+    _require_api_key(req)
+    return {**scheduler.stats(), "schedules": scheduler.schedules()}
+
+@app.get("/metrics")
+async def metrics_endpoint(req: Request):
+    """Prometheus-tekstformaat: histogrammen voor wachttijd, looptijd en upstream-latency."""
+    _require_api_key(req)
+    st = EXECUTOR.stats()
+    metrics.EXECUTOR_INFLIGHT.set(st["inflight"])
+    for lane, n in st["queued"].items():
+        metrics.JOB_QUEUE_DEPTH.set(n, lane=lane)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def _parse_since(v: str) -> float:
+    # epoch-seconden of ISO-8601
+    try:
+        return float(v)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(v).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since moet epoch-seconden of ISO-8601 zijn")
+
+def _encode_cursor(job: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(f'{job["created_ts"]!r}|{job["id"]}'.encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        ts, jid = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return float(ts), jid
+    except Exception:
+        raise HTTPException(status_code=400, detail="ongeldige cursor")
+
 @app.get("/jobs")
-async def list_jobs(req: Request):
+async def list_jobs(
+    req: Request,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    task: Optional[str] = None,
+    since: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """
+    Laatste eerst, gepagineerd met een keyset-cursor.
+    `fields=id,status,...` beperkt de kolommen al in de store: `payload` en `result` worden
+    alleen geladen (en gedecodeerd) als ze gevraagd worden.
+    """
     _require_api_key(req)
-    # laatste eerst
-    return dict(reversed(list(JOBS.items())))
+    limit = max(1, min(limit, MAX_PAGE))
+    wanted = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    items = STORE.list(
+        limit=limit + 1,  # één extra om te weten of er een volgende pagina is
+        include_result=bool(wanted and "result" in wanted),
+        status=status,
+        task=task,
+        since=_parse_since(since) if since else None,
+        before=_decode_cursor(cursor) if cursor else None,
+        fields=wanted,
+    )
+    next_cursor = _encode_cursor(items[limit - 1]) if len(items) > limit else None
+    items = items[:limit]
+    if wanted:
+        items = [{k: j.get(k) for k in wanted} for j in items]
+    return {"items": items, "next_cursor": next_cursor}
+
+def _publish(job_id: str) -> None:
+    job = STORE.get(job_id, include_result=False)
+    if job is not None:
+        BUS.publish(job)
+
+async def run_job(job_id: str, task_name: str, payload: Dict[str, Any], profile: bool = False) -> None:
+    """Voer een job uit en schrijf running → done/error; gedeeld door /jobs/create en de scheduler."""
+    STORE.update(job_id, started_at=_now(), status="running")
+    _publish(job_id)
+    try:
+        fn = TASKS[task_name]
+        # sommige taken zijn sync; andere async
+        if asyncio.iscoroutinefunction(fn):
+            if profile:
+                res = await metrics.profile(job_id, lambda: fn(payload))
+            else:
+                res = await fn(payload)
+        else:
+            res = await asyncio.to_thread(fn, payload)  # fallback
+        STORE.update(job_id, result=res, status="done", finished_at=_now())
+    except Exception as e:
+        STORE.update(job_id, error=repr(e), status="error", finished_at=_now())
+    _publish(job_id)
+
+async def _event_stream(req: Request, job_id: Optional[str]):
+    sub = BUS.subscribe(job_id)
+    try:
+        if job_id is not None:
+            # begin met de huidige stand; klaar als de job al afgerond is
+            job = STORE.get(job_id, include_result=False)
+            if job is not None:
+                job = STORE.get(job_id) if job["status"] in TERMINAL else event_of(job)
+            if job is None:
+                # tussen de 404-check en de start van de stream opgeruimd (evict/delete)
+                yield sse({"id": job_id, "error": "job not found"}, name="error")
+                return
+            yield sse(job)
+            if job["status"] in TERMINAL:
+                return
+        while True:
+            try:
+                ev = await asyncio.wait_for(sub[1].get(), timeout=SSE_KEEPALIVE_S)
+            except asyncio.TimeoutError:
+                if await req.is_disconnected():
+                    return
+                yield ": keepalive\n\n"
+                continue
+            if job_id is not None and ev["status"] in TERMINAL:
+                yield sse(STORE.get(job_id) or ev)
+                return
+            yield sse(ev)
+    finally:
+        BUS.unsubscribe(sub)
+
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.get("/jobs/events")
+async def job_events(req: Request):
+    """Firehose van alle job-statusovergangen (SSE, zonder payload en resultaten)."""
+    _require_api_key(req, allow_query=True)
+    return StreamingResponse(_event_stream(req, None), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+@app.get("/jobs/{job_id}/events")
+async def job_id_events(job_id: str, req: Request):
+    """SSE-stream voor één job; sluit na de eindstatus (die bevat het resultaat)."""
+    _require_api_key(req, allow_query=True)
+    if STORE.get(job_id, include_result=False) is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return StreamingResponse(_event_stream(req, job_id), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+@app.get("/jobs/{job_id}/profile")
+async def job_profile(job_id: str, req: Request):
+    """Uitvoer van de sampling profiler voor een job die met "profile": true is gestart."""
+    _require_api_key(req)
+    out = metrics.get_profile(job_id)
+    if out is None:
+        raise HTTPException(status_code=404, detail="geen profiel voor deze job")
+    return PlainTextResponse(out)
 
 @app.get("/jobs/{job_id}")
-async def get_job(job_id: str, req: Request):
+async def get_job(job_id: str, req: Request, wait: float = 0, after: Optional[str] = None):
+    """
+    `wait=N` maakt hier een long-poll van (fallback voor SSE): antwoord zodra de status
+    afwijkt van `after` (standaard: de huidige status) of na N seconden.
+    """
     _require_api_key(req)
-    if job_id not in JOBS:
-        raise HTTPException(status_code=404, detail="job not found")
-    return JOBS[job_id]
+    sub = BUS.subscribe(job_id) if wait > 0 else None
+    try:
+        job = STORE.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="job not found")
+        after = after or job["status"]
+        if sub is None or job["status"] != after or job["status"] in TERMINAL:
+            return job
+        deadline = time.monotonic() + min(wait, MAX_LONGPOLL_S)
+        while (left := deadline - time.monotonic()) > 0:
+            try:
+                ev = await asyncio.wait_for(sub[1].get(), timeout=left)
+            except asyncio.TimeoutError:
+                break
+            if ev["status"] != after:
+                break
+        return STORE.get(job_id)
+    finally:
+        if sub is not None:
+            BUS.unsubscribe(sub)
 
 @app.post("/jobs/create")
 async def create_job(req: Request):
@@ -49,41 +277,40 @@ async def create_job(req: Request):
     body = await req.json()
     task_name = body.get("task")
     payload = body.get("payload", {})
+    lane = body.get("priority", "interactive")
+    profile = bool(body.get("profile"))
 
     if task_name not in TASKS:
         raise HTTPException(status_code=400, detail=f"task '{task_name}' niet beschikbaar")
+    if lane not in job_executor.LANES:
+        raise HTTPException(status_code=400, detail=f"priority '{lane}' onbekend")
 
     job_id = str(uuid.uuid4())
-    JOBS[job_id] = {
+    STORE.create({
         "id": job_id,
         "task": task_name,
         "payload": payload,
-        "status": "running",
-        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "priority": lane,
+        "status": "queued",
+        "created_at": _now(),
+        "created_ts": time.time(),
         "started_at": None,
         "finished_at": None,
-        "result": None,
         "error": None,
-    }
+    })
 
     async def _run():
-        JOBS[job_id]["started_at"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
-        try:
-            fn = TASKS[task_name]
-            # sommige taken zijn sync; andere async
-            if asyncio.iscoroutinefunction(fn):
-                res = await fn(payload)
-            else:
-                res = await asyncio.to_thread(fn, payload)  # fallback
-            JOBS[job_id]["result"] = res
-            JOBS[job_id]["status"] = "done"
-        except Exception as e:
-            JOBS[job_id]["error"] = repr(e)
-            JOBS[job_id]["status"] = "error"
-        finally:
-            JOBS[job_id]["finished_at"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
-
-    asyncio.create_task(_run())
+        await run_job(job_id, task_name, payload, profile=profile)
+
+    try:
+        EXECUTOR.submit(task_name, _run, lane=lane)
+    except job_executor.QueueFull as e:
+        STORE.delete(job_id)
+        raise HTTPException(status_code=429, detail="job queue vol", headers={"Retry-After": str(e.retry_after)})
+    except job_executor.ExecutorUnavailable:
+        STORE.delete(job_id)
+        raise HTTPException(status_code=503, detail="executor niet beschikbaar", headers={"Retry-After": "5"})
+    _publish(job_id)
     return {"job_id": job_id}
 
 # statische UI
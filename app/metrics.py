@@ -0,0 +1,212 @@
+# app/metrics.py
+# Minimale Prometheus-instrumentatie (tekstformaat 0.0.4, zonder extra dependency):
+# - Counter / Gauge / Histogram met labels; render() voor GET /metrics
+# - instrument_tasks(): wikkelt elke TASKS-functie (looptijd, uitkomst, in-flight)
+# - profile(): optionele sampling profiler per job (pyinstrument, indien geïnstalleerd)
+
+from __future__ import annotations
+import asyncio
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:  # sampling profiler is optioneel
+    from pyinstrument import Profiler
+    _HAS_PROFILER = True
+except ImportError:
+    _HAS_PROFILER = False
+
+PROFILE_INTERVAL_S = float(os.getenv("PROFILE_INTERVAL_S", "0.001"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+_DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_REGISTRY: List["_Metric"] = []
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+def _esc(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_fmt(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = _DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            h = self._values.get(key)
+            if h is None:
+                h = self._values[key] = [[0] * len(self.buckets), 0.0, 0]  # (per bucket, som, aantal)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    h[0][i] += 1
+                    break
+            h[1] += value
+            h[2] += 1
+
+    def _samples(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        counts, total, n = value
+        out, acc = [], 0
+        for b, c in zip(self.buckets, counts):
+            acc += c
+            le = 'le="%s"' % _fmt(b)
+            out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {acc}")
+        out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(total)}")
+        out.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return out
+
+
+def render() -> str:
+    lines: List[str] = []
+    for m in _REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---- metrics van de app ----
+JOB_QUEUE_WAIT = Histogram("job_queue_wait_seconds", "Tijd tussen enqueue en start van een job", ("task", "lane"))
+JOB_RUN = Histogram("job_run_seconds", "Looptijd van een task", ("task", "status"))
+JOBS = Counter("jobs_total", "Afgeronde jobs per task en uitkomst", ("task", "status"))
+JOBS_INFLIGHT = Gauge("jobs_inflight", "Lopende jobs per task", ("task",))
+UPSTREAM = Histogram("upstream_request_seconds", "Latency van uitgaande HTTP-calls (tot headers)", ("host", "method", "status"))
+UPSTREAM_INFLIGHT = Gauge("upstream_requests_inflight", "Lopende uitgaande HTTP-calls", ("host",))
+LLM_CALL = Histogram("llm_request_seconds", "Latency van LLM-calls per provider", ("provider", "outcome"))
+LLM_TOKENS = Counter("llm_tokens_total", "LLM-tokens per model en soort", ("model", "kind"))
+JOB_QUEUE_DEPTH = Gauge("job_queue_depth", "Wachtende jobs per lane", ("lane",))
+EXECUTOR_INFLIGHT = Gauge("executor_inflight", "Lopende jobs in de executor")
+
+
+def instrument_tasks(tasks: Dict[str, Callable[..., Any]]) -> None:
+    """Wikkel elke task in-place; geldt zo voor zowel /jobs/create als de scheduler."""
+    for name, fn in list(tasks.items()):
+        if getattr(fn, "__instrumented__", False):
+            continue
+        if asyncio.iscoroutinefunction(fn):
+            async def wrapper(payload: Any, _fn=fn, _name=name) -> Any:
+                JOBS_INFLIGHT.inc(task=_name)
+                t0 = time.perf_counter()
+                status = "error"
+                try:
+                    res = await _fn(payload)
+                    status = "done"
+                    return res
+                finally:
+                    JOB_RUN.observe(time.perf_counter() - t0, task=_name, status=status)
+                    JOBS.inc(task=_name, status=status)
+                    JOBS_INFLIGHT.dec(task=_name)
+        else:
+            def wrapper(payload: Any, _fn=fn, _name=name) -> Any:
+                JOBS_INFLIGHT.inc(task=_name)
+                t0 = time.perf_counter()
+                status = "error"
+                try:
+                    res = _fn(payload)
+                    status = "done"
+                    return res
+                finally:
+                    JOB_RUN.observe(time.perf_counter() - t0, task=_name, status=status)
+                    JOBS.inc(task=_name, status=status)
+                    JOBS_INFLIGHT.dec(task=_name)
+        functools.update_wrapper(wrapper, fn)
+        wrapper.__instrumented__ = True
+        tasks[name] = wrapper
+
+
+# ---- optionele profiler per job ----
+_PROFILES: "OrderedDict[str, str]" = OrderedDict()
+_PROFILE_LOCK = threading.Lock()  # pyinstrument: één profiler tegelijk per thread
+
+
+def profiler_available() -> bool:
+    return _HAS_PROFILER
+
+
+async def profile(job_id: str, run: Callable[[], Awaitable[Any]]) -> Any:
+    """Draai `run` onder de sampling profiler (alleen samples van deze asyncio-task)."""
+    if not _HAS_PROFILER or not _PROFILE_LOCK.acquire(blocking=False):
+        _PROFILES[job_id] = "profiler niet beschikbaar (pyinstrument ontbreekt of al in gebruik)"
+        return await run()
+    profiler = Profiler(interval=PROFILE_INTERVAL_S, async_mode="enabled")
+    profiler.start()
+    try:
+        return await run()
+    finally:
+        profiler.stop()
+        _PROFILES[job_id] = profiler.output_text(unicode=True, show_all=False)
+        _PROFILE_LOCK.release()
+        while len(_PROFILES) > PROFILE_KEEP:
+            _PROFILES.popitem(last=False)
+
+
+def get_profile(job_id: str) -> Optional[str]:
+    return _PROFILES.get(job_id)
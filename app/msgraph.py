@@ -1,58 +1,166 @@
-import os, httpx, datetime
+import os, httpx, datetime, asyncio, time, json, threading
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-GRAPH_BASE = "https://graph.microsoft.com/v1.0"
+from . import http_pool
+
+GRAPH_BASE = os.getenv("MS_GRAPH_BASE", "https://graph.microsoft.com/v1.0")
+LOGIN_BASE = os.getenv("MS_LOGIN_BASE", "https://login.microsoftonline.com")
+DEFAULT_SCOPE = "https://graph.microsoft.com/.default"
+# token zoveel seconden vóór expiry op de achtergrond vernieuwen
+TOKEN_REFRESH_AHEAD_S = float(os.getenv("MS_TOKEN_REFRESH_AHEAD_S", "300"))
+# waar de deltaLinks van iter_delta_messages bewaard worden
+DELTA_STATE_PATH = os.getenv("MS_DELTA_STATE_PATH", "data/msgraph_delta.json")
+MESSAGE_SELECT = "subject,from,receivedDateTime,bodyPreview"
+
+# ---- token cache: (tenant, client_id, scope) → {"token", "expires_at"} ----
+_TOKENS: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+_REFRESHING: Dict[Tuple[str, str, str], "asyncio.Task[str]"] = {}
+_TOKEN_STATS = {"hits": 0, "fetches": 0, "background_refreshes": 0}
 
 def _today_utc_start_iso():
     return datetime.datetime.utcnow().date().isoformat() + "T00:00:00Z"
 
-async def get_token():
+async def _fetch_token(key: Tuple[str, str, str], client_secret: str) -> str:
+    tenant, client_id, scope = key
+    token_url = f"{LOGIN_BASE}/{tenant}/oauth2/v2.0/token"
+    data = {
+        "client_id": client_id,
+        "client_secret": client_secret,
+        "grant_type": "client_credentials",
+        "scope": scope,
+    }
+    client = http_pool.get_client(token_url)
+    r = await client.post(token_url, data=data)
+    r.raise_for_status()
+    j = r.json()
+    _TOKEN_STATS["fetches"] += 1
+    _TOKENS[key] = {"token": j["access_token"], "expires_at": time.time() + float(j.get("expires_in", 3600))}
+    return j["access_token"]
+
+def _refresh(key: Tuple[str, str, str], client_secret: str) -> "asyncio.Task[str]":
+    # single-flight: gelijktijdige aanroepers delen één token-request
+    task = _REFRESHING.get(key)
+    if task is None or task.done():
+        task = asyncio.ensure_future(_fetch_token(key, client_secret))
+        _REFRESHING[key] = task
+        task.add_done_callback(lambda t: _REFRESHING.pop(key, None) if _REFRESHING.get(key) is t else None)
+    return task
+
+async def get_token(scope: str = DEFAULT_SCOPE):
     tenant = os.getenv("MS_TENANT_ID")
     client_id = os.getenv("MS_CLIENT_ID")
     client_secret = os.getenv("MS_CLIENT_SECRET")
     if not all([tenant, client_id, client_secret]):
         raise RuntimeError("Missing MS_TENANT_ID / MS_CLIENT_ID / MS_CLIENT_SECRET")
-    token_url = f"https://login.microsoftonline.com/{tenant}/oauth2/v2.0/token"
-    data = {
-        "client_id": client_id,
-        "client_secret": client_secret,
-        "grant_type": "client_credentials",
-        "scope": "https://graph.microsoft.com/.default",
+    key = (tenant, client_id, scope)
+    cached = _TOKENS.get(key)
+    now = time.time()
+    if cached and cached["expires_at"] - 30 > now:
+        _TOKEN_STATS["hits"] += 1
+        if cached["expires_at"] - TOKEN_REFRESH_AHEAD_S <= now and key not in _REFRESHING:
+            # nog geldig maar bijna verlopen: vernieuwen zonder de aanroeper te laten wachten
+            _TOKEN_STATS["background_refreshes"] += 1
+            task = _refresh(key, client_secret)
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return cached["token"]
+    return await asyncio.shield(_refresh(key, client_secret))
+
+def token_stats() -> Dict[str, Any]:
+    return {**_TOKEN_STATS, "cached": len(_TOKENS)}
+
+def _normalize(m: Dict[str, Any]) -> Dict[str, Any]:
+    frm = (m.get("from") or {}).get("emailAddress") or {}
+    return {
+        "id": m.get("id") or "",
+        "subject": m.get("subject") or "",
+        "from": frm.get("address") or "",
+        "snippet": (m.get("bodyPreview") or "")[:1200],
+        "date": m.get("receivedDateTime") or "",
     }
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.post(token_url, data=data)
+
+async def _iter_pages(url: str, params: Optional[Dict[str, str]] = None, headers: Optional[Dict[str, str]] = None):
+    """Volg @odata.nextLink; levert per pagina de ruwe JSON (één pagina tegelijk in geheugen)."""
+    client = http_pool.get_client(url)
+    while url:
+        access_token = await get_token()  # uit cache; ververst zelf bij lange runs
+        r = await client.get(url, headers={**(headers or {}), "Authorization": f"Bearer {access_token}"}, params=params)
         r.raise_for_status()
-        return r.json()["access_token"]
+        page = r.json()
+        yield page
+        url = page.get("@odata.nextLink")
+        params = None  # nextLink bevat de query al
 
-async def list_today_messages(user_id: str, top: int = 50):
-    access_token = await get_token()
+async def iter_messages(user_id: str, since_iso: Optional[str] = None, page_size: int = 50) -> AsyncIterator[Dict[str, Any]]:
+    """Alle berichten vanaf `since_iso` (standaard: vandaag 00:00 UTC), nieuwste eerst, pagina voor pagina."""
     params = {
-        "$top": str(top),
+        "$top": str(page_size),
         "$orderby": "receivedDateTime desc",
-        "$filter": f"receivedDateTime ge {_today_utc_start_iso()}",
-        "$select": "subject,from,receivedDateTime,bodyPreview"
+        "$filter": f"receivedDateTime ge {since_iso or _today_utc_start_iso()}",
+        "$select": MESSAGE_SELECT,
     }
-    headers = {"Authorization": f"Bearer {access_token}"}
-    url = f"{GRAPH_BASE}/users/{user_id}/messages"
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.get(url, headers=headers, params=params)
-        r.raise_for_status()
-        data = r.json()
-    items = []
-    for m in data.get("value", []):
-        frm = (m.get("from") or {}).get("emailAddress") or {}
-        items.append({
-            "subject": m.get("subject") or "",
-            "from": frm.get("address") or "",
-            "snippet": (m.get("bodyPreview") or "")[:1200],
-            "date": m.get("receivedDateTime") or "",
-        })
-    return items
+    async for page in _iter_pages(f"{GRAPH_BASE}/users/{user_id}/messages", params=params):
+        for m in page.get("value", []):
+            yield _normalize(m)
 
-async def send_mail_plain(user_id: str, to: str, subject: str, body_text: str):
-    access_token = await get_token()
-    url = f"{GRAPH_BASE}/users/{user_id}/sendMail"
-    headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
-    payload = {
+# ---- delta-queries: alleen nieuwe/gewijzigde berichten sinds de vorige run ----
+# read-modify-write van het hele bestand: serieel, anders overschrijven twee keys elkaars deltaLink
+_DELTA_LOCK = threading.Lock()
+
+def _load_delta_state() -> Dict[str, str]:
+    try:
+        with open(DELTA_STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_delta_link(key: str, link: str) -> None:
+    with _DELTA_LOCK:
+        state = _load_delta_state()
+        state[key] = link
+        if os.path.dirname(DELTA_STATE_PATH):
+            os.makedirs(os.path.dirname(DELTA_STATE_PATH), exist_ok=True)
+        tmp = DELTA_STATE_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, DELTA_STATE_PATH)  # atomair
+
+async def iter_delta_messages(user_id: str, folder: str = "inbox", page_size: int = 50) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Graph delta query op een mailfolder. De eerste run levert de hele folder; daarna alleen
+    wat er sinds de opgeslagen deltaLink bij kwam. De deltaLink wordt pas opgeslagen als de
+    generator volledig is doorlopen, zodat een afgebroken run de volgende keer opnieuw begint.
+    Verwijderde berichten ("@removed") worden overgeslagen.
+    """
+    key = f"{user_id}/{folder}"
+    url = _load_delta_state().get(key)
+    params = None
+    if not url:
+        url = f"{GRAPH_BASE}/users/{user_id}/mailFolders/{folder}/messages/delta"
+        params = {"$select": MESSAGE_SELECT}
+    delta_link = None
+    async for page in _iter_pages(url, params=params, headers={"Prefer": f"odata.maxpagesize={page_size}"}):
+        for m in page.get("value", []):
+            if "@removed" not in m:
+                yield _normalize(m)
+        delta_link = page.get("@odata.deltaLink") or delta_link
+    if delta_link:
+        _save_delta_link(key, delta_link)
+
+async def list_today_messages(user_id: str, top: int = 50):
+    # de eerste `top` berichten van vandaag (nieuwste eerst); voor alles: iter_messages
+    out: List[Dict[str, Any]] = []
+    if top <= 0:
+        return out
+    async with aclosing(iter_messages(user_id, page_size=top)) as msgs:
+        async for m in msgs:
+            out.append(m)
+            if len(out) >= top:
+                break
+    return out
+
+def _mail_payload(to: str, subject: str, body_text: str) -> Dict[str, Any]:
+    return {
         "message": {
             "subject": subject,
             "body": {"contentType": "Text", "content": body_text},
@@ -60,7 +168,94 @@ async def send_mail_plain(user_id: str, to: str, subject: str, body_text: str):
         },
         "saveToSentItems": True
     }
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.post(url, headers=headers, json=payload)
-        r.raise_for_status()
-        return True
+
+async def send_mail_plain(user_id: str, to: str, subject: str, body_text: str):
+    access_token = await get_token()
+    url = f"{GRAPH_BASE}/users/{user_id}/sendMail"
+    headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
+    payload = _mail_payload(to, subject, body_text)
+    client = http_pool.get_client(url)
+    r = await client.post(url, headers=headers, json=payload)
+    r.raise_for_status()
+    return True
+
+# ---- bulk verzenden via JSON $batch (max 20 requests per batch) ----
+BATCH_SIZE = 20
+_RETRYABLE = (429, 503, 504)
+
+def _retry_after_s(headers: Optional[Dict[str, Any]], attempt: int) -> float:
+    try:
+        return float((headers or {}).get("Retry-After") or (headers or {}).get("retry-after"))
+    except (TypeError, ValueError):
+        return min(30.0, 2.0 ** attempt)
+
+async def _send_batch(user_id: str, items: List[Tuple[int, Dict[str, str]]], max_retries: int) -> Dict[int, Dict[str, Any]]:
+    """Eén $batch; alleen de gethrottelde items worden opnieuw verstuurd. Geeft index → uitkomst."""
+    url = f"{GRAPH_BASE}/$batch"
+    client = http_pool.get_client(url)
+    pending = dict(items)
+    results: Dict[int, Dict[str, Any]] = {}
+    for attempt in range(max_retries + 1):
+        access_token = await get_token()
+        body = {
+            "requests": [
+                {
+                    "id": str(i),
+                    "method": "POST",
+                    "url": f"/users/{user_id}/sendMail",
+                    "headers": {"Content-Type": "application/json"},
+                    "body": _mail_payload(m["to"], m["subject"], m["body_text"]),
+                }
+                for i, m in pending.items()
+            ]
+        }
+        r = await client.post(url, headers={"Authorization": f"Bearer {access_token}"}, json=body)
+        if r.status_code in _RETRYABLE:
+            wait = _retry_after_s(r.headers, attempt)
+        else:
+            r.raise_for_status()
+            wait = 0.0
+            for resp in r.json().get("responses", []):
+                i = int(resp["id"])
+                status = int(resp.get("status", 0))
+                if status in _RETRYABLE:
+                    wait = max(wait, _retry_after_s(resp.get("headers"), attempt))
+                    continue
+                pending.pop(i, None)
+                results[i] = {"status": status, "error": None if status < 400 else (resp.get("body") or {}).get("error")}
+        if not pending:
+            break
+        if attempt < max_retries:
+            await asyncio.sleep(wait)
+    for i in pending:
+        results[i] = {"status": 429, "error": "throttled: retries exhausted"}
+    return results
+
+async def send_mail_bulk(user_id: str, messages: List[Dict[str, str]], concurrency: int = 4, max_retries: int = 5) -> Dict[str, Any]:
+    """
+    messages: [{to, subject, body_text}, ...]
+    Verpakt per 20 sendMail-operaties in een $batch, met max `concurrency` batches tegelijk.
+    Een batch die faalt (HTTP-fout of transportfout) komt per bericht in `failed`
+    (status 0 bij een transportfout); de andere batches tellen gewoon mee.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+    indexed = list(enumerate(messages))
+    chunks = [indexed[i:i + BATCH_SIZE] for i in range(0, len(indexed), BATCH_SIZE)]
+
+    async def _one(chunk):
+        async with sem:
+            try:
+                return await _send_batch(user_id, chunk, max_retries)
+            except httpx.HTTPError as e:
+                # één mislukte batch kost alleen die batch; wat al verstuurd is blijft geteld
+                status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else 0
+                return {i: {"status": status, "error": repr(e)} for i, _ in chunk}
+
+    results: Dict[int, Dict[str, Any]] = {}
+    for part in await asyncio.gather(*(_one(c) for c in chunks)):
+        results.update(part)
+    failed = [
+        {"index": i, "to": messages[i]["to"], **res}
+        for i, res in sorted(results.items()) if not 200 <= res["status"] < 300
+    ]
+    return {"sent": len(messages) - len(failed), "failed": failed, "batches": len(chunks)}
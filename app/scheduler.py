@@ -1,133 +1,260 @@
 # app/scheduler.py
-# Eenvoudige in-memory jobrunner die in hetzelfde proces draait als FastAPI.
-# Wordt gestart vanuit app.main via scheduler.start()
+# Terugkerende jobs (interval in seconden of cron "m h dom mon dow") in hetzelfde event loop als FastAPI.
+# Afgevuurde jobs gaan naar de gedeelde JobExecutor (lane "scheduled"): zelfde globale cap,
+# per-task limieten en statusverloop als /jobs/create. Gestart/gestopt vanuit de lifespan in app.main.
 
 from __future__ import annotations
-import threading, time, uuid, logging, asyncio
-from typing import Dict, Any, Deque, Optional, List, Callable
-from collections import deque
-from datetime import datetime
+import asyncio, logging, os, json, time, uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from datetime import datetime, timedelta
 
-from .tasks import TASK_REGISTRY  # async functies: async def foo(payload)->dict
+from .tasks import TASKS  # async functies: async def foo(payload)->dict
+from .jobstore import get_store
+from .executor import JobExecutor, ExecutorUnavailable, QueueFull
 
 log = logging.getLogger("uvicorn.error")
 
-# ---- interne staat ----
-_JOBS: Dict[str, Dict[str, Any]] = {}
-_QUEUE: Deque[str] = deque()
-_STARTED = False
-_LOCK = threading.Lock()
 
 def _now_iso() -> str:
     return datetime.utcnow().isoformat(timespec="seconds") + "Z"
 
-def list_jobs() -> List[Dict[str, Any]]:
-    # Lijst is handig voor UI
-    with _LOCK:
-        # meest recente eerst
+
+# ---- cron ----
+_CRON_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+
+def _cron_field(expr: str, lo: int, hi: int) -> Set[int]:
+    out: Set[int] = set()
+    for part in expr.split(","):
+        step = 1
+        if "/" in part:
+            part, s = part.split("/", 1)
+            step = int(s)
+        if part == "*":
+            a, b = lo, hi
+        elif "-" in part:
+            a, b = (int(x) for x in part.split("-", 1))
+        else:
+            a = b = int(part)
+        out.update(range(a, b + 1, step))
+    if hi == 6:  # dow: 7 == zondag
+        out = {0 if v == 7 else v for v in out}
+    if not out or min(out) < lo or max(out) > hi:
+        raise ValueError(f"cron-veld '{expr}' buiten bereik {lo}-{hi}")
+    return out
+
+
+class Cron:
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError("cron verwacht 5 velden: 'min uur dag maand weekdag'")
+        self.expr = expr
+        self.minute, self.hour, self.dom, self.month, self.dow = (
+            _cron_field(f, lo, hi) for f, (lo, hi) in zip(fields, _CRON_RANGES)
+        )
+        self._dom_any = fields[2] == "*"
+        self._dow_any = fields[4] == "*"
+
+    def _day_ok(self, d: datetime) -> bool:
+        dom_ok = d.day in self.dom
+        dow_ok = (d.weekday() + 1) % 7 in self.dow
+        if self._dom_any or self._dow_any:
+            return dom_ok and dow_ok
+        return dom_ok or dow_ok  # klassieke cron: OR als beide beperkt zijn
+
+    def next_after(self, t: datetime) -> datetime:
+        t = t.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.month:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_ok(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hour:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minute:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"cron '{self.expr}' vuurt nooit")
+
+
+# ---- scheduler ----
+# (job_id, task, payload) → draait de job en schrijft status/resultaat (zie app.main.run_job)
+RunJob = Callable[[str, str, Dict[str, Any]], Awaitable[None]]
+
+
+class _Scheduler:
+    def __init__(self):
+        self._schedules: Dict[str, Dict[str, Any]] = {}
+        self._timer_task: Optional[asyncio.Task] = None
+        self._changed: Optional[asyncio.Event] = None
+        self._executor: Optional[JobExecutor] = None
+        self._run_job: Optional[RunJob] = None
+        self._started = False
+        self._rejected = 0
+        # enqueue→start latentie (seconden)
+        self._lat_n = 0
+        self._lat_sum = 0.0
+        self._lat_max = 0.0
+        self._lat_last = 0.0
+
+    # ---- levenscyclus ----
+    async def start(self, executor: JobExecutor, run_job: RunJob) -> None:
+        if self._started:
+            return
+        self._started = True
+        self._executor = executor
+        self._run_job = run_job
+        self._changed = asyncio.Event()
+        self._timer_task = asyncio.create_task(self._timer(), name="job-timer")
+        log.info("[jobs] scheduler started (%d schedules)", len(self._schedules))
+
+    async def stop(self) -> None:
+        self._started = False
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+            await asyncio.gather(self._timer_task, return_exceptions=True)
+            self._timer_task = None
+
+    # ---- publiek ----
+    def add_oneoff_job(self, task: str, payload: Dict[str, Any]) -> str:
+        """Maak een job aan en zet hem in de lane "scheduled" van de executor."""
+        if task not in TASKS:
+            raise ValueError(f"Unknown task: {task}")
+        if self._executor is None:
+            raise ExecutorUnavailable("scheduler is niet gestart")
+        jid = str(uuid.uuid4())
+        payload = payload or {}
+        store = get_store()
+        store.create({
+            "id": jid,
+            "task": task,
+            "payload": payload,
+            "priority": "scheduled",
+            "status": "queued",
+            "created_at": _now_iso(),
+            "created_ts": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+        })
+        enqueued = time.monotonic()
+
+        async def _runner():
+            lat = time.monotonic() - enqueued
+            self._lat_n += 1
+            self._lat_sum += lat
+            self._lat_last = lat
+            self._lat_max = max(self._lat_max, lat)
+            await self._run_job(jid, task, payload)
+
+        try:
+            self._executor.submit(task, _runner, lane="scheduled")
+        except (QueueFull, ExecutorUnavailable) as e:
+            self._rejected += 1
+            store.update(jid, status="error", finished_at=_now_iso(), error=repr(e))
+            raise
+        return jid
+
+    def add_interval_job(self, task: str, payload: Dict[str, Any], seconds: float, name: Optional[str] = None) -> str:
+        if seconds <= 0:
+            raise ValueError("interval moet > 0 zijn")
+        return self._add_schedule(task, payload, name, every=float(seconds))
+
+    def add_cron_job(self, task: str, payload: Dict[str, Any], cron: str, name: Optional[str] = None) -> str:
+        return self._add_schedule(task, payload, name, cron=Cron(cron))
+
+    def remove_schedule(self, name: str) -> bool:
+        found = self._schedules.pop(name, None) is not None
+        if found and self._changed:
+            self._changed.set()
+        return found
+
+    def schedules(self) -> List[Dict[str, Any]]:
         return [
             {
-                "id": jid,
-                "task": j["task"],
-                "status": j["status"],
-                "created_at": j.get("created_at"),
-                "started_at": j.get("started_at"),
-                "finished_at": j.get("finished_at"),
-                "result": j.get("result"),
-                "error": j.get("error"),
+                "name": name,
+                "task": s["task"],
+                "every": s.get("every"),
+                "cron": s["cron"].expr if s.get("cron") else None,
+                "next_run": datetime.fromtimestamp(s["next"]).isoformat(timespec="seconds"),
             }
-            for jid, j in sorted(_JOBS.items(), key=lambda kv: kv[1].get("created_at",""), reverse=True)
+            for name, s in self._schedules.items()
         ]
 
-def get_job(job_id: str) -> Optional[Dict[str, Any]]:
-    with _LOCK:
-        j = _JOBS.get(job_id)
-        if not j:
-            return None
-        # geef een kopie terug (zonder mutatie)
+    def stats(self) -> Dict[str, Any]:
         return {
-            "id": job_id,
-            "task": j["task"],
-            "status": j["status"],
-            "created_at": j.get("created_at"),
-            "started_at": j.get("started_at"),
-            "finished_at": j.get("finished_at"),
-            "result": j.get("result"),
-            "error": j.get("error"),
+            "schedules": len(self._schedules),
+            "started_jobs": self._lat_n,
+            "rejected": self._rejected,
+            "enqueue_to_start_ms": {
+                "last": round(self._lat_last * 1000, 3),
+                "avg": round(self._lat_sum / self._lat_n * 1000, 3) if self._lat_n else 0.0,
+                "max": round(self._lat_max * 1000, 3),
+            },
         }
 
-async def _run_task_async(task_name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-    func = TASK_REGISTRY.get(task_name)
-    if not func:
-        raise ValueError(f"Unknown task: {task_name}")
-    # func is async
-    return await func(payload)
-
-def _worker_loop():
-    log.info("[jobs] worker thread started")
-    while True:
-        job_id = None
-        with _LOCK:
-            if _QUEUE:
-                job_id = _QUEUE.popleft()
-        if not job_id:
-            time.sleep(0.15)
-            continue
-
-        with _LOCK:
-            job = _JOBS.get(job_id)
-            if not job:
-                # kan gebeuren bij reset
-                continue
-            job["status"] = "running"
-            job["started_at"] = _now_iso()
+    # ---- intern ----
+    def _add_schedule(self, task: str, payload: Dict[str, Any], name: Optional[str], **kind: Any) -> str:
+        if task not in TASKS:
+            raise ValueError(f"Unknown task: {task}")
+        name = name or f"{task}-{uuid.uuid4().hex[:8]}"
+        entry = {"task": task, "payload": payload or {}, **kind}
+        entry["next"] = self._next_fire(entry, time.time())
+        self._schedules[name] = entry
+        if self._changed:
+            self._changed.set()
+        return name
 
-        try:
-            result = asyncio.run(_run_task_async(job["task"], job.get("payload", {})))
-            with _LOCK:
-                job["status"] = "done"
-                job["finished_at"] = _now_iso()
-                job["result"] = result
-            log.info("[jobs] %s done", job_id)
-        except Exception as e:
-            with _LOCK:
-                job["status"] = "failed"
-                job["finished_at"] = _now_iso()
-                job["error"] = str(e)
-            log.exception("[jobs] %s failed: %s", job_id, e)
+    @staticmethod
+    def _next_fire(entry: Dict[str, Any], now: float) -> float:
+        if entry.get("every"):
+            return now + entry["every"]
+        return entry["cron"].next_after(datetime.fromtimestamp(now)).timestamp()
 
-def add_oneoff_job(task: str, payload: Dict[str, Any]) -> str:
-    if task not in TASK_REGISTRY:
-        raise ValueError(f"Unknown task: {task}")
-    jid = str(uuid.uuid4())
-    with _LOCK:
-        _JOBS[jid] = {
-            "task": task,
-            "payload": payload or {},
-            "status": "scheduled",
-            "created_at": _now_iso(),
-        }
-        _QUEUE.append(jid)
-    return jid
+    async def _timer(self) -> None:
+        while True:
+            now = time.time()
+            for entry in list(self._schedules.values()):
+                if entry["next"] <= now:
+                    try:
+                        self.add_oneoff_job(entry["task"], entry["payload"])
+                    except (QueueFull, ExecutorUnavailable) as e:
+                        log.warning("[jobs] schedule voor %s overgeslagen: %r", entry["task"], e)
+                    entry["next"] = self._next_fire(entry, now)
+            wait = min((e["next"] for e in self._schedules.values()), default=now + 3600) - time.time()
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=max(0.0, wait))
+            except asyncio.TimeoutError:
+                pass
 
-class _Scheduler:
-    def __init__(self):
-        self._started = False
-        self._thread: Optional[threading.Thread] = None
-
-    def start(self):
-        global _STARTED
-        with _LOCK:
-            if self._started:
-                return
-            self._started = True
-        t = threading.Thread(target=_worker_loop, name="job-worker", daemon=True)
-        t.start()
-        self._thread = t
-        log.info("[jobs] scheduler started")
-
-scheduler = _Scheduler()
-def reset():
-    with _LOCK:
-        _JOBS.clear()
-        _QUEUE.clear()
+
+def _from_env() -> _Scheduler:
+    s = _Scheduler()
+    # SCHEDULES='[{"name":"weekly","task":"weekly_bekendmakingen","cron":"0 7 * * 1","payload":{"dry_run":true}}]'
+    for entry in json.loads(os.getenv("SCHEDULES", "[]") or "[]"):
+        if entry.get("cron"):
+            s.add_cron_job(entry["task"], entry.get("payload") or {}, entry["cron"], name=entry.get("name"))
+        else:
+            s.add_interval_job(entry["task"], entry.get("payload") or {}, float(entry["every"]), name=entry.get("name"))
+    return s
+
+
+scheduler = _from_env()
+
+
+# ---- module-API (compatibel met de oude jobrunner) ----
+def list_jobs() -> List[Dict[str, Any]]:
+    # Lijst is handig voor UI; meest recente eerst
+    return get_store().list(include_result=True)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return get_store().get(job_id)
+
+
+def add_oneoff_job(task: str, payload: Dict[str, Any]) -> str:
+    return scheduler.add_oneoff_job(task, payload)
@@ -1,6 +1,12 @@
 import json
+import os
 from typing import Any, Dict, List, Tuple
-from .llm_client import chat  # jouw bestaande helper
+from . import llm_json
+from .images import prepare_image
+from .llm_client import chat_with_usage  # jouw bestaande helper
+
+# max. aantal herkansingen als het antwoord ook na lokale reparatie ongeldig is
+REASKS = int(os.getenv("SUGGEST_MAX_REASKS", "1"))
 
 SUGGEST_SYSTEM = """Je bent een planner die ALLEEN geldige JSON teruggeeft.
 GEEN tekst buiten JSON. GEEN code fences.
@@ -40,7 +46,7 @@ def _examples_block() -> str:
                 "type": "job",
                 "payload": {
                     "task": "weekly_bekendmakingen",
-                    "payload": {"dry_run": true}
+                    "payload": {"dry_run": True}
                 },
                 "notes": "Veilige dry-run van de wekelijkse job."
             }
@@ -66,28 +72,32 @@ def _examples_block() -> str:
         parts.append(f'User: {ex["user"]}\nReturn:\n{json.dumps(ex["json"], ensure_ascii=False)}')
     return "\n\n".join(parts)
 
-def _mk_user_message(prompt: str, image_b64: str | None) -> List[Dict[str, Any]]:
+# Vaste prefix (regels + voorbeelden), één keer opgebouwd en byte-voor-byte gelijk per call:
+# zo kan de provider hem cachen. Alleen het user-bericht hieronder varieert.
+SUGGEST_PREFIX = f"""{SUGGEST_SYSTEM}
+Voorbeelden:
+{_examples_block()}
+"""
+
+def _mk_user_message(prompt: str, image_url: str | None) -> List[Dict[str, Any]]:
     """
     Maak een multimodal bericht:
-    - Als image_b64 meegegeven → text + image.
+    - Als image_url (data-URL uit prepare_image) meegegeven → text + image.
     - Anders enkel text.
     """
     base_text = f"""Zet dit om naar een veilig voorstel (rooktest/dry-run waar kan) in JSON.
 
 INPUT:
 {prompt}
-
-Voorbeelden:
-{_examples_block()}
 """
-    if image_b64:
-        # multimodal: tekst + afbeelding
+    if image_url:
+        # multimodal: tekst + afbeelding (OpenAI/LiteLLM image_url-formaat)
         return [
             {
                 "role": "user",
                 "content": [
                     {"type": "text", "text": base_text},
-                    {"type": "image", "image_base64": image_b64}
+                    {"type": "image_url", "image_url": {"url": image_url}}
                 ],
             }
         ]
@@ -95,26 +105,68 @@ Voorbeelden:
         # tekst-only
         return [{"role": "user", "content": base_text}]
 
-async def suggest_from_text(prompt: str, image_b64: str | None = None, model: str = "gpt-4o-mini") -> Dict[str, Any]:
+def _check(out: str) -> Tuple[Any, List[str], bool]:
+    """(data, fouten, gerepareerd)"""
+    data, repaired = llm_json.parse(out)
+    if data is None:
+        return None, ["geen (herstelbare) JSON gevonden"], repaired
+    return data, llm_json.validate_suggestion(data), repaired
+
+def _valid(out: str) -> bool:
+    # alleen bruikbare voorstellen cachen; anders blijft een herhaalde vraag de fout teruggeven
+    return not _check(out)[1]
+
+async def suggest_from_text(prompt: str, image_b64: str | None = None, model: str | None = None) -> Dict[str, Any]:
     """
     Zet vrije NL-opdracht (+optioneel schets) om naar een veilig voorstel (pure JSON).
+    model: standaard LLM_MODEL. 'usage' bevat tokens en latency van deze call.
     """
-    messages = _mk_user_message(prompt, image_b64)
+    image = None
+    if image_b64:
+        # verkleind en gecachet: dezelfde schets levert steeds dezelfde kleine payload
+        try:
+            image = await prepare_image(image_b64)
+        except ValueError as e:
+            return {"ok": False, "error": str(e)}
+    messages = _mk_user_message(prompt, image["url"] if image else None)
 
-    out = await chat(
-        system=SUGGEST_SYSTEM,
+    out, usage = await chat_with_usage(
+        system=SUGGEST_PREFIX,
         messages=messages,
         model=model,
-        json_mode=True  # heel belangrijk: dwing JSON-antwoord af
+        json_mode=True,  # heel belangrijk: dwing JSON-antwoord af
+        cache_system=True,
+        cache_if=_valid,
     )
+    if image:
+        usage["image"] = {k: image[k] for k in ("mime", "bytes_in", "bytes_out", "cached")}
 
-    # out is JSON-string → parse
-    try:
-        data = json.loads(out)
-    except json.JSONDecodeError as e:
-        return {"ok": False, "error": f"Model gaf geen geldige JSON: {e}", "raw": out}
-
-    if not isinstance(data, dict) or "type" not in data or "payload" not in data:
-        return {"ok": False, "error": "JSON mist verplichte velden 'type' en/of 'payload'.", "raw": data}
+    data, errors, repaired = _check(out)
+    if not errors:
+        llm_json.count("repaired" if repaired else "direct")
+    for _ in range(REASKS if errors else 0):
+        # gerichte herkansing met de fouten erbij, alleen als lokale reparatie faalde
+        llm_json.count("reasked")
+        fixed, usage2 = await chat_with_usage(
+            system=SUGGEST_PREFIX,
+            messages=messages + [
+                {"role": "assistant", "content": out},
+                {"role": "user", "content": "Dit was geen geldig voorstel volgens het schema:\n- "
+                    + "\n- ".join(errors) + "\nGeef ALLEEN het gecorrigeerde JSON-object."},
+            ],
+            model=model,
+            json_mode=True,
+            cache_system=True,
+            cache_if=_valid,
+        )
+        usage["reask"] = usage2
+        data, errors, _ = _check(fixed)
+        out = fixed
+        if not errors:
+            llm_json.count("reask_ok")
+            break
 
-    return {"ok": True, "suggestion": data}
+    if errors:
+        llm_json.count("failed")
+        return {"ok": False, "error": "Model gaf geen geldig voorstel: " + "; ".join(errors), "raw": out, "usage": usage}
+    return {"ok": True, "suggestion": data, "usage": usage}
@@ -1,104 +1,68 @@
 # app/tasks.py
 from __future__ import annotations
-import os
 import base64
-import json
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List
 
-import requests
+from . import builder, github_client, metrics
+from .bekendmakingen_job import run_weekly_digest
+from .suggestor import suggest_from_text
 
-# ====== Helpers voor GitHub Contents API ======
+# ====== Helpers voor GitHub (implementatie in app/github_client.py) ======
 
-GITHUB_API = "https://api.github.com"
-
-
-def _gh_headers() -> Dict[str, str]:
-    token = os.getenv("GH_TOKEN") or os.getenv("GITHUB_TOKEN")
+def _gh_token() -> str:
+    token = github_client.env_token()
     if not token:
         raise RuntimeError("GH_TOKEN (of GITHUB_TOKEN) ontbreekt in environment.")
-    return {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/vnd.github+json",
-    }
+    return token
 
 
-def _get_file_sha(repo: str, path: str, branch: str) -> Optional[str]:
-    url = f"{GITHUB_API}/repos/{repo}/contents/{path}"
-    r = requests.get(url, params={"ref": branch}, headers=_gh_headers(), timeout=30)
-    if r.status_code == 200:
-        data = r.json()
-        return data.get("sha")
-    elif r.status_code == 404:
-        return None
-    else:
-        raise RuntimeError(f"GitHub GET {path} failed: {r.status_code} {r.text}")
-
-
-def _put_file(repo: str, path: str, branch: str, message: str, content_str: str) -> Dict[str, Any]:
-    url = f"{GITHUB_API}/repos/{repo}/contents/{path}"
-    sha = _get_file_sha(repo, path, branch)
-    payload = {
-        "message": message,
-        "content": base64.b64encode(content_str.encode("utf-8")).decode("ascii"),
-        "branch": branch,
-    }
-    if sha:
-        payload["sha"] = sha
-    r = requests.put(url, headers=_gh_headers(), data=json.dumps(payload), timeout=60)
-    if r.status_code not in (200, 201):
-        raise RuntimeError(f"GitHub PUT {path} failed: {r.status_code} {r.text}")
-    return r.json()
-
-
-def _get_raw_file(repo: str, path: str, branch: str) -> Dict[str, Any]:
-    # Gebruik Contents API (handig voor encoding/sha)
-    url = f"{GITHUB_API}/repos/{repo}/contents/{path}"
-    r = requests.get(url, params={"ref": branch}, headers=_gh_headers(), timeout=30)
-    if r.status_code != 200:
-        raise RuntimeError(f"GitHub GET {path} failed: {r.status_code} {r.text}")
-    data = r.json()
-    if data.get("encoding") == "base64":
-        raw = base64.b64decode(data.get("content", "")).decode("utf-8", errors="replace")
-    else:
-        raw = data.get("content", "")
-    return {"path": path, "branch": branch, "sha": data.get("sha"), "content": raw}
+def _content(f: Dict[str, Any]) -> str | bytes:
+    # binaire bestanden komen als base64 binnen (JSON-payload)
+    if f.get("content_base64") is not None:
+        return base64.b64decode(f["content_base64"])
+    return f.get("content", "")
 
 
 # ====== Tasks die door de jobs-API worden aangeroepen ======
 
 async def commit_file(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
-    payload: { repo, branch, path, message, content }
+    payload: { repo, branch, path, message, content | content_base64 }
     """
     repo = payload["repo"]
     branch = payload.get("branch", "main")
     path = payload["path"]
     message = payload.get("message", f"update {path} via API")
-    content = payload.get("content", "")
+    content = _content(payload)
 
-    res = _put_file(repo, path, branch, message, content)
+    res = await github_client.commit_file(
+        token=_gh_token(), repo=repo, path=path, content=content, message=message, branch=branch
+    )
+    if res.get("unchanged"):
+        return {"ok": True, "committed": [], "skipped": [path], "response": None}
     return {"ok": True, "committed": [path], "response": res}
 
 
 async def commit_files(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
-    payload: { repo, branch, message, files: [ {path, content}, ... ] }
+    payload: { repo, branch, message, files: [ {path, content | content_base64}, ... ] }
     """
     repo = payload["repo"]
     branch = payload.get("branch", "main")
     message = payload.get("message", "update files via API")
-    files: List[Dict[str, str]] = payload.get("files", [])
+    files: List[Dict[str, Any]] = [{"path": f["path"], "content": _content(f)} for f in payload.get("files", [])]
 
-    committed = []
-    responses = []
-    for f in files:
-        path = f["path"]
-        content = f.get("content", "")
-        res = _put_file(repo, path, branch, message, content)
-        committed.append(path)
-        responses.append(res)
+    if not files:
+        return {"ok": True, "committed": [], "commit": None}
 
-    return {"ok": True, "committed": committed, "responses": responses}
+    # één atomaire commit i.p.v. een GET+PUT per bestand
+    res = await github_client.commit_files(token=_gh_token(), repo=repo, files=files, message=message, branch=branch)
+    return {
+        "ok": True,
+        "committed": [c["path"] for c in res["committed"]],
+        "skipped": res["skipped"],
+        "commit": res["commit"],
+    }
 
 
 async def raw_file(payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -108,18 +72,35 @@ async def raw_file(payload: Dict[str, Any]) -> Dict[str, Any]:
     repo = payload["repo"]
     branch = payload.get("branch", "main")
     path = payload["path"]
-    res = _get_raw_file(repo, path, branch)
+    res = await github_client.raw_file(token=_gh_token(), repo=repo, path=path, branch=branch)
     return {"ok": True, **res}
 
 
-# Voorbeeld van je wekelijkse job (stub): werkt al voor dry-run
+# Wekelijkse digest van bekendmakingen (zie app/bekendmakingen_job.py)
 async def weekly_bekendmakingen(payload: Dict[str, Any]) -> Dict[str, Any]:
-    dry = bool(payload.get("dry_run"))
-    return {
-        "ok": True,
-        "dry_run": dry,
-        "note": "stub weekly_bekendmakingen — vul eigen logica in of vervang door echte implementatie"
-    }
+    """
+    payload: { dry_run?, days?, config_path? }
+    """
+    kw: Dict[str, Any] = {"dry_run": bool(payload.get("dry_run", True)), "days": int(payload.get("days", 7))}
+    if payload.get("config_path"):
+        kw["config_path"] = payload["config_path"]
+    return await run_weekly_digest(**kw)
+
+
+# NL-opdracht (+ optionele schets) → veilig JSON-voorstel (zie app/suggestor.py)
+async def suggest(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    payload: { prompt, image_b64?, model? }
+    """
+    return await suggest_from_text(payload.get("prompt", ""), payload.get("image_b64"), payload.get("model"))
+
+
+# Build-spec (files + commit) → één atomaire commit (zie app/builder.py)
+async def build_from_spec(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    payload: { files: [ {path, content}, ... ], commit_message?, summary?, repo?, branch? }
+    """
+    return await builder.build_from_spec(payload)
 
 
 # ====== Task registry ======
@@ -128,4 +109,8 @@ TASKS: Dict[str, Any] = {
     "commit_files": commit_files,
     "raw_file": raw_file,
     "weekly_bekendmakingen": weekly_bekendmakingen,
+    "suggest": suggest,
+    "build_from_spec": build_from_spec,
 }
+# looptijd/uitkomst/in-flight per task naar /metrics
+metrics.instrument_tasks(TASKS)
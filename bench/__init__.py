@@ -0,0 +1,2 @@
+# leeg mag ook; houdt package import netjes
+
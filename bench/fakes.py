@@ -0,0 +1,526 @@
+# bench/fakes.py
+# Lokale stand-ins voor alle upstreams, zodat de benchmark (bench/run.py) niets extern aanroept:
+# - github: Contents API + Git Data API (refs, commits, trees, blobs), in-memory per repo,
+#   met X-RateLimit-headers per token
+# - graph:  Microsoft login (client credentials), sendMail, JSON $batch, berichten (paging) en delta
+# - llm:    OpenAI-compatible /v1/chat/completions (JSON-suggesties, usage incl. cached_tokens; SSE bij stream)
+# - sru:    zoekbron voor bekendmakingen (paar publicaties per gemeente, met ETag)
+# Per service instelbaar: latency (+ jitter) en foutkans. Tellers op GET /_fake/stats.
+#
+#   python -m bench.fakes --github-port 18101 --graph-port 18102 --llm-port 18103 --sru-port 18104 \
+#       --latency-ms 40 --jitter-ms 20 --error-rate 0.01 --llm-latency-ms 400
+
+from __future__ import annotations
+import argparse
+import asyncio
+import base64
+import datetime
+import hashlib
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+SERVICES = ("github", "graph", "llm", "sru")
+
+
+class Faults:
+    """Latency en foutkans van één fake; error_rate geldt per request (niet voor /_fake/*)."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.stats = {"requests": 0, "errors_injected": 0, "latency_ms_total": 0.0}
+
+    def delay_s(self) -> float:
+        return max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def fail(self) -> bool:
+        return self.rng.random() < self.error_rate
+
+    def config(self) -> Dict[str, float]:
+        return {"latency_ms": self.latency_ms, "jitter_ms": self.jitter_ms, "error_rate": self.error_rate}
+
+
+def _app(name: str, faults: Faults, error: Any) -> FastAPI:
+    """FastAPI-app met fault-middleware; `error()` levert de service-specifieke foutresponse."""
+    app = FastAPI(title=f"fake {name}")
+
+    @app.middleware("http")
+    async def inject(request: Request, call_next):
+        if request.url.path.startswith("/_fake/"):
+            return await call_next(request)
+        faults.stats["requests"] += 1
+        delay = faults.delay_s()
+        faults.stats["latency_ms_total"] += delay * 1000
+        await asyncio.sleep(delay)
+        if faults.fail():
+            faults.stats["errors_injected"] += 1
+            return error()
+        return await call_next(request)
+
+    @app.get("/_fake/stats")
+    async def stats():
+        return {"service": name, **faults.config(), **{k: round(v, 1) for k, v in faults.stats.items()}}
+
+    return app
+
+
+# ---------------------------------------------------------------- GitHub
+def _git_blob_sha(data: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _sha(*parts: Any) -> str:
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class _Repo:
+    """
+    Platte git-opslag: tree = {path: blob-sha}; elke branch start bij een commit met README.md.
+    Modes per tree staan apart en alleen als ze afwijken van 100644.
+    """
+
+    def __init__(self, full_name: str):
+        self.blobs: Dict[str, bytes] = {}
+        self.trees: Dict[str, Dict[str, str]] = {}
+        self.modes: Dict[str, Dict[str, str]] = {}
+        self.commits: Dict[str, Dict[str, Any]] = {}
+        self.refs: Dict[str, str] = {}
+        readme = f"# {full_name}\n\nbenchmark fixture\n".encode()
+        self.root = self.commit({"README.md": self.blob(readme)}, [], "initial commit")
+
+    def blob(self, data: bytes) -> str:
+        sha = _git_blob_sha(data)
+        self.blobs[sha] = data
+        return sha
+
+    def tree(self, entries: Dict[str, str], modes: Optional[Dict[str, str]] = None) -> str:
+        modes = {p: m for p, m in (modes or {}).items() if p in entries and m != "100644"}
+        sha = _sha(sorted(entries.items()), sorted(modes.items()))
+        self.trees[sha] = dict(entries)
+        self.modes[sha] = modes
+        return sha
+
+    def commit(self, entries: Dict[str, str], parents: List[str], message: str, modes: Optional[Dict[str, str]] = None) -> str:
+        tree = self.tree(entries, modes)
+        sha = _sha(tree, parents, message, time.time_ns())
+        self.commits[sha] = {"tree": tree, "parents": parents, "message": message}
+        return sha
+
+    def head(self, branch: str) -> str:
+        return self.refs.setdefault(branch, self.root)
+
+    def files(self, branch: str) -> Dict[str, str]:
+        return self.trees[self.commits[self.head(branch)]["tree"]]
+
+    def file_modes(self, branch: str) -> Dict[str, str]:
+        return self.modes[self.commits[self.head(branch)]["tree"]]
+
+
+class _GitHub:
+    def __init__(self, rate_limit: int):
+        self.repos: Dict[str, _Repo] = {}
+        self.rate_limit = rate_limit
+        self.budget: Dict[str, Tuple[float, int]] = {}  # token → (reset, gebruikt)
+
+    def repo(self, owner: str, name: str) -> _Repo:
+        key = f"{owner}/{name}"
+        if key not in self.repos:
+            self.repos[key] = _Repo(key)
+        return self.repos[key]
+
+    def rate_headers(self, request: Request) -> Dict[str, str]:
+        token = request.headers.get("authorization", "")
+        reset, used = self.budget.get(token, (0.0, 0))
+        if reset <= time.time():
+            reset, used = time.time() + 3600, 0
+        used += 1
+        self.budget[token] = (reset, used)
+        return {
+            "x-ratelimit-limit": str(self.rate_limit),
+            "x-ratelimit-remaining": str(max(0, self.rate_limit - used)),
+            "x-ratelimit-reset": str(int(reset)),
+        }
+
+
+def github_app(faults: Faults, rate_limit: int = 5000) -> FastAPI:
+    gh = _GitHub(rate_limit)
+    app = _app("github", faults, lambda: JSONResponse({"message": "Server Error (injected)"}, status_code=502))
+    app.state.gh = gh  # tests lezen/zetten repo-inhoud direct (bijv. een uitvoerbaar bestand)
+
+    def reply(request: Request, body: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+        return JSONResponse(body, status_code=status, headers={**gh.rate_headers(request), **(headers or {})})
+
+    def not_found(request: Request) -> JSONResponse:
+        return reply(request, {"message": "Not Found"}, 404)
+
+    @app.get("/repos/{owner}/{name}/contents/{path:path}")
+    async def get_contents(owner: str, name: str, path: str, request: Request, ref: str = "main"):
+        sha = gh.repo(owner, name).files(ref).get(path)
+        if sha is None:
+            return not_found(request)
+        etag = f'"{sha}"'
+        if request.headers.get("if-none-match") == etag:
+            # 304 telt bij GitHub niet mee voor de rate limit
+            return Response(status_code=304, headers={"etag": etag})
+        data = gh.repo(owner, name).blobs[sha]
+        return reply(request, {
+            "type": "file", "path": path, "sha": sha, "size": len(data),
+            "encoding": "base64", "content": base64.b64encode(data).decode("ascii"),
+        }, headers={"etag": etag})
+
+    @app.put("/repos/{owner}/{name}/contents/{path:path}")
+    async def put_contents(owner: str, name: str, path: str, request: Request):
+        body = await request.json()
+        repo = gh.repo(owner, name)
+        branch = body.get("branch") or "main"
+        files = repo.files(branch)
+        current = files.get(path)
+        if current and not body.get("sha"):
+            return reply(request, {"message": "Invalid request.\n\n\"sha\" wasn't supplied."}, 422)
+        if current and body["sha"] != current:
+            return reply(request, {"message": f"{path} does not match {body['sha']}"}, 409)
+        blob = repo.blob(base64.b64decode(body.get("content", "")))
+        commit = repo.commit({**files, path: blob}, [repo.head(branch)], body.get("message", ""), repo.file_modes(branch))
+        repo.refs[branch] = commit
+        return reply(request, {"content": {"path": path, "sha": blob}, "commit": {"sha": commit}}, 200 if current else 201)
+
+    @app.get("/repos/{owner}/{name}/git/ref/heads/{branch:path}")
+    async def get_ref(owner: str, name: str, branch: str, request: Request):
+        sha = gh.repo(owner, name).head(branch)
+        return reply(request, {"ref": f"refs/heads/{branch}", "object": {"type": "commit", "sha": sha}})
+
+    @app.get("/repos/{owner}/{name}/git/commits/{sha}")
+    async def get_commit(owner: str, name: str, sha: str, request: Request):
+        c = gh.repo(owner, name).commits.get(sha)
+        if c is None:
+            return not_found(request)
+        return reply(request, {
+            "sha": sha, "message": c["message"], "tree": {"sha": c["tree"]}, "parents": [{"sha": p} for p in c["parents"]],
+        })
+
+    @app.get("/repos/{owner}/{name}/git/trees/{sha}")
+    async def get_tree(owner: str, name: str, sha: str, request: Request):
+        repo = gh.repo(owner, name)
+        entries = repo.trees.get(sha)
+        if entries is None:
+            return not_found(request)
+        modes = repo.modes[sha]
+        return reply(request, {"sha": sha, "truncated": False, "tree": [
+            {"path": p, "mode": modes.get(p, "100644"), "type": "blob", "sha": s, "size": len(repo.blobs[s])}
+            for p, s in entries.items()
+        ]})
+
+    @app.post("/repos/{owner}/{name}/git/blobs")
+    async def post_blob(owner: str, name: str, request: Request):
+        body = json.loads(await request.body())
+        raw = body.get("content", "")
+        data = base64.b64decode(raw) if body.get("encoding") == "base64" else raw.encode("utf-8")
+        return reply(request, {"sha": gh.repo(owner, name).blob(data)}, 201)
+
+    @app.post("/repos/{owner}/{name}/git/trees")
+    async def post_tree(owner: str, name: str, request: Request):
+        body = await request.json()
+        repo = gh.repo(owner, name)
+        base_tree = body.get("base_tree") or ""
+        entries = dict(repo.trees.get(base_tree, {}))
+        modes = dict(repo.modes.get(base_tree, {}))
+        for e in body.get("tree", []):
+            if e.get("sha") is None:
+                entries.pop(e["path"], None)
+            elif e["sha"] not in repo.blobs:
+                return reply(request, {"message": f"Invalid tree info: blob {e['sha']} not found"}, 422)
+            else:
+                # zoals GitHub: de mode in de entry geldt, ook als die 100644 is
+                entries[e["path"]] = e["sha"]
+                modes[e["path"]] = e.get("mode", "100644")
+        return reply(request, {"sha": repo.tree(entries, modes)}, 201)
+
+    @app.post("/repos/{owner}/{name}/git/commits")
+    async def post_commit(owner: str, name: str, request: Request):
+        body = await request.json()
+        repo = gh.repo(owner, name)
+        if body.get("tree") not in repo.trees:
+            return reply(request, {"message": "Tree SHA does not exist"}, 422)
+        sha = _sha(body["tree"], body.get("parents", []), body.get("message", ""), time.time_ns())
+        repo.commits[sha] = {"tree": body["tree"], "parents": list(body.get("parents", [])), "message": body.get("message", "")}
+        return reply(request, {"sha": sha, "tree": {"sha": body["tree"]}}, 201)
+
+    @app.patch("/repos/{owner}/{name}/git/refs/heads/{branch:path}")
+    async def patch_ref(owner: str, name: str, branch: str, request: Request):
+        body = await request.json()
+        repo = gh.repo(owner, name)
+        new = body.get("sha")
+        if new not in repo.commits:
+            return reply(request, {"message": "Object does not exist"}, 422)
+        if not body.get("force") and repo.head(branch) not in repo.commits[new]["parents"]:
+            return reply(request, {"message": "Update is not a fast forward"}, 422)
+        repo.refs[branch] = new
+        return reply(request, {"ref": f"refs/heads/{branch}", "object": {"type": "commit", "sha": new}})
+
+    @app.get("/_fake/repos")
+    async def repos():
+        return {k: {"branches": len(r.refs), "commits": len(r.commits), "blobs": len(r.blobs)} for k, r in gh.repos.items()}
+
+    return app
+
+
+# ---------------------------------------------------------------- Microsoft Graph
+def graph_app(faults: Faults, fail_batches: Tuple[int, ...] = ()) -> FastAPI:
+    """`fail_batches`: volgnummers (vanaf 1) van $batch-requests die een 500 krijgen."""
+    app = _app("graph", faults, lambda: JSONResponse(
+        {"error": {"code": "TooManyRequests", "message": "injected"}}, status_code=429, headers={"Retry-After": "0"}
+    ))
+    sent = {"mails": 0, "batches": 0, "tokens": 0, "message_pages": 0, "delta_pages": 0}
+    app.state.sent = sent
+    app.state.token_expires_in = 3600
+
+    @app.post("/{tenant}/oauth2/v2.0/token")
+    async def token(tenant: str):
+        sent["tokens"] += 1
+        return {
+            "token_type": "Bearer", "expires_in": app.state.token_expires_in,
+            "access_token": f"fake-{tenant}-{sent['tokens']}",
+        }
+
+    # mailbox per gebruiker, nieuwste laatst; tests voegen berichten toe via app.state.mailbox
+    mailbox: Dict[str, List[Dict[str, Any]]] = {}
+    app.state.mailbox = mailbox
+
+    def page_of(request: Request, msgs: List[Dict[str, Any]], skip: int, size: int, link: Dict[str, str]) -> Dict[str, Any]:
+        base = str(request.url.remove_query_params(list(request.query_params.keys())))
+        body: Dict[str, Any] = {"value": msgs[skip:skip + size]}
+        if skip + size < len(msgs):
+            body["@odata.nextLink"] = str(request.url.include_query_params(**{"$skip": skip + size}))
+        else:
+            body.update({k: f"{base}?{v}" for k, v in link.items()})
+        return body
+
+    @app.get("/v1.0/users/{user}/messages")
+    async def messages(user: str, request: Request):
+        sent["message_pages"] += 1
+        msgs = sorted(mailbox.get(user, []), key=lambda m: m["receivedDateTime"], reverse=True)
+        q = request.query_params
+        return JSONResponse(page_of(request, msgs, int(q.get("$skip", 0)), int(q.get("$top", 10)), {}))
+
+    @app.get("/v1.0/users/{user}/mailFolders/{folder}/messages/delta")
+    async def delta(user: str, folder: str, request: Request):
+        # $deltatoken = aantal berichten dat de vorige ronde al zag
+        sent["delta_pages"] += 1
+        q = request.query_params
+        msgs = mailbox.get(user, [])
+        seen = int(q.get("$deltatoken", 0))
+        size = int((request.headers.get("prefer") or "=10").rsplit("=", 1)[-1])
+        return JSONResponse(page_of(request, msgs[seen:], int(q.get("$skip", 0)), size,
+                                    {"@odata.deltaLink": f"$deltatoken={len(msgs)}"}))
+
+    @app.post("/v1.0/users/{user}/sendMail")
+    async def send_mail(user: str):
+        sent["mails"] += 1
+        return Response(status_code=202)
+
+    @app.post("/v1.0/$batch")
+    async def batch(request: Request):
+        body = await request.json()
+        sent["batches"] += 1
+        if sent["batches"] in fail_batches:
+            return JSONResponse({"error": {"code": "InternalServerError", "message": "injected"}}, status_code=500)
+        out = []
+        for item in body.get("requests", []):
+            # throttling per item, zoals Graph dat binnen een batch doet
+            if faults.fail():
+                faults.stats["errors_injected"] += 1
+                out.append({"id": item["id"], "status": 429, "headers": {"Retry-After": "0"},
+                            "body": {"error": {"code": "TooManyRequests"}}})
+                continue
+            sent["mails"] += 1
+            out.append({"id": item["id"], "status": 202, "headers": {}, "body": None})
+        return {"responses": out}
+
+    @app.get("/_fake/sent")
+    async def sent_stats():
+        return sent
+
+    return app
+
+
+# ---------------------------------------------------------------- OpenAI-compatible LLM
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def llm_app(faults: Faults, malformed_rate: float = 0.0, stream_chunk_ms: float = 0.0) -> FastAPI:
+    """Met "stream": true komt het antwoord als SSE-chunks (`stream_chunk_ms` ertussen), usage als laatste chunk."""
+    app = _app("llm", faults, lambda: JSONResponse(
+        {"error": {"message": "Rate limit reached (injected)", "type": "requests", "code": "rate_limit_exceeded"}},
+        status_code=429, headers={"retry-after": "1"},
+    ))
+    seen_prefixes: set = set()
+
+    async def _sse(head: Dict[str, Any], content: str, usage: Dict[str, Any], body: Dict[str, Any]):
+        def event(choices: List[Dict[str, Any]], **extra: Any) -> str:
+            return "data: " + json.dumps({**head, "object": "chat.completion.chunk", "choices": choices, **extra}) + "\n\n"
+
+        words = content.split(" ")
+        for i, w in enumerate(words):
+            delta = {"content": w if i == 0 else " " + w}
+            if i == 0:
+                delta["role"] = "assistant"
+            yield event([{"index": 0, "delta": delta, "finish_reason": None}])
+            await asyncio.sleep(stream_chunk_ms / 1000)
+        yield event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield event([], usage=usage)
+        yield "data: [DONE]\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or []
+
+        def text(m: Dict[str, Any]) -> str:
+            c = m.get("content")
+            if isinstance(c, list):
+                return "".join(p.get("text", "") for p in c if isinstance(p, dict))
+            return c or ""
+
+        system = "".join(text(m) for m in messages if m.get("role") == "system")
+        prompt_tokens = sum(_tokens(text(m)) for m in messages)
+        # OpenAI-gedrag: een eerder geziene prefix van ≥1024 tokens komt uit de cache (per 128)
+        prefix_tokens = _tokens(system) if system else 0
+        cached = prefix_tokens // 128 * 128 if prefix_tokens >= 1024 and system in seen_prefixes else 0
+        seen_prefixes.add(system)
+
+        user = text(messages[-1]) if messages else ""
+        suggestion = {
+            "type": "build",
+            "payload": {"goal": user[:200]},
+            "notes": "fake suggestie",
+        }
+        content = json.dumps(suggestion, ensure_ascii=False)
+        if faults.rng.random() < malformed_rate:
+            # bijna-geldig, zoals modellen het soms leveren: fences + trailing comma
+            content = "Hier is het voorstel:\n```json\n" + content[:-1] + ",}\n```"
+        completion_tokens = _tokens(content)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+        head = {"id": f"chatcmpl-fake-{time.time_ns()}", "created": int(time.time()), "model": body.get("model", "fake")}
+        if body.get("stream"):
+            return StreamingResponse(_sse(head, content, usage, body), media_type="text/event-stream")
+        return {
+            **head,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+        }
+
+    return app
+
+
+# ---------------------------------------------------------------- SRU (bekendmakingen)
+def sru_app(faults: Faults, per_municipality: int = 5, spread_days: int = 1) -> FastAPI:
+    """
+    Publicatie i van een gemeente is gedateerd op vandaag - (i % spread_days) dagen.
+    Respecteert `dt.modified>=` in de query en pagineert met startRecord/maximumRecords/nextRecordPosition.
+    Elke query komt in app.state.queries (voor tests).
+    """
+    app = _app("sru", faults, lambda: Response("Service Unavailable (injected)", status_code=503))
+    app.state.queries = []
+
+    @app.get("/sru")
+    async def search(request: Request, query: str = "", startRecord: int = 1, maximumRecords: int = 100):
+        app.state.queries.append({"query": query, "startRecord": startRecord})
+        muni = query.split('dt.creator=="', 1)[-1].split('"', 1)[0] if "dt.creator" in query else "onbekend"
+        since = query.split("dt.modified>=", 1)[-1].split(" ", 1)[0] if "dt.modified>=" in query else ""
+        today = datetime.date.today()
+        matching = [
+            (i, (today - datetime.timedelta(days=i % max(1, spread_days))).isoformat())
+            for i in range(per_municipality)
+        ]
+        matching = [(i, day) for i, day in matching if day >= since]
+        page = matching[startRecord - 1:startRecord - 1 + maximumRecords]
+        records = "".join(
+            "<record><recordData><gzd><originalData><meta>"
+            f"<identifier>gmb-{today.isoformat()}-{escape(muni)}-{i}</identifier>"
+            f"<title>Omgevingsvergunning {escape(muni)} {i}</title>"
+            f"<type>Gemeenteblad</type><modified>{day}</modified>"
+            "</meta></originalData></gzd></recordData></record>"
+            for i, day in page
+        )
+        next_pos = startRecord + len(page)
+        xml = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<searchRetrieveResponse xmlns="http://docs.oasis-open.org/ns/search-ws/sruResponse">'
+            f"<numberOfRecords>{len(matching)}</numberOfRecords><records>{records}</records>"
+            + (f"<nextRecordPosition>{next_pos}</nextRecordPosition>" if next_pos <= len(matching) else "")
+            + "</searchRetrieveResponse>"
+        )
+        etag = '"%s"' % hashlib.sha1(xml.encode()).hexdigest()
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"etag": etag})
+        return Response(xml, media_type="application/xml", headers={"etag": etag})
+
+    return app
+
+
+# ---------------------------------------------------------------- starten
+def build_apps(args: argparse.Namespace) -> Dict[str, FastAPI]:
+    def faults(service: str, offset: int) -> Faults:
+        def opt(name: str) -> float:
+            v = getattr(args, f"{service}_{name}")
+            return getattr(args, name) if v is None else v
+        seed = None if args.seed is None else args.seed + offset
+        return Faults(opt("latency_ms"), opt("jitter_ms"), opt("error_rate"), seed)
+
+    return {
+        "github": github_app(faults("github", 0), rate_limit=args.github_rate_limit),
+        "graph": graph_app(faults("graph", 1)),
+        "llm": llm_app(faults("llm", 2), malformed_rate=args.llm_malformed_rate),
+        "sru": sru_app(faults("sru", 3)),
+    }
+
+
+def parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Fake GitHub / Graph / LLM / SRU voor de benchmark")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--latency-ms", type=float, default=30.0, help="standaard voor alle services")
+    p.add_argument("--jitter-ms", type=float, default=10.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--seed", type=int, default=None)
+    for s in SERVICES:
+        p.add_argument(f"--{s}-port", type=int, required=True)
+        p.add_argument(f"--{s}-latency-ms", type=float, default=None)
+        p.add_argument(f"--{s}-jitter-ms", type=float, default=None)
+        p.add_argument(f"--{s}-error-rate", type=float, default=None)
+    p.add_argument("--github-rate-limit", type=int, default=5000, help="requests per uur per token")
+    p.add_argument("--llm-malformed-rate", type=float, default=0.0, help="kans op bijna-geldige JSON")
+    return p
+
+
+async def serve(args: argparse.Namespace) -> None:
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host=args.host, port=getattr(args, f"{name}_port"), log_level="warning"))
+        for name, app in build_apps(args).items()
+    ]
+    tasks = [asyncio.ensure_future(s.serve()) for s in servers]
+    # SIGINT/SIGTERM komt maar bij één server aan: dan alle vier stoppen
+    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for s in servers:
+        s.should_exit = True
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(parser().parse_args()))
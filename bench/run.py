@@ -0,0 +1,492 @@
+# bench/run.py
+# Load-/benchmarksuite: start app.main:app tegen de lokale fakes (bench/fakes.py) en drijft een
+# realistische mix van /jobs/create + pollen (long-poll of interval) met N gelijktijdige gebruikers.
+# Resultaat als JSON (stdout of --out): doorvoer, p50/p90/p99 per fase en per task, fouten,
+# RSS en queue-diepte van de app door de tijd, plus de tellers van /health en de fakes.
+#
+#   python -m bench.run --duration 60 --users 16 --out bench.json
+#   python -m bench.run --mix commit_files=1,raw_file=4 --github-error-rate 0.02 --app-env JOB_MAX_INFLIGHT=16
+
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from . import fakes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = "bench"
+TERMINAL = ("done", "error")
+DEFAULT_MIX = "commit_files=3,commit_file=1,raw_file=4,build_from_spec=2,suggest=3,weekly_bekendmakingen=1"
+MUNICIPALITIES = ["Utrecht", "Zwolle", "Delft", "Groningen"]
+
+
+# ---------------------------------------------------------------- meten
+def _pct(sorted_vals: List[float], p: float) -> float:
+    # nearest-rank
+    k = max(0, min(len(sorted_vals) - 1, int(round(p / 100 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    if not values:
+        return {"n": 0}
+    v = sorted(values)
+    return {
+        "n": len(v),
+        "mean": round(sum(v) / len(v), 1),
+        "p50": round(_pct(v, 50), 1),
+        "p90": round(_pct(v, 90), 1),
+        "p99": round(_pct(v, 99), 1),
+        "max": round(v[-1], 1),
+    }
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident set size uit /proc (Linux); None elders."""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class Recorder:
+    def __init__(self, warmup_until: float):
+        self.warmup_until = warmup_until
+        self.create_ms: List[float] = []
+        self.poll_ms: List[float] = []
+        self.job_ms: Dict[str, List[float]] = {}
+        self.outcomes: Dict[str, Counter] = {}
+        self.errors: Counter = Counter()
+        self.completed = 0  # ook tijdens warmup, voor de timeline
+        self.requests = 0
+
+    def measured(self, t0: float) -> bool:
+        return t0 >= self.warmup_until
+
+    def outcome(self, task: str, status: str, t0: float, error: Optional[str] = None) -> None:
+        if status in TERMINAL:
+            self.completed += 1
+        if not self.measured(t0):
+            return
+        self.outcomes.setdefault(task, Counter())[status] += 1
+        if error:
+            self.errors[f"{task}: {error[:160]}"] += 1
+
+
+# ---------------------------------------------------------------- workload
+def _text(rng: random.Random, size: int) -> str:
+    line = "".join(rng.choice(string.ascii_lowercase + " ") for _ in range(79)) + "\n"
+    return (line * (size // 80 + 1))[:size]
+
+
+class Workload:
+    """Payloads per task; elke gebruiker werkt op een eigen branch (tenzij --shared-branch)."""
+
+    def __init__(self, args: argparse.Namespace, uid: int, config_path: str):
+        self.args = args
+        self.uid = uid
+        self.rng = random.Random(None if args.seed is None else args.seed * 1000 + uid)
+        self.repo = f"bench/repo-{uid % args.repos}"
+        self.branch = "main" if args.shared_branch else f"bench-{uid}"
+        self.config_path = config_path
+        self.files: Dict[str, str] = {}  # laatst gecommitte inhoud per pad
+        self.pending: Dict[str, str] = {}  # inhoud van de lopende job
+        self.n = 0
+
+    def _content(self, path: str) -> str:
+        # een deel ongewijzigd laten: test het overslaan op blob-sha
+        if path in self.files and self.rng.random() < self.args.unchanged_rate:
+            content = self.files[path]
+        else:
+            content = _text(self.rng, self.args.file_kb * 1024)
+        self.pending[path] = content
+        return content
+
+    def settle(self, done: bool) -> None:
+        # alleen geslaagde commits tellen als bestaand (raw_file leest die terug)
+        if done:
+            self.files.update(self.pending)
+        self.pending = {}
+
+    def payload(self, task: str) -> Dict[str, Any]:
+        self.n += 1
+        base = {"repo": self.repo, "branch": self.branch}
+        if task == "commit_files":
+            paths = [f"bench/u{self.uid}/f{i}.txt" for i in range(self.args.files_per_commit)]
+            return {**base, "message": f"bench {self.n}", "files": [{"path": p, "content": self._content(p)} for p in paths]}
+        if task == "commit_file":
+            path = f"bench/u{self.uid}/single.txt"
+            return {**base, "path": path, "message": f"bench {self.n}", "content": self._content(path)}
+        if task == "raw_file":
+            return {**base, "path": self.rng.choice(["README.md", *self.files])}
+        if task == "build_from_spec":
+            app = f"apps/bench-u{self.uid}"
+            return {
+                **base,
+                "summary": f"bench build {self.n}",
+                "commit_message": f"scaffold {app}",
+                "files": [
+                    {"path": f"{app}/index.html", "content": self._content(f"{app}/index.html")},
+                    {"path": f"{app}/config.json", "content": json.dumps({"n": self.n % 5, "uid": self.uid})},
+                ],
+            }
+        if task == "suggest":
+            muni = self.rng.choice(MUNICIPALITIES)
+            return {"prompt": f"Maak een pagina met de bekendmakingen van {muni} van deze week (#{self.uid}-{self.n})"}
+        if task == "weekly_bekendmakingen":
+            return {"dry_run": False, "days": 7, "config_path": self.config_path}
+        raise ValueError(f"geen payload voor task '{task}'")
+
+
+def parse_mix(spec: str) -> Tuple[List[str], List[float]]:
+    tasks, weights = [], []
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, w = part.partition("=")
+        if float(w or 1) > 0:
+            tasks.append(name.strip())
+            weights.append(float(w or 1))
+    if not tasks:
+        raise SystemExit("--mix bevat geen tasks")
+    return tasks, weights
+
+
+# ---------------------------------------------------------------- gebruikers
+async def wait_job(client: httpx.AsyncClient, job_id: str, args: argparse.Namespace, rec: Recorder, t0: float) -> Dict[str, Any]:
+    status = None
+    while True:
+        params = {"wait": str(args.poll_wait), **({"after": status} if status else {})} if args.poll == "long" else {}
+        tp = time.perf_counter()
+        r = await client.get(f"/jobs/{job_id}", params=params)
+        rec.requests += 1
+        if rec.measured(t0):
+            rec.poll_ms.append((time.perf_counter() - tp) * 1000)
+        r.raise_for_status()
+        job = r.json()
+        status = job["status"]
+        if status in TERMINAL:
+            return job
+        if args.poll == "interval":
+            await asyncio.sleep(args.poll_interval)
+
+
+async def user(uid: int, client: httpx.AsyncClient, args: argparse.Namespace, rec: Recorder,
+               mix: Tuple[List[str], List[float]], deadline: float, config_path: str) -> None:
+    wl = Workload(args, uid, config_path)
+    while time.perf_counter() < deadline:
+        task = wl.rng.choices(*mix)[0]
+        lane = "scheduled" if task == "weekly_bekendmakingen" else "interactive"
+        t0 = time.perf_counter()
+        try:
+            r = await client.post("/jobs/create", json={"task": task, "payload": wl.payload(task), "priority": lane})
+            rec.requests += 1
+            if rec.measured(t0):
+                rec.create_ms.append((time.perf_counter() - t0) * 1000)
+            if r.status_code in (429, 503):
+                wl.settle(False)
+                rec.outcome(task, "rejected", t0)
+                await asyncio.sleep(min(float(r.headers.get("retry-after") or 1), args.max_backoff))
+                continue
+            r.raise_for_status()
+            job = await wait_job(client, r.json()["job_id"], args, rec, t0)
+        except httpx.HTTPError as e:
+            wl.settle(False)
+            rec.outcome(task, "client_error", t0, f"{type(e).__name__}: {e}")
+            continue
+        if rec.measured(t0):
+            rec.job_ms.setdefault(task, []).append((time.perf_counter() - t0) * 1000)
+        rec.outcome(task, job["status"], t0, job.get("error"))
+        wl.settle(job["status"] == "done")
+        if args.think_ms:
+            await asyncio.sleep(args.think_ms / 1000)
+
+
+async def sampler(client: httpx.AsyncClient, pid: int, rec: Recorder, t_start: float, interval: float,
+                  timeline: List[Dict[str, Any]], stop: asyncio.Event) -> None:
+    last_t, last_done = 0.0, 0
+    while True:
+        t = time.perf_counter() - t_start
+        point: Dict[str, Any] = {"t": round(t, 2), "rss_mb": rss_mb(pid), "completed": rec.completed}
+        try:
+            ex = (await client.get("/executor")).json()
+            point.update(inflight=ex.get("inflight"), queued=sum((ex.get("queued") or {}).values()))
+        except (httpx.HTTPError, ValueError):
+            pass
+        point["jobs_per_s"] = round((rec.completed - last_done) / (t - last_t), 2) if t > last_t else 0.0
+        last_t, last_done = t, rec.completed
+        timeline.append(point)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+            return
+        except asyncio.TimeoutError:
+            pass
+
+
+# ---------------------------------------------------------------- processen
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2.0) as c:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise SystemExit(f"proces gestopt tijdens opstarten ({url}), exit code {proc.returncode}")
+            try:
+                if (await c.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise SystemExit(f"{url} niet bereikbaar binnen {timeout:.0f}s")
+
+
+def stop_proc(proc: subprocess.Popen) -> None:
+    if proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def fake_args(args: argparse.Namespace, ports: Dict[str, int]) -> List[str]:
+    out = ["--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms), "--error-rate", str(args.error_rate),
+           "--github-rate-limit", str(args.github_rate_limit), "--llm-malformed-rate", str(args.llm_malformed_rate)]
+    if args.seed is not None:
+        out += ["--seed", str(args.seed)]
+    for s in fakes.SERVICES:
+        out += [f"--{s}-port", str(ports[s])]
+        for opt in ("latency_ms", "jitter_ms", "error_rate"):
+            v = getattr(args, f"{s}_{opt}")
+            if v is not None:
+                out += [f"--{s}-{opt.replace('_', '-')}", str(v)]
+    return out
+
+
+def app_env(args: argparse.Namespace, ports: Dict[str, int], tmp: str) -> Dict[str, str]:
+    host = "http://127.0.0.1"
+    env = {
+        **os.environ,
+        "GITHUB_API_URL": f"{host}:{ports['github']}",
+        "GH_TOKEN": "bench-token",
+        "GITHUB_TOKEN": "bench-token",
+        "MS_LOGIN_BASE": f"{host}:{ports['graph']}",
+        "MS_GRAPH_BASE": f"{host}:{ports['graph']}/v1.0",
+        "MS_TENANT_ID": "bench", "MS_CLIENT_ID": "bench", "MS_CLIENT_SECRET": "bench",
+        "MS_MAIL_FROM": "digest@bench.invalid",
+        "MS_DELTA_STATE_PATH": os.path.join(tmp, "msgraph_delta.json"),
+        "LLM_API_BASE": f"{host}:{ports['llm']}/v1",
+        "LLM_MODEL": "openai/gpt-4o-mini",
+        "OPENAI_API_KEY": "bench",
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",  # geen download bij import
+        "BEKENDMAKINGEN_SRU_URL": f"{host}:{ports['sru']}/sru",
+        "BEKENDMAKINGEN_CACHE_PATH": os.path.join(tmp, "bekendmakingen.sqlite3"),
+        "JOB_STORE": args.job_store,
+        "JOB_DB_PATH": os.path.join(tmp, "jobs.sqlite3"),
+        "LLM_CACHE_PATH": "",
+        "SCHEDULES": "[]",
+        "X_API_KEY": API_KEY,
+        "PYTHONUNBUFFERED": "1",
+    }
+    for kv in args.app_env:
+        k, _, v = kv.partition("=")
+        env[k] = v
+    return env
+
+
+def git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# ---------------------------------------------------------------- hoofdroutine
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    mix = parse_mix(args.mix)
+    ports = {s: free_port() for s in fakes.SERVICES}
+    app_port = free_port()
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    config_path = os.path.join(tmp, "bekendmakingen.json")
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "municipalities": MUNICIPALITIES,
+            "routes": [{"emails": [f"raad{i}@bench.invalid" for i in range(args.recipients)]}],
+        }, f)
+
+    log = open(os.path.join(tmp, "processes.log"), "wb")
+    fake_proc = subprocess.Popen([sys.executable, "-m", "bench.fakes", *fake_args(args, ports)],
+                                 cwd=ROOT, stdout=log, stderr=subprocess.STDOUT)
+    app_proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(app_port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT, env=app_env(args, ports, tmp), stdout=log, stderr=subprocess.STDOUT,
+    )
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        for s in fakes.SERVICES:
+            await wait_ready(f"http://127.0.0.1:{ports[s]}/_fake/stats", fake_proc)
+        await wait_ready(f"{base_url}/health", app_proc, timeout=60.0)
+
+        limits = httpx.Limits(max_connections=args.users + 4, max_keepalive_connections=args.users + 4)
+        async with httpx.AsyncClient(base_url=base_url, headers={"X-API-Key": API_KEY}, limits=limits,
+                                     timeout=args.poll_wait + 30) as client:
+            rss_start = rss_mb(app_proc.pid)
+            t_start = time.perf_counter()
+            rec = Recorder(warmup_until=t_start + args.warmup)
+            deadline = t_start + args.warmup + args.duration
+            timeline: List[Dict[str, Any]] = []
+            stop = asyncio.Event()
+            sample = asyncio.ensure_future(
+                sampler(client, app_proc.pid, rec, t_start, args.sample_interval, timeline, stop))
+            users = [asyncio.ensure_future(user(i, client, args, rec, mix, deadline, config_path))
+                     for i in range(args.users)]
+            # na de deadline mogen lopende jobs nog afronden (begrensd)
+            _, pending = await asyncio.wait(users, timeout=args.warmup + args.duration + args.drain)
+            for t in pending:
+                t.cancel()
+            elapsed = time.perf_counter() - t_start - args.warmup
+            stop.set()
+            await sample
+            health = (await client.get("/health")).json()
+            async with httpx.AsyncClient(timeout=5.0) as c:
+                upstreams = {s: (await c.get(f"http://127.0.0.1:{ports[s]}/_fake/stats")).json() for s in fakes.SERVICES}
+                upstreams["graph"]["sent"] = (await c.get(f"http://127.0.0.1:{ports['graph']}/_fake/sent")).json()
+    finally:
+        stop_proc(app_proc)
+        stop_proc(fake_proc)
+        log.close()
+
+    totals: Counter = Counter()
+    for c in rec.outcomes.values():
+        totals.update(c)
+    finished = totals["done"] + totals["error"]
+    rss = [p["rss_mb"] for p in timeline if p.get("rss_mb") is not None]
+    config = {k: v for k, v in vars(args).items() if k != "out"}
+    return {
+        "version": 1,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git": git_rev(),
+        "python": platform.python_version(),
+        "config": config,
+        "summary": {
+            "elapsed_s": round(elapsed, 2),
+            "jobs_finished": finished,
+            "jobs_done": totals["done"],
+            "jobs_error": totals["error"],
+            "jobs_rejected": totals["rejected"],
+            "client_errors": totals["client_error"],
+            "error_rate": round(totals["error"] / finished, 4) if finished else 0.0,
+            "throughput_jobs_s": round(finished / elapsed, 2) if elapsed > 0 else 0.0,
+            "requests_s": round(rec.requests / (elapsed + args.warmup), 2) if elapsed > 0 else 0.0,
+        },
+        "latency_ms": {
+            "create": summarize(rec.create_ms),
+            "poll": summarize(rec.poll_ms),
+            "job": summarize([v for vals in rec.job_ms.values() for v in vals]),
+            "job_by_task": {t: summarize(v) for t, v in sorted(rec.job_ms.items())},
+        },
+        "outcomes": {t: dict(c) for t, c in sorted(rec.outcomes.items())},
+        "errors": dict(rec.errors.most_common(10)),
+        "memory": {
+            "rss_start_mb": rss_start,
+            "rss_max_mb": max(rss) if rss else None,
+            "rss_end_mb": rss[-1] if rss else None,
+        },
+        "timeline": timeline,
+        "server": {k: health.get(k) for k in ("github", "http_pool", "llm_scheduler", "llm_usage", "llm_json", "jobs")},
+        "upstreams": upstreams,
+        "logs": os.path.join(tmp, "processes.log"),
+    }
+
+
+def parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Benchmark van app.main:app tegen lokale fake upstreams")
+    p.add_argument("--duration", type=float, default=30.0, help="meetduur in seconden (na warmup)")
+    p.add_argument("--warmup", type=float, default=3.0, help="eerste seconden niet meetellen")
+    p.add_argument("--drain", type=float, default=30.0, help="max. wachttijd op lopende jobs na de deadline")
+    p.add_argument("--users", type=int, default=8, help="gelijktijdige gebruikers (closed loop)")
+    p.add_argument("--mix", default=DEFAULT_MIX, help="task=gewicht,... (gewicht 0 = uit)")
+    p.add_argument("--poll", choices=("long", "interval"), default="long", help="long-poll (?wait=) of vast interval")
+    p.add_argument("--poll-wait", type=float, default=25.0)
+    p.add_argument("--poll-interval", type=float, default=0.25)
+    p.add_argument("--think-ms", type=float, default=0.0, help="pauze per gebruiker tussen jobs")
+    p.add_argument("--max-backoff", type=float, default=2.0, help="max. wachttijd na 429/503 van /jobs/create")
+    p.add_argument("--repos", type=int, default=4)
+    p.add_argument("--shared-branch", action="store_true", help="alle gebruikers op main (ref-conflicten)")
+    p.add_argument("--files-per-commit", type=int, default=3)
+    p.add_argument("--file-kb", type=int, default=4)
+    p.add_argument("--unchanged-rate", type=float, default=0.3, help="kans dat een bestand ongewijzigd blijft")
+    p.add_argument("--recipients", type=int, default=25, help="ontvangers van de digest (Graph $batch)")
+    p.add_argument("--job-store", choices=("memory", "sqlite"), default="memory")
+    p.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="extra env voor de app")
+    p.add_argument("--sample-interval", type=float, default=1.0)
+    p.add_argument("--seed", type=int, default=None)
+    # fakes (zie bench/fakes.py)
+    p.add_argument("--latency-ms", type=float, default=30.0)
+    p.add_argument("--jitter-ms", type=float, default=10.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    for s in fakes.SERVICES:
+        p.add_argument(f"--{s}-latency-ms", type=float, default=None)
+        p.add_argument(f"--{s}-jitter-ms", type=float, default=None)
+        p.add_argument(f"--{s}-error-rate", type=float, default=None)
+    p.add_argument("--github-rate-limit", type=int, default=5000)
+    p.add_argument("--llm-malformed-rate", type=float, default=0.0)
+    p.add_argument("--out", default=None, help="JSON-bestand (anders stdout)")
+    p.add_argument("--max-error-rate", type=float, default=None, help="exit 1 als het aandeel mislukte jobs hoger is")
+    p.add_argument("--min-jobs", type=int, default=None, help="exit 1 als er minder jobs afgerond zijn")
+    return p
+
+
+def main() -> None:
+    args = parser().parse_args()
+    result = asyncio.run(run(args))
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        s, lat = result["summary"], result["latency_ms"]["job"]
+        print(f"{s['jobs_finished']} jobs in {s['elapsed_s']}s ({s['throughput_jobs_s']}/s), "
+              f"p50 {lat.get('p50')} ms, p99 {lat.get('p99')} ms, errors {s['error_rate']:.1%} → {args.out}",
+              file=sys.stderr)
+    else:
+        print(text)
+    s = result["summary"]
+    failed = []
+    if args.max_error_rate is not None and s["error_rate"] > args.max_error_rate:
+        failed.append(f"error_rate {s['error_rate']:.2%} > {args.max_error_rate:.2%}")
+    # zonder ondergrens slaagt een run waarin niets afkomt (error_rate 0.0)
+    if args.min_jobs is not None and s["jobs_finished"] < args.min_jobs:
+        failed.append(f"jobs_finished {s['jobs_finished']} < {args.min_jobs}")
+    if failed:
+        print("bench-gate: " + "; ".join(failed), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
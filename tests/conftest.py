@@ -0,0 +1,58 @@
+# tests/conftest.py
+# Gedeelde fixtures: env vóór de eerste app-import, de fake GitHub uit bench/fakes.py
+# in-process (ASGI) achter http_pool, en `live_server` voor tests die echte sockets nodig
+# hebben (streaming, clients buiten http_pool zoals LiteLLM); alleen op 127.0.0.1.
+
+import os
+import socket
+import threading
+import time
+
+os.environ.setdefault("JOB_STORE", "memory")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+os.environ.setdefault("LLM_CACHE_PATH", "")
+
+import httpx
+import pytest
+import uvicorn
+
+from app import github_client, http_pool
+from bench.fakes import Faults, github_app
+
+FAKE_GITHUB = "http://github.test"
+
+
+@pytest.fixture
+def github(monkeypatch):
+    """Verse fake GitHub (en lege caches) per test; geeft de FastAPI-app terug."""
+    app = github_app(Faults())
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+    monkeypatch.setattr(github_client, "GITHUB_API", FAKE_GITHUB)
+    monkeypatch.setitem(http_pool._CLIENTS, FAKE_GITHUB, client)
+    monkeypatch.setattr(github_client, "FILE_CACHE", github_client.FileCache(1024 * 1024, 60))
+    monkeypatch.setattr(github_client, "SHA_CACHE", github_client.ShaCache(1024))
+    return app
+
+
+@pytest.fixture
+def live_server():
+    """start(app) → base-URL van een uvicorn-server in een thread; alles stopt na de test."""
+    servers = []
+
+    def start(app):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="on"))
+        thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+        thread.start()
+        servers.append((server, thread))
+        deadline = time.monotonic() + 10
+        while not server.started:
+            assert time.monotonic() < deadline, "server start niet"
+            time.sleep(0.01)
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+    yield start
+    for server, thread in servers:
+        server.should_exit = True
+        thread.join(timeout=10)
@@ -0,0 +1,90 @@
+# tests/test_bekendmakingen.py
+# app/bekendmakingen_job.py tegen de fake SRU-bron (bench/fakes.sru_app): paginering,
+# watermark, ontdubbelen van de overlapdag en het 304-pad dat ids uit de cache haalt.
+
+import asyncio
+import datetime
+import json
+
+import httpx
+import pytest
+
+from app import bekendmakingen_job as bm
+from app import http_pool
+from bench.fakes import Faults, sru_app
+
+FAKE_SRU = "http://sru.test"
+MUNIS = ["Delft", "Utrecht"]
+
+
+def _serve(monkeypatch, app, config_path):
+    app.state.config_path = config_path
+    monkeypatch.setitem(http_pool._CLIENTS, FAKE_SRU, httpx.AsyncClient(transport=httpx.ASGITransport(app=app)))
+    return app
+
+
+@pytest.fixture
+def sru(monkeypatch, tmp_path):
+    # 5 publicaties per gemeente over 3 dagen, pagina's van 2 → 3 pagina's per gemeente
+    monkeypatch.setattr(bm, "SRU_URL", f"{FAKE_SRU}/sru")
+    monkeypatch.setattr(bm, "PAGE_SIZE", 2)
+    monkeypatch.setattr(bm, "_CACHE", bm._Cache(str(tmp_path / "bm.sqlite3")))
+    cfg = tmp_path / "bekendmakingen.json"
+    cfg.write_text(json.dumps({"municipalities": MUNIS}), encoding="utf-8")
+    return _serve(monkeypatch, sru_app(Faults(), per_municipality=5, spread_days=3), str(cfg))
+
+
+def _run(sru, days=7):
+    sru.state.queries.clear()
+    return asyncio.run(bm.run_weekly_digest(config_path=sru.state.config_path, dry_run=True, days=days))
+
+
+def _since(days):
+    return (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+
+
+def test_first_run_follows_next_record_position(sru):
+    out = _run(sru)
+    assert out["ok"] and out["publications"] == 10
+    assert out["stats"]["requests"] == 6 and out["stats"]["new"] == 10
+    starts = sorted(q["startRecord"] for q in sru.state.queries if '"Delft"' in q["query"])
+    assert starts == [1, 3, 5]
+    assert all(f"dt.modified>={_since(7)}" in q["query"] for q in sru.state.queries)
+    assert "### Delft (5)" in out["preview_markdown"]
+
+
+def test_watermark_narrows_second_run_and_overlap_is_deduped(sru):
+    _run(sru)
+    out = _run(sru)
+    today = datetime.date.today().isoformat()
+    # alleen vanaf de watermark (vandaag) gevraagd: 2 publicaties per gemeente, één pagina
+    assert all(f"dt.modified>={today}" in q["query"] for q in sru.state.queries)
+    assert out["stats"]["requests"] == 2 and out["stats"]["new"] == 0
+    # de overlapdag komt uit de cache én van de bron, maar telt één keer
+    assert out["stats"]["from_cache"] == 10
+    assert out["publications"] == 10
+    assert "### Utrecht (5)" in out["preview_markdown"]
+
+
+def test_not_modified_page_replays_cached_ids(sru, monkeypatch):
+    # alles van vandaag: na de watermark is de query anders maar de inhoud gelijk,
+    # zoals bij een wekelijkse run zonder nieuwe publicaties
+    sru = _serve(monkeypatch, sru_app(Faults(), per_municipality=4, spread_days=1), sru.state.config_path)
+    first = _run(sru)
+    assert first["stats"]["not_modified"] == 0 and first["stats"]["new"] == 8
+    first_queries = {q["query"] for q in sru.state.queries}
+
+    out = _run(sru)
+    assert not first_queries & {q["query"] for q in sru.state.queries}
+    # per gemeente twee volle pagina's ongewijzigd → ids uit de cache, daarna een lege slotpagina
+    assert out["stats"]["not_modified"] == 4 and out["stats"]["new"] == 0
+    assert out["publications"] == 8 and out["ok"]
+
+
+def test_failed_source_is_reported_and_cache_still_shown(sru, monkeypatch):
+    _run(sru)
+    _serve(monkeypatch, sru_app(Faults(error_rate=1.0)), sru.state.config_path)
+    out = _run(sru, days=7)
+    assert not out["ok"] and out["stats"]["errors"] == 2
+    # wat al in de cache stond wordt nog steeds getoond
+    assert out["publications"] == 10
@@ -0,0 +1,43 @@
+# tests/test_chat_stream.py
+# /chat streamt via LiteLLM vanaf de fake provider (bench/fakes.llm_app, SSE-chunks):
+# de tekst komt stukje bij beetje binnen en de usage van de stream wordt geboekt.
+
+import time
+
+import httpx
+
+from app import llm_cache, llm_client, main, metrics
+from bench.fakes import Faults, llm_app
+
+MODEL = "openai/fake-stream"
+CHUNK_MS = 60
+
+
+def test_chat_streams_incrementally_and_records_usage(live_server, monkeypatch):
+    provider = live_server(llm_app(Faults(), stream_chunk_ms=CHUNK_MS))
+    monkeypatch.setenv("OPENAI_API_KEY", "fake")
+    monkeypatch.delenv("X_API_KEY", raising=False)
+    monkeypatch.setattr(llm_client, "API_BASE", f"{provider}/v1")
+    monkeypatch.setattr(llm_client, "MODEL", MODEL)
+    monkeypatch.setattr(llm_client, "_USAGE", {})
+    monkeypatch.setattr(llm_cache, "CACHE", llm_cache.CompletionCache(disk_path=""))
+    api = live_server(main.app)
+
+    arrivals, text = [], ""
+    body = {"messages": [{"role": "user", "content": "schrijf een lange zin over de Maas"}]}
+    t0 = time.perf_counter()
+    with httpx.stream("POST", f"{api}/chat", json=body, timeout=30) as r:
+        assert r.status_code == 200
+        for piece in r.iter_text():
+            arrivals.append(time.perf_counter() - t0)
+            text += piece
+
+    assert '"type": "build"' in text
+    # meerdere stukken, en het eerste ruim vóór het laatste: niet gebufferd tot het einde
+    assert len(arrivals) >= 3
+    assert arrivals[-1] - arrivals[0] >= 2 * CHUNK_MS / 1000
+
+    s = llm_client.usage_stats()[MODEL]
+    assert s["calls"] == 1 and s["prompt_tokens"] > 0 and s["completion_tokens"] > 0
+    assert s["latency_max_ms"] >= arrivals[-1] * 1000 * 0.5
+    assert metrics.LLM_TOKENS._values[(MODEL, "completion")] >= s["completion_tokens"]
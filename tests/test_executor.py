@@ -0,0 +1,26 @@
+# tests/test_executor.py
+# app/executor.py: Retry-After bij een volle wachtrij volgt de tijd tot er één plek vrijkomt.
+
+import time
+
+import pytest
+
+from app.executor import JobExecutor, QueueFull
+
+
+async def _noop():
+    return None
+
+
+def _full(finished_in_window: int) -> JobExecutor:
+    ex = JobExecutor(max_queue=0)
+    now = time.monotonic()
+    ex._finished.extend(now for _ in range(finished_in_window))
+    return ex
+
+
+@pytest.mark.parametrize("finished,expected", [(0, 5), (6, 10), (60, 1), (600, 1), (2, 30)])
+def test_retry_after_is_time_until_one_slot_frees(finished, expected):
+    with pytest.raises(QueueFull) as e:
+        _full(finished).submit("t", _noop)
+    assert e.value.retry_after == expected
@@ -0,0 +1,187 @@
+# tests/test_github_client.py
+# Contract-tests van app/github_client.py tegen de fake GitHub (bench/fakes.github_app):
+# commit, overslaan van ongewijzigde inhoud, conflicten, de read-cache en het blob-pad
+# voor grote bestanden (gestreamde base64-body, modes uit de base tree).
+
+import asyncio
+import base64
+
+import pytest
+
+from app import builder, github_client, github_rate
+
+REPO = "bench/repo"
+
+
+def test_concurrent_commit_files_on_one_branch(github):
+    # vier gelijktijdige commits naar main: de ref-update moet herstarten op de nieuwe kop
+    async def run():
+        return await asyncio.gather(*(
+            github_client.commit_files(
+                token="t", repo=REPO, branch="main", message=f"c{i}",
+                files=[{"path": f"f{i}.txt", "content": f"inhoud {i}"}],
+            )
+            for i in range(4)
+        ))
+
+    results = asyncio.run(run())
+    assert all(r["commit"] for r in results)
+
+    async def read():
+        return await github_client.read_files(token="t", repo=REPO, paths=[f"f{i}.txt" for i in range(4)])
+
+    files = asyncio.run(read())
+    assert {p: e["data"] for p, e in files.items()} == {f"f{i}.txt": f"inhoud {i}".encode() for i in range(4)}
+
+
+def test_commit_file_and_build_from_spec_with_gh_token(github, monkeypatch):
+    res = asyncio.run(github_client.commit_file(token="t", repo=REPO, path="a.txt", content="één", message="a"))
+    assert res["commit"]["sha"]
+    assert asyncio.run(github_client.raw_file(token="t", repo=REPO, path="a.txt"))["content"] == "één"
+
+    # builder gebruikt dezelfde resolver als tasks: GH_TOKEN alleen is genoeg
+    monkeypatch.delenv("GITHUB_TOKEN", raising=False)
+    monkeypatch.setenv("GH_TOKEN", "t")
+    spec = {"repo": REPO, "files": [{"path": "b.txt", "content": "bee"}], "summary": "b"}
+    out = asyncio.run(builder.build_from_spec(spec))
+    assert out["ok"] and [c["path"] for c in out["result"]["committed"]] == ["b.txt"]
+
+    monkeypatch.delenv("GH_TOKEN")
+    assert github_client.env_token() is None
+
+
+def test_unchanged_content_is_skipped(github):
+    files = [{"path": "x.txt", "content": "x"}, {"path": "y.bin", "content": b"\x00\x01"}]
+    first = asyncio.run(github_client.commit_files(token="t", repo=REPO, files=files, message="1"))
+    assert first["commit"] and first["skipped"] == []
+
+    again = asyncio.run(github_client.commit_files(token="t", repo=REPO, files=files, message="2"))
+    assert again["commit"] is None and sorted(again["skipped"]) == ["x.txt", "y.bin"]
+
+    one = asyncio.run(github_client.commit_file(token="t", repo=REPO, path="x.txt", content="x", message="3"))
+    assert one["unchanged"] and one["commit"] is None
+
+
+def test_stale_cached_sha_is_refreshed_on_conflict(github):
+    asyncio.run(github_client.commit_file(token="t", repo=REPO, path="c.txt", content="v1", message="1"))
+    # iemand anders schreef intussen: de sha in de cache hoort bij een oude versie
+    github_client.SHA_CACHE.put(REPO, "main", {"c.txt": github_client.git_blob_sha(b"oud")})
+
+    res = asyncio.run(github_client.commit_file(token="t", repo=REPO, path="c.txt", content="v2", message="2"))
+    assert res["commit"]["sha"]
+    assert github_client.SHA_CACHE.counters["conflicts"] == 1
+    assert asyncio.run(github_client.raw_file(token="t", repo=REPO, path="c.txt"))["content"] == "v2"
+
+
+def test_read_cache_hits_revalidates_and_invalidates(github):
+    asyncio.run(github_client.commit_file(token="t", repo=REPO, path="r.txt", content="een", message="1"))
+    cache = github_client.FILE_CACHE
+
+    asyncio.run(github_client.read_file(token="t", repo=REPO, path="r.txt"))
+    asyncio.run(github_client.read_file(token="t", repo=REPO, path="r.txt"))
+    assert (cache.counters["misses"], cache.counters["hits"]) == (1, 1)
+
+    # verlopen entry: revalidatie met If-None-Match → 304, inhoud uit de cache
+    cache.ttl_s = -1.0
+    for key, (_, entry) in list(cache._data.items()):
+        cache.put(key, entry)
+    assert asyncio.run(github_client.read_file(token="t", repo=REPO, path="r.txt"))["data"] == b"een"
+    assert cache.counters["revalidated"] == 1
+
+    # een eigen commit invalideert de entry
+    asyncio.run(github_client.commit_file(token="t", repo=REPO, path="r.txt", content="twee", message="2"))
+    assert cache.counters["invalidated"] == 1
+    assert asyncio.run(github_client.read_file(token="t", repo=REPO, path="r.txt"))["data"] == b"twee"
+
+
+def test_read_cache_is_per_token(github):
+    asyncio.run(github_client.commit_file(token="t", repo=REPO, path="p.txt", content="geheim", message="1"))
+    cache = github_client.FILE_CACHE
+
+    asyncio.run(github_client.read_file(token="a", repo=REPO, path="p.txt"))
+    # een ander token krijgt niets uit de cache van "a", maar vraagt het zelf op
+    asyncio.run(github_client.read_file(token="b", repo=REPO, path="p.txt"))
+    assert (cache.counters["misses"], cache.counters["hits"]) == (2, 0)
+    asyncio.run(github_client.read_file(token="b", repo=REPO, path="p.txt"))
+    assert cache.counters["hits"] == 1
+
+    # een commit invalideert de entry voor alle tokens
+    asyncio.run(github_client.commit_file(token="t", repo=REPO, path="p.txt", content="nieuw", message="2"))
+    assert cache.counters["invalidated"] == 2 and cache.stats()["entries"] == 0
+
+
+def _spy_requests(monkeypatch):
+    """Logt (method, pad) van elke GitHub-call; gestreamde bodies worden eerst nagemeten."""
+    calls, bodies = [], []
+    real = github_rate.request
+
+    async def spy(method, url, *, token, content=None, **kw):
+        calls.append((method, url.split("/repos/", 1)[-1]))
+        if callable(content):
+            body = b"".join([chunk async for chunk in content()])
+            bodies.append((int(kw["headers"]["Content-Length"]), body))
+        return await real(method, url, token=token, content=content, **kw)
+
+    monkeypatch.setattr(github_rate, "request", spy)
+    return calls, bodies
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 4, 5, 14, 15, 16])
+def test_blob_b64_chunks_carry_across_3_byte_boundaries(monkeypatch, size):
+    # chunks van 5 bytes: elke chunk laat een rest over die naar de volgende moet
+    monkeypatch.setattr(github_client, "CHUNK_BYTES", 5)
+    data = bytes(range(size))
+
+    async def run():
+        blob = await github_client._Blob.open(data)
+        return blob, [c async for c in blob.b64_chunks()]
+
+    blob, chunks = asyncio.run(run())
+    assert b"".join(chunks) == base64.b64encode(data)
+    assert all(b"=" not in c for c in chunks[:-1])
+    assert blob.b64_length() == len(base64.b64encode(data))
+    assert blob.sha == github_client.git_blob_sha(data)
+
+
+def test_large_file_goes_through_streamed_blob(github, monkeypatch):
+    monkeypatch.setattr(github_client, "CONTENTS_MAX_BYTES", 16)
+    monkeypatch.setattr(github_client, "CHUNK_BYTES", 5)
+    calls, bodies = _spy_requests(monkeypatch)
+    data = bytes(range(256)) * 3
+
+    res = asyncio.run(github_client.commit_file(token="t", repo=REPO, path="big.bin", content=data, message="groot"))
+    assert res["commit"]["sha"] and res["content"]["sha"] == github_client.git_blob_sha(data)
+    methods = [m for m, _ in calls]
+    assert ("POST", f"{REPO}/git/blobs") in calls and "PUT" not in methods
+    # Content-Length klopt exact met de gestreamde JSON-body
+    (length, body), = bodies
+    assert length == len(body) and body.startswith(b'{"encoding":"base64","content":"')
+    assert asyncio.run(github_client.read_file(token="t", repo=REPO, path="big.bin"))["data"] == data
+
+
+def test_small_file_uses_contents_api(github, monkeypatch):
+    monkeypatch.setattr(github_client, "CONTENTS_MAX_BYTES", 16)
+    calls, bodies = _spy_requests(monkeypatch)
+
+    # precies op de grens: nog via de Contents API
+    res = asyncio.run(github_client.commit_file(token="t", repo=REPO, path="s.txt", content=b"x" * 16, message="klein"))
+    assert res["commit"]["sha"]
+    assert ("PUT", f"{REPO}/contents/s.txt") in calls
+    assert not any("/git/" in path for _, path in calls) and bodies == []
+
+
+def test_blob_commit_keeps_mode_of_existing_path(github):
+    repo = github.state.gh.repo(*REPO.split("/"))
+    files = repo.files("main")
+    repo.refs["main"] = repo.commit(
+        {**files, "run.sh": repo.blob(b"#!/bin/sh\necho 1\n")}, [repo.head("main")], "script", {"run.sh": "100755"},
+    )
+
+    res = asyncio.run(github_client.commit_files(
+        token="t", repo=REPO, message="update",
+        files=[{"path": "run.sh", "content": "#!/bin/sh\necho 2\n"}, {"path": "nieuw.txt", "content": "n"}],
+    ))
+    assert sorted(c["path"] for c in res["committed"]) == ["nieuw.txt", "run.sh"]
+    # +x blijft staan; een nieuw pad wordt een gewoon bestand
+    assert repo.file_modes("main") == {"run.sh": "100755"}
+    assert repo.blobs[repo.files("main")["run.sh"]] == b"#!/bin/sh\necho 2\n"
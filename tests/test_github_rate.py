@@ -0,0 +1,89 @@
+# tests/test_github_rate.py
+# app/github_rate.py: wachten op de reset bij een leeg budget, retries bij 429/secundaire
+# limieten met Retry-After, en geen retry van niet-idempotente requests op 5xx.
+# Slapen wordt gelogd i.p.v. uitgevoerd; upstream is een httpx.MockTransport.
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app import github_rate, http_pool
+
+API = "http://gh-rate.test"
+
+
+@pytest.fixture
+def gh(monkeypatch):
+    monkeypatch.setattr(github_rate, "_GOVERNORS", {})
+    sleeps = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, *args, **kw):
+        sleeps.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(github_rate.asyncio, "sleep", sleep)
+
+    def serve(*responses):
+        """Antwoorden in volgorde; de laatste blijft terugkomen."""
+        calls = []
+
+        def handler(request):
+            calls.append(request.method)
+            return responses[min(len(calls), len(responses)) - 1]()
+
+        monkeypatch.setitem(http_pool._CLIENTS, API, httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        return calls
+
+    serve.sleeps = sleeps
+    return serve
+
+
+def _ok(remaining=4000, reset_in=3600.0):
+    headers = {
+        "x-ratelimit-limit": "5000", "x-ratelimit-remaining": str(remaining),
+        "x-ratelimit-reset": str(int(time.time() + reset_in)),
+    }
+    return lambda: httpx.Response(200, headers=headers, json={})
+
+
+def _req(method="GET"):
+    return asyncio.run(github_rate.request(method, f"{API}/repos/o/r", token="t"))
+
+
+def test_exhausted_budget_delays_next_call_until_reset(gh):
+    calls = gh(_ok(remaining=0, reset_in=5))
+    assert _req().status_code == 200 and gh.sleeps == []
+
+    # budget op en de reset is dichtbij: de volgende call wacht tot net ná de reset
+    assert _req().status_code == 200
+    assert len(calls) == 2 and len(gh.sleeps) == 1
+    assert 4 < gh.sleeps[0] <= 6
+    assert github_rate.governor_for("t").stats["exhausted_waits"] == 1
+
+
+@pytest.mark.parametrize("limited", [
+    lambda: httpx.Response(429, headers={"retry-after": "2"}, json={"message": "Too Many Requests"}),
+    lambda: httpx.Response(403, headers={"retry-after": "2"}, json={"message": "You have exceeded a secondary rate limit"}),
+], ids=["429", "secondary-403"])
+@pytest.mark.parametrize("method", ["GET", "POST"])
+def test_rate_limited_response_is_retried_after_retry_after(gh, limited, method):
+    calls = gh(limited, _ok())
+    assert _req(method).status_code == 200
+    assert calls == [method, method]
+    gov = github_rate.governor_for("t")
+    assert (gov.stats["retries"], gov.stats["secondary_limited"]) == (1, 1)
+    # backoff volgt Retry-After (met jitter tot +25%)
+    assert 2 <= gh.sleeps[0] <= 2.5
+
+
+def test_post_is_not_retried_on_5xx_but_get_is(gh):
+    calls = gh(lambda: httpx.Response(503, json={"message": "Service Unavailable"}), _ok())
+    assert _req("POST").status_code == 503
+    assert calls == ["POST"] and gh.sleeps == []
+
+    calls = gh(lambda: httpx.Response(503, json={"message": "Service Unavailable"}), _ok())
+    assert _req("GET").status_code == 200
+    assert calls == ["GET", "GET"]
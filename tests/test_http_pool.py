@@ -0,0 +1,49 @@
+# tests/test_http_pool.py
+# app/http_pool.py: de tellers gaan over verbindingen (nieuw vs. hergebruikt), niet over dict-lookups.
+
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import http_pool
+
+
+class _KeepAlive(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAlive)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_port}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_counts_new_and_reused_connections(server):
+    async def run():
+        await http_pool.startup()
+        try:
+            for _ in range(3):
+                r = await http_pool.get_client(server).get(f"{server}/x")
+                assert r.text == "ok"
+            # twee tegelijk: de tweede moet een extra verbinding openen
+            await asyncio.gather(*(http_pool.get_client(server).get(f"{server}/y") for _ in range(2)))
+            return http_pool.stats()
+        finally:
+            await http_pool.shutdown()
+
+    st = asyncio.run(run())
+    assert (st["connections_new"], st["connections_reused"]) == (2, 3)
@@ -0,0 +1,61 @@
+# tests/test_images.py
+# app/images.py: verkleinen en her-encoderen, de sha256-cache en het weigeren van
+# decompressiebommen als gewone "ongeldige afbeelding".
+
+import asyncio
+import base64
+import io
+from collections import OrderedDict
+
+import pytest
+
+from app import images
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(images, "_CACHE", OrderedDict())
+    monkeypatch.setattr(images, "_CACHE_BYTES", 0)
+    monkeypatch.setattr(images, "_STATS", {k: type(v)() for k, v in images._STATS.items()})
+
+
+def _png(w: int, h: int, mode: str = "RGBA") -> str:
+    buf = io.BytesIO()
+    img = Image.effect_noise((w, h), 64).convert(mode)
+    img.save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def test_large_png_is_resized_to_jpeg_and_cached(monkeypatch):
+    monkeypatch.setattr(images, "MAX_EDGE", 256)
+    data = _png(1200, 600)
+
+    first = asyncio.run(images.prepare_image(f"data:image/png;base64,{data}"))
+    assert first["mime"] == "image/jpeg" and not first["cached"]
+    assert first["bytes_out"] < first["bytes_in"]
+    out = Image.open(io.BytesIO(base64.b64decode(first["url"].split(",", 1)[1])))
+    assert (out.format, out.size, out.mode) == ("JPEG", (256, 128), "RGB")
+
+    # zelfde inhoud (ook als kale base64) → zelfde sha256 → uit de cache
+    again = asyncio.run(images.prepare_image(data))
+    assert again["cached"] and again["url"] == first["url"]
+    st = images.stats()
+    assert (st["images"], st["cache_hits"], st["cache"]["entries"]) == (2, 1, 1)
+
+
+@pytest.mark.parametrize("pillow_limit", [False, True])
+def test_decompression_bomb_is_invalid_image(monkeypatch, pillow_limit):
+    monkeypatch.setattr(images, "MAX_PIXELS", 1000)
+    if pillow_limit:
+        # > 2× Pillow's limiet: Image.open gooit zelf DecompressionBombError
+        monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    with pytest.raises(ValueError, match="geen leesbare afbeelding"):
+        asyncio.run(images.prepare_image(_png(100, 100, "L")))
+    assert images.stats()["cache"]["entries"] == 0
+
+
+def test_garbage_is_invalid_image():
+    with pytest.raises(ValueError, match="geen leesbare afbeelding"):
+        asyncio.run(images.prepare_image(base64.b64encode(b"geen plaatje").decode()))
@@ -0,0 +1,80 @@
+# tests/test_jobstore.py
+# app/jobstore.py: JobStore is een abstracte interface; beide backends implementeren hem volledig.
+# De sqlite-backend is synchroon; een slot van een ander proces blokkeert hooguit busy_timeout_s.
+
+import sqlite3
+import time
+
+import pytest
+
+from app import jobstore
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        jobstore.JobStore()
+
+    class Half(jobstore.JobStore):
+        def create(self, job):
+            pass
+
+    with pytest.raises(TypeError):
+        Half()
+
+
+@pytest.mark.parametrize("make", [
+    lambda tmp: jobstore.MemoryJobStore(),
+    lambda tmp: jobstore.SqliteJobStore(str(tmp / "jobs.sqlite3")),
+], ids=["memory", "sqlite"])
+def test_backends_roundtrip(make, tmp_path):
+    store = make(tmp_path)
+    store.create({"id": "j1", "task": "t", "status": "queued", "created_ts": 1.0, "payload": {}})
+    store.update("j1", status="done", result={"ok": True})
+    assert store.get("j1")["result"] == {"ok": True}
+    assert [j["id"] for j in store.list()] == ["j1"] and store.count() == 1
+    store.delete("j1")
+    assert store.get("j1") is None
+    store.close()
+
+
+@pytest.mark.parametrize("make", [
+    lambda tmp: jobstore.MemoryJobStore(),
+    lambda tmp: jobstore.SqliteJobStore(str(tmp / "jobs.sqlite3")),
+], ids=["memory", "sqlite"])
+def test_list_fields_skips_payload(make, tmp_path, monkeypatch):
+    store = make(tmp_path)
+    big = {"files": [{"path": "a.txt", "content": "x" * 100_000}]}
+    for i in range(3):
+        store.create({"id": f"j{i}", "task": "commit_files", "status": "done", "created_ts": float(i), "payload": big})
+
+    decoded = []
+    real_loads = jobstore.json.loads
+    monkeypatch.setattr(jobstore.json, "loads", lambda s, *a, **k: decoded.append(len(s)) or real_loads(s, *a, **k))
+
+    items = store.list(fields=["id", "status"])
+    # id en created_ts blijven erin voor de cursor; payload wordt niet geladen of gedecodeerd
+    assert [sorted(j) for j in items] == [["created_ts", "id", "status"]] * 3
+    assert decoded == []
+    assert store.list(limit=1, fields=["payload"])[0]["payload"] == big
+    store.close()
+
+
+def test_sqlite_lock_held_elsewhere_is_bounded(tmp_path):
+    # de store draait op het event loop: reads lopen door (WAL), een write wacht hooguit busy_timeout_s
+    path = str(tmp_path / "jobs.sqlite3")
+    store = jobstore.SqliteJobStore(path, busy_timeout_s=0.1)
+    store.create({"id": "j1", "task": "t", "status": "queued", "created_ts": 1.0, "payload": {}})
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        assert store.get("j1")["status"] == "queued"
+        t0 = time.perf_counter()
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            store.update("j1", status="running")
+        assert time.perf_counter() - t0 < 1.0
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    store.update("j1", status="running")
+    assert store.get("j1")["status"] == "running"
+    store.close()
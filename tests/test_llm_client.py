@@ -0,0 +1,41 @@
+# tests/test_llm_client.py
+# Usage-boekhouding van app/llm_client.py bij single-flight (llm_scheduler) en cache.
+
+import asyncio
+
+from app import llm_cache, llm_client, metrics
+
+
+def _tokens_metric(model):
+    return {k: v for k, v in metrics.LLM_TOKENS._values.items() if k[0] == model}
+
+
+def test_coalesced_calls_count_tokens_once(monkeypatch):
+    calls = []
+
+    async def acompletion(**params):
+        calls.append(params)
+        await asyncio.sleep(0.05)  # lang genoeg om de andere aanroepers te laten aansluiten
+        return {"choices": [{"message": {"content": "hoi"}}], "usage": {"prompt_tokens": 100, "completion_tokens": 7}}
+
+    model = "openai/test-coalesce"
+    monkeypatch.setattr(llm_client, "acompletion", acompletion)
+    monkeypatch.setattr(llm_client, "_USAGE", {})
+    monkeypatch.setattr(llm_cache, "CACHE", llm_cache.CompletionCache(disk_path=""))
+    before = _tokens_metric(model)
+
+    async def run():
+        msgs = [{"role": "user", "content": "zelfde vraag"}]
+        return await asyncio.gather(*(llm_client.chat_with_usage(msgs, model=model) for _ in range(10)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(content == "hoi" for content, _ in results)
+    assert sum(meta["prompt_tokens"] for _, meta in results) == 100
+    assert sum(1 for _, meta in results if meta.get("coalesced")) == 9
+
+    s = llm_client.usage_stats()[model]
+    assert (s["calls"], s["coalesced"], s["prompt_tokens"], s["completion_tokens"]) == (1, 9, 100, 7)
+    after = _tokens_metric(model)
+    assert after[(model, "prompt")] - before.get((model, "prompt"), 0) == 100
+    assert after[(model, "completion")] - before.get((model, "completion"), 0) == 7
@@ -0,0 +1,95 @@
+# tests/test_llm_json.py
+# Corpus van (bijna-)kapotte LLM-antwoorden voor app/llm_json.py, plus de suggestor-flow:
+# hoeveel extra completions lokale reparatie uitspaart, en dat ongeldige antwoorden niet gecachet worden.
+
+import asyncio
+import json
+
+import pytest
+
+from app import llm_cache, llm_client, llm_json, suggestor
+
+JOB = {"type": "job", "payload": {"task": "weekly_bekendmakingen", "dry_run": True}, "notes": "rooktest"}
+
+# (naam, modelantwoord, verwacht object of None = niet te redden)
+CORPUS = [
+    ("geldig", json.dumps(JOB), JOB),
+    ("code fence", "```json\n" + json.dumps(JOB) + "\n```", JOB),
+    ("fence zonder taal", "```\n" + json.dumps(JOB) + "\n```", JOB),
+    ("tekst eromheen", "Hier is het voorstel:\n" + json.dumps(JOB) + "\nSucces!", JOB),
+    ("trailing comma", '{"type": "job", "payload": {"task": "weekly_bekendmakingen", "dry_run": true,}, "notes": "rooktest",}', JOB),
+    ("python-literals", '{"type": "job", "payload": {"task": "weekly_bekendmakingen", "dry_run": True}, "notes": "rooktest"}', JOB),
+    ("python-dict", str(JOB), JOB),
+    ("slimme quotes als scheiding",
+     "{“type”: “job”, “payload”: {“task”: “weekly_bekendmakingen”, “dry_run”: true}, “notes”: “rooktest”}", JOB),
+    ("slimme quotes in een waarde (fenced)",
+     '```json\n{"type": "job", "payload": {"task": "x"}, "notes": "zie de “dry-run”"}\n```',
+     {"type": "job", "payload": {"task": "x"}, "notes": "zie de “dry-run”"}),
+    ("apostrof in een waarde",
+     'Voorstel: {"type": "job", "payload": {"task": "x"}, "notes": "’s avonds draaien",}',
+     {"type": "job", "payload": {"task": "x"}, "notes": "’s avonds draaien"}),
+    ("True in een string blijft staan",
+     '{"type": "job", "payload": {"task": "x"}, "notes": "zet True aan",}',
+     {"type": "job", "payload": {"task": "x"}, "notes": "zet True aan"}),
+    ("afgekapt", '{"type": "job", "payload": {"task": "x"', None),
+    ("geen json", "Sorry, dat kan ik niet.", None),
+    ("leeg", "", None),
+]
+
+
+@pytest.mark.parametrize("name,text,expected", CORPUS, ids=[c[0] for c in CORPUS])
+def test_parse_corpus(name, text, expected):
+    data, repaired = llm_json.parse(text)
+    assert data == expected
+    assert repaired == (name != "geldig")
+
+
+def test_recalls_avoided_on_corpus():
+    # elk antwoord dat na reparatie een geldig voorstel is, kost geen tweede completion
+    broken = [(text, expected) for name, text, expected in CORPUS if name != "geldig"]
+    avoided = sum(1 for text, _ in broken if (d := llm_json.parse(text)[0]) is not None and not llm_json.validate_suggestion(d))
+    assert avoided == sum(1 for _, e in broken if e is not None) == 10
+
+
+def test_validate_suggestion():
+    assert llm_json.validate_suggestion(JOB) == []
+    assert llm_json.validate_suggestion({"type": "job", "payload": {}}) == ["payload.task: verplicht voor type 'job'"]
+    assert llm_json.validate_suggestion({"type": "build", "payload": {"goal": "x"}}) == []
+    assert llm_json.validate_suggestion({"type": "build", "payload": {"files": []}})
+    assert llm_json.validate_suggestion({"type": "delete", "payload": {}})
+
+
+def _fake_provider(monkeypatch, answers):
+    calls = []
+
+    async def acompletion(**params):
+        calls.append(params)
+        content = answers.pop(0)
+        return {"choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 10, "completion_tokens": 5}}
+
+    monkeypatch.setattr(llm_client, "acompletion", acompletion)
+    monkeypatch.setattr(llm_cache, "CACHE", llm_cache.CompletionCache(disk_path=""))
+    return calls
+
+
+def test_suggest_repairs_locally_without_reask(monkeypatch):
+    calls = _fake_provider(monkeypatch, ["Hier:\n```json\n" + json.dumps(JOB) + ",\n```"])
+    res = asyncio.run(suggestor.suggest_from_text("draai de digest"))
+    assert res["ok"] and res["suggestion"] == JOB
+    assert len(calls) == 1
+
+
+def test_invalid_answers_are_not_cached(monkeypatch):
+    calls = _fake_provider(monkeypatch, ["onzin", "nog steeds onzin", json.dumps(JOB)])
+    first = asyncio.run(suggestor.suggest_from_text("draai de digest"))
+    assert not first["ok"] and len(calls) == 2  # antwoord + één herkansing
+
+    # opnieuw indienen moet de provider weer vragen, niet de fout uit de cache halen
+    second = asyncio.run(suggestor.suggest_from_text("draai de digest"))
+    assert second["ok"] and not second["usage"]["cached"]
+    assert len(calls) == 3
+
+    # een geldig voorstel mag wel uit de cache komen
+    third = asyncio.run(suggestor.suggest_from_text("draai de digest"))
+    assert third["ok"] and third["usage"]["cached"]
+    assert len(calls) == 3
@@ -0,0 +1,59 @@
+# tests/test_llm_scheduler.py
+# Single-flight in app/llm_scheduler.py: afbreken van de aanroeper die de call startte
+# mag de meeliftende aanroepers niet raken.
+
+import asyncio
+
+from app import llm_scheduler
+
+PARAMS = {"model": "openai/test-singleflight", "messages": [{"role": "user", "content": "x"}]}
+
+
+def _provider(delay=0.05):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return "antwoord"
+
+    return calls, call
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    calls, call = _provider()
+
+    async def scenario():
+        leader = asyncio.create_task(llm_scheduler.run(PARAMS, call, key="k1"))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(llm_scheduler.run(PARAMS, call, key="k1")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()  # bv. /chat-client verbreekt de verbinding
+        results = await asyncio.gather(*waiters)
+        assert leader.cancelled()
+        return results
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [r for r, _ in results] == ["antwoord"] * 3
+    # precies één aanroeper boekt de call (de leider is weg)
+    assert sorted(c for _, c in results) == [False, True, True]
+    assert llm_scheduler.stats()["inflight"] == 0
+
+
+def test_call_is_cancelled_when_nobody_waits():
+    calls, call = _provider(delay=5)
+
+    async def scenario():
+        tasks = [asyncio.create_task(llm_scheduler.run(PARAMS, call, key="k2")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        flight = llm_scheduler._INFLIGHT["k2"]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+        return flight.task
+
+    provider_task = asyncio.run(scenario())
+    assert provider_task.cancelled() and len(calls) == 1
+    assert "k2" not in llm_scheduler._INFLIGHT
@@ -0,0 +1,69 @@
+# tests/test_main.py
+# API-gedrag van app/main.py: authenticatie en de inhoud van job-events.
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.events import BUS
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("X_API_KEY", "geheim")
+    with TestClient(main.app) as c:
+        yield c
+
+
+def test_api_key_in_query_only_for_sse(client):
+    body = {"task": "raw_file", "payload": {}}
+    assert client.post("/jobs/create?api_key=geheim", json=body).status_code == 401
+    assert client.get("/executor?api_key=geheim").status_code == 401
+    assert client.get("/executor", headers={"X-API-Key": "geheim"}).status_code == 200
+    # EventSource kan geen headers zetten: daar mag de query wel (404 = voorbij de auth)
+    assert client.get("/jobs/bestaat-niet/events?api_key=geheim").status_code == 404
+    assert client.get("/jobs/bestaat-niet/events?api_key=fout").status_code == 401
+
+
+def test_events_carry_no_payload_or_result():
+    sub = BUS.subscribe(None)
+    try:
+        BUS.publish({
+            "id": "j1", "task": "commit_files", "status": "done", "priority": "interactive",
+            "created_at": "t0", "started_at": "t1", "finished_at": "t2", "error": None,
+            "payload": {"files": [{"path": "groot.bin", "content_base64": "A" * 1_000_000}]},
+            "result": {"ok": True},
+        })
+        ev = sub[1].get_nowait()
+    finally:
+        BUS.unsubscribe(sub)
+    assert ev == {"id": "j1", "task": "commit_files", "status": "done",
+                  "created_at": "t0", "started_at": "t1", "finished_at": "t2", "error": None}
+
+
+def test_list_jobs_fields_with_cursor(client, monkeypatch):
+    from app import jobstore
+
+    store = jobstore.MemoryJobStore()
+    monkeypatch.setattr(main, "STORE", store)
+    for i in range(3):
+        store.create({"id": f"j{i}", "task": "commit_files", "status": "done", "created_ts": float(i + 1),
+                      "payload": {"files": [{"path": "a", "content": "x" * 1000}]}})
+    h = {"X-API-Key": "geheim"}
+
+    first = client.get("/jobs?fields=id,status&limit=2", headers=h).json()
+    assert first["items"] == [{"id": "j2", "status": "done"}, {"id": "j1", "status": "done"}]
+    rest = client.get(f"/jobs?fields=id,status&limit=2&cursor={first['next_cursor']}", headers=h).json()
+    assert rest == {"items": [{"id": "j0", "status": "done"}], "next_cursor": None}
+
+
+def test_event_stream_ends_with_error_when_job_vanished():
+    async def collect():
+        return [chunk async for chunk in main._event_stream(None, "verdwenen-job")]
+
+    before = BUS.subscribers()
+    out = asyncio.run(collect())
+    assert out == ['event: error\ndata: {"id": "verdwenen-job", "error": "job not found"}\n\n']
+    assert BUS.subscribers() == before
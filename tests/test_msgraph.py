@@ -0,0 +1,177 @@
+# tests/test_msgraph.py
+# app/msgraph.py tegen de fake Microsoft Graph (bench/fakes.graph_app): token-cache met single-flight,
+# bulk-mail via $batch, paging van berichten en delta-ingestie.
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+
+import httpx
+import pytest
+
+from app import http_pool, msgraph
+from bench.fakes import Faults, graph_app
+
+FAKE_GRAPH = "http://graph.test"
+
+
+def _serve(monkeypatch, app):
+    monkeypatch.setitem(http_pool._CLIENTS, FAKE_GRAPH, httpx.AsyncClient(transport=httpx.ASGITransport(app=app)))
+    return app
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    monkeypatch.setenv("MS_TENANT_ID", "tenant")
+    monkeypatch.setenv("MS_CLIENT_ID", "client")
+    monkeypatch.setenv("MS_CLIENT_SECRET", "secret")
+    monkeypatch.setattr(msgraph, "LOGIN_BASE", FAKE_GRAPH)
+    monkeypatch.setattr(msgraph, "GRAPH_BASE", f"{FAKE_GRAPH}/v1.0")
+    monkeypatch.setattr(msgraph, "_TOKENS", {})
+    monkeypatch.setattr(msgraph, "_REFRESHING", {})
+    monkeypatch.setattr(msgraph, "_TOKEN_STATS", {"hits": 0, "fetches": 0, "background_refreshes": 0})
+    return _serve(monkeypatch, graph_app(Faults()))
+
+
+def _expire_in(seconds):
+    for entry in msgraph._TOKENS.values():
+        entry["expires_at"] = time.time() + seconds
+
+
+def test_concurrent_get_token_hits_endpoint_once(graph):
+    async def run():
+        return await asyncio.gather(*(msgraph.get_token() for _ in range(20)))
+
+    tokens = asyncio.run(run())
+    assert set(tokens) == {"fake-tenant-1"}
+    assert graph.state.sent["tokens"] == 1
+
+
+def test_cached_token_is_reused_until_refresh_margin(graph):
+    async def run():
+        first = await msgraph.get_token()
+        # ruim buiten de marge: uit de cache, geen request
+        _expire_in(msgraph.TOKEN_REFRESH_AHEAD_S + 60)
+        assert await msgraph.get_token() == first
+        assert graph.state.sent["tokens"] == 1
+
+        # binnen de marge: direct het oude token, vernieuwen op de achtergrond
+        _expire_in(msgraph.TOKEN_REFRESH_AHEAD_S - 60)
+        assert await msgraph.get_token() == first
+        await asyncio.gather(*msgraph._REFRESHING.values())
+        assert graph.state.sent["tokens"] == 2
+        assert await msgraph.get_token() == "fake-tenant-2"
+
+        # (bijna) verlopen: de aanroeper wacht op een nieuw token
+        _expire_in(10)
+        assert await msgraph.get_token() == "fake-tenant-3"
+
+    asyncio.run(run())
+    assert msgraph.token_stats()["background_refreshes"] == 1
+
+
+def test_failed_refresh_reaches_every_waiter_and_is_not_cached(graph, monkeypatch):
+    faults = Faults(error_rate=1.0)
+    _serve(monkeypatch, graph_app(faults))
+
+    async def run():
+        return await asyncio.gather(*(msgraph.get_token() for _ in range(5)), return_exceptions=True)
+
+    errors = asyncio.run(run())
+    assert all(isinstance(e, httpx.HTTPStatusError) for e in errors)
+    assert faults.stats["requests"] == 1 and msgraph._TOKENS == {} and msgraph._REFRESHING == {}
+    assert len({id(e) for e in errors}) == 1  # één request, dezelfde fout voor iedereen
+
+    # de fout is niet gecachet: zodra het endpoint weer werkt komt er gewoon een token
+    _serve(monkeypatch, graph)
+    assert asyncio.run(msgraph.get_token()) == "fake-tenant-1"
+
+
+def _mails(n):
+    return [{"to": f"r{i}@example.org", "subject": "digest", "body_text": "tekst"} for i in range(n)]
+
+
+def test_bulk_send_keeps_results_when_one_batch_fails(graph, monkeypatch):
+    broken = _serve(monkeypatch, graph_app(Faults(), fail_batches=(2,)))
+    out = asyncio.run(msgraph.send_mail_bulk("afzender", _mails(50)))
+
+    assert out["batches"] == 3 and out["sent"] == broken.state.sent["mails"]
+    failed = out["failed"]
+    assert len(failed) == len(_mails(50)) - out["sent"] > 0
+    # alleen de berichten van de ene mislukte batch, met de HTTP-status erbij
+    chunk = {f["index"] // msgraph.BATCH_SIZE for f in failed}
+    assert len(chunk) == 1 and {f["status"] for f in failed} == {500}
+
+
+def test_bulk_send_reports_transport_errors_per_batch(graph, monkeypatch):
+    async def handler(request):
+        if request.url.path.endswith("/$batch"):
+            raise httpx.ConnectError("weg", request=request)
+        return httpx.Response(200, json={"access_token": "t", "expires_in": 3600})
+
+    monkeypatch.setitem(http_pool._CLIENTS, FAKE_GRAPH, httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    out = asyncio.run(msgraph.send_mail_bulk("afzender", _mails(3)))
+    assert out["sent"] == 0 and [f["status"] for f in out["failed"]] == [0, 0, 0]
+    assert "ConnectError" in out["failed"][0]["error"]
+
+
+def _receive(graph, user, n, day="2026-01-01"):
+    box = graph.state.mailbox.setdefault(user, [])
+    for _ in range(n):
+        i = len(box)
+        box.append({
+            "id": f"m{i}", "subject": f"bericht {i}", "bodyPreview": "…",
+            "receivedDateTime": f"{day}T{i // 60:02d}:{i % 60:02d}:00Z",
+            "from": {"emailAddress": {"address": "a@example.org"}},
+        })
+
+
+def test_messages_follow_next_link_and_top_is_a_limit(graph):
+    _receive(graph, "u", 7)
+
+    async def all_messages():
+        return [m async for m in msgraph.iter_messages("u", page_size=3)]
+
+    msgs = asyncio.run(all_messages())
+    assert [m["id"] for m in msgs] == [f"m{i}" for i in range(6, -1, -1)]
+    assert graph.state.sent["message_pages"] == 3
+
+    # list_today_messages: de eerste `top` berichten, niet `top` per pagina
+    graph.state.sent["message_pages"] = 0
+    top = asyncio.run(msgraph.list_today_messages("u", top=3))
+    assert [m["id"] for m in top] == ["m6", "m5", "m4"]
+    assert graph.state.sent["message_pages"] == 1
+
+
+def test_delta_returns_only_new_messages_after_first_run(graph, monkeypatch, tmp_path):
+    monkeypatch.setattr(msgraph, "DELTA_STATE_PATH", str(tmp_path / "delta.json"))
+    _receive(graph, "u", 5)
+
+    async def drain(limit=None):
+        out = []
+        async with aclosing(msgraph.iter_delta_messages("u", page_size=2)) as it:
+            async for m in it:
+                out.append(m["id"])
+                if limit and len(out) >= limit:
+                    break
+        return out
+
+    # afgebroken run: geen deltaLink opgeslagen, de volgende begint opnieuw
+    assert asyncio.run(drain(limit=1)) == ["m0"]
+    assert msgraph._load_delta_state() == {}
+
+    assert asyncio.run(drain()) == [f"m{i}" for i in range(5)]
+    assert "u/inbox" in msgraph._load_delta_state()
+
+    _receive(graph, "u", 2)
+    assert asyncio.run(drain()) == ["m5", "m6"]
+    assert asyncio.run(drain()) == []
+
+
+def test_concurrent_delta_saves_keep_every_key(monkeypatch, tmp_path):
+    monkeypatch.setattr(msgraph, "DELTA_STATE_PATH", str(tmp_path / "delta.json"))
+    keys = [f"user{i}/inbox" for i in range(40)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda k: msgraph._save_delta_link(k, f"link-{k}"), keys))
+    assert msgraph._load_delta_state() == {k: f"link-{k}" for k in keys}
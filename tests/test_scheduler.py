@@ -0,0 +1,66 @@
+# tests/test_scheduler.py
+# app/scheduler.py: afgevuurde jobs lopen via de gedeelde executor (lane "scheduled"),
+# starten zonder poll-vertraging en eindigen met dezelfde statussen als /jobs/create.
+
+import asyncio
+
+from app import main, tasks
+from app.executor import JobExecutor
+from app.scheduler import _Scheduler
+
+OLD_POLL_S = 0.150
+
+
+async def _wait_finished(job_id: str, timeout: float = 2.0) -> dict:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = main.STORE.get(job_id)
+        if job["status"] in ("done", "error"):
+            return job
+        assert asyncio.get_running_loop().time() < deadline, job
+        await asyncio.sleep(0.005)
+
+
+def test_oneoff_job_starts_fast_on_scheduled_lane(monkeypatch):
+    lanes = []
+
+    async def ok(payload):
+        return {"echo": payload}
+
+    async def boom(payload):
+        raise RuntimeError("kapot")
+
+    monkeypatch.setitem(tasks.TASKS, "test_ok", ok)
+    monkeypatch.setitem(tasks.TASKS, "test_boom", boom)
+
+    async def scenario():
+        ex = JobExecutor(max_inflight=2)
+        submit = ex.submit
+
+        def spy(task, runner, lane):
+            lanes.append(lane)
+            return submit(task, runner, lane=lane)
+
+        monkeypatch.setattr(ex, "submit", spy)
+        sched = _Scheduler()
+        ex.start()
+        await sched.start(ex, main.run_job)
+        try:
+            done = [await _wait_finished(sched.add_oneoff_job("test_ok", {"n": i})) for i in range(5)]
+            failed = await _wait_finished(sched.add_oneoff_job("test_boom", {}))
+        finally:
+            await sched.stop()
+            await ex.stop()
+        return sched.stats(), ex.stats(), done, failed
+
+    stats, ex_stats, done, failed = asyncio.run(scenario())
+
+    assert lanes == ["scheduled"] * 6
+    assert ex_stats["completed"] == 6
+    assert [j["status"] for j in done] == ["done"] * 5
+    assert done[0]["result"] == {"echo": {"n": 0}}
+    assert failed["status"] == "error" and failed["error"] == repr(RuntimeError("kapot"))
+
+    lat = stats["enqueue_to_start_ms"]
+    assert stats["started_jobs"] == 6
+    assert lat["max"] < OLD_POLL_S * 1000 / 3, lat
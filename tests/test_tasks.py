@@ -0,0 +1,41 @@
+# tests/test_tasks.py
+# app/tasks.py: GitHub-taken wachten async op upstream; de event loop blijft ondertussen vrij.
+
+import asyncio
+import time
+
+import httpx
+
+from app import github_client, http_pool, main, tasks
+from bench.fakes import Faults, github_app
+
+UPSTREAM_DELAY_S = 0.4
+
+
+def test_event_loop_stays_responsive_while_task_waits(github, monkeypatch):
+    monkeypatch.setenv("GH_TOKEN", "t")
+    slow = github_app(Faults(latency_ms=UPSTREAM_DELAY_S * 1000))
+    monkeypatch.setitem(http_pool._CLIENTS, github_client.GITHUB_API, httpx.AsyncClient(transport=httpx.ASGITransport(app=slow)))
+
+    async def scenario():
+        api = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://app")
+        t0 = time.perf_counter()
+        job = asyncio.create_task(tasks.raw_file({"repo": "bench/repo", "path": "README.md"}))
+        await asyncio.sleep(0.05)
+        health = []
+        for _ in range(5):
+            s = time.perf_counter()
+            r = await api.get("/health")
+            health.append(time.perf_counter() - s)
+            assert r.status_code == 200
+        still_waiting = not job.done()
+        res = await job
+        await api.aclose()
+        return health, still_waiting, res, time.perf_counter() - t0
+
+    health, still_waiting, res, total = asyncio.run(scenario())
+
+    assert still_waiting and total >= UPSTREAM_DELAY_S
+    assert res["ok"] and res["content"].startswith("# bench/repo")
+    # /health wacht niet op de trage upstream
+    assert max(health) < UPSTREAM_DELAY_S / 4, health